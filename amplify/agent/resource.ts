@@ -138,6 +138,8 @@ export function createMarpAgent({ stack, userPool, userPoolClient, nameSuffix, r
     actions: [
       'bedrock:InvokeModel',
       'bedrock:InvokeModelWithResponseStream',
+      // 起動時にプロンプトキャッシュのプレフィックスのトークン数を数える（session/prompt_cache.py）
+      'bedrock:CountTokens',
     ],
     resources: [
       'arn:aws:bedrock:*::foundation-model/*',
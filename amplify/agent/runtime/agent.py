@@ -2,76 +2,91 @@
 
 import asyncio
 import base64
-import json
-import os
+import contextvars
+import threading
+import time
 
-import pdfplumber
 from bedrock_agentcore import BedrockAgentCoreApp
 
-from config import normalize_model_type
-from tools import (
-    web_search,
-    output_slide,
-    configure_slide_validation,
-    generate_tweet_url,
-    get_generated_markdown,
-    reset_generated_markdown,
-    get_generated_tweet_url,
-    reset_generated_tweet_url,
-)
-from tools.web_search import get_last_search_result, reset_last_search_result
+from config import format_turn_context, normalize_model_type
+from telemetry import phase, record_interval
+from tools import configure_slide_validation, count_slides, set_current_markdown, start_request_state
 from exports import generate_pdf, generate_pptx, generate_editable_pptx
+from references import (
+    ReferenceFileError,
+    build_reference_index,
+    check_reference_files,
+    decode_reference_files,
+    get_extraction_cache,
+    get_session_reference,
+    load_reference_files,
+    reference_files_from_payload,
+    remember_session_reference,
+    session_index_enabled,
+    token_budget,
+)
 from sharing import share_slide
-from session import get_or_create_agent
+from session import (
+    RoutedTurn,
+    get_model_router,
+    get_or_create_agent,
+    record_cache_usage,
+    save_session_snapshot,
+    stream_agent,
+    uses_prompt_cache,
+    verify_prompt_cache_layout,
+)
+from streaming import ChatEventTranslator, StreamMultiplexer, create_text_coalescer
+from warmup import start_warmup, warmup_in_progress
+from workers import is_primary_worker, runtime_workers, worker_port
 
 app = BedrockAgentCoreApp()
 
-MAX_PDF_SIZE = 10 * 1024 * 1024  # 10MB
-MAX_EXTRACTED_CHARS = 50000  # 約25,000トークン
-STREAM_KEEPALIVE_INTERVAL = 10.0  # ストリーミング中のkeep-alive間隔（秒）
+MAX_EXTRACTED_CHARS = 300000  # 全参考資料で検索対象にする上限（約150,000トークン。プロンプトには関連箇所だけを入れる）
+STREAM_KEEPALIVE_INTERVAL = 5.0  # 全アクション共通のSSE keep-alive間隔（秒）
 
-_STREAM_SENTINEL = object()
 
+@app.ping
+def ping_status():
+    """起動時のウォームアップ中は HealthyBusy（終わったら処理中のタスクの有無で自動判定）"""
+    return "HealthyBusy" if warmup_in_progress() else None
 
-async def _safe_anext(aiter):
-    """StopAsyncIterationをセンチネル値に変換（asyncio.ensure_future対応）"""
-    try:
-        return await aiter.__anext__()
-    except StopAsyncIteration:
-        return _STREAM_SENTINEL
 
+def _run_export(func, format_label: str, markdown: str, theme: str, cancel_event) -> asyncio.Future:
+    """変換処理をスレッドプールで実行し、キュー待ちと変換本体の時間を分けて計測する"""
+    submitted_at = time.perf_counter()
+    slide_count = count_slides(markdown)
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """PDFからテキストを抽出"""
-    text_parts = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_parts.append(page_text)
+    def run():
+        record_interval("export.queue_wait", submitted_at, format=format_label, theme=theme)
+        with phase("export.render", format=format_label, theme=theme, slide_count=slide_count):
+            return func(markdown, theme, cancel_event=cancel_event)
 
-    full_text = "\n\n".join(text_parts)
-    if len(full_text) > MAX_EXTRACTED_CHARS:
-        full_text = full_text[:MAX_EXTRACTED_CHARS] + "\n\n（以降省略）"
-    return full_text
+    # run_in_executorはコンテキストを引き継がないため、スパンの親子関係を保つようコピーして渡す
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(None, context.run, run)
 
 
-async def _wait_with_keepalive(task, format_name):
-    """タスク完了を待ちつつ、5秒ごとにSSE keep-aliveイベントをyield"""
-    while not task.done():
-        try:
-            await asyncio.wait_for(asyncio.shield(task), timeout=5.0)
-        except asyncio.TimeoutError:
-            yield {"type": "progress", "message": f"{format_name}変換中..."}
+async def _wait_with_keepalive(task, format_name, cancel_event):
+    """タスク完了を待ちつつ、無通信が続いたらSSE keep-aliveイベントをyield
+
+    完了前にクライアントが切断した場合は cancel_event をセットし、Marp CLIを止めさせる
+    """
+    mux = StreamMultiplexer(STREAM_KEEPALIVE_INTERVAL, f"{format_name}変換中...", cancel_event=cancel_event)
+    mux.attach_task(task)
+    try:
+        async for event in mux:
+            yield event
+    finally:
+        await mux.aclose()
 
 
 @app.entrypoint
 async def invoke(payload, context=None):
     """エージェント実行（ストリーミング対応）"""
-    # グローバル状態をリセット
-    reset_generated_markdown()
-    reset_generated_tweet_url()
-    reset_last_search_result()
+    invoke_started_at = time.perf_counter()
+    # リクエスト単位のツール状態を作成（同一プロセスの並行リクエストと共有しない）
+    state = start_request_state()
 
     user_message = payload.get("prompt", "")
     action = payload.get("action", "chat")
@@ -79,15 +94,14 @@ async def invoke(payload, context=None):
     model_type = normalize_model_type(payload.get("model_type"))
     session_id = getattr(context, 'session_id', None) if context else None
     theme = payload.get("theme", "border")
-    reference_file = payload.get("reference_file")
+    reference_files = reference_files_from_payload(payload)
 
     # PDF出力
     if action == "export_pdf" and current_markdown:
         try:
             print(f"[INFO] PDF export started (theme={theme})")
-            loop = asyncio.get_event_loop()
-            task = loop.run_in_executor(None, generate_pdf, current_markdown, theme)
-            async for event in _wait_with_keepalive(task, "PDF"):
+            task = _run_export(generate_pdf, "pdf", current_markdown, theme, state.cancel_event)
+            async for event in _wait_with_keepalive(task, "PDF", state.cancel_event):
                 yield event
             pdf_bytes = task.result()
             pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
@@ -102,9 +116,8 @@ async def invoke(payload, context=None):
     if action == "export_pptx" and current_markdown:
         try:
             print(f"[INFO] PPTX export started (theme={theme})")
-            loop = asyncio.get_event_loop()
-            task = loop.run_in_executor(None, generate_pptx, current_markdown, theme)
-            async for event in _wait_with_keepalive(task, "PPTX"):
+            task = _run_export(generate_pptx, "pptx", current_markdown, theme, state.cancel_event)
+            async for event in _wait_with_keepalive(task, "PPTX", state.cancel_event):
                 yield event
             pptx_bytes = task.result()
             pptx_base64 = base64.b64encode(pptx_bytes).decode("utf-8")
@@ -119,9 +132,8 @@ async def invoke(payload, context=None):
     if action == "export_pptx_editable" and current_markdown:
         try:
             print(f"[INFO] Editable PPTX export started (theme={theme})")
-            loop = asyncio.get_event_loop()
-            task = loop.run_in_executor(None, generate_editable_pptx, current_markdown, theme)
-            async for event in _wait_with_keepalive(task, "編集可能PPTX"):
+            task = _run_export(generate_editable_pptx, "pptx_editable", current_markdown, theme, state.cancel_event)
+            async for event in _wait_with_keepalive(task, "編集可能PPTX", state.cancel_event):
                 yield event
             pptx_bytes = task.result()
             pptx_base64 = base64.b64encode(pptx_bytes).decode("utf-8")
@@ -136,9 +148,8 @@ async def invoke(payload, context=None):
     if action == "share_slide" and current_markdown:
         try:
             print(f"[INFO] Slide share started (theme={theme})")
-            loop = asyncio.get_event_loop()
-            task = loop.run_in_executor(None, share_slide, current_markdown, theme)
-            async for event in _wait_with_keepalive(task, "共有"):
+            task = _run_export(share_slide, "share", current_markdown, theme, state.cancel_event)
+            async for event in _wait_with_keepalive(task, "共有", state.cancel_event):
                 yield event
             result = task.result()
             print(f"[INFO] Slide share completed (url={result['url']})")
@@ -152,143 +163,204 @@ async def invoke(payload, context=None):
             yield {"type": "error", "message": str(e)}
         return
 
-    # 参考資料PDFの処理
-    if reference_file:
+    # 参考資料（PDF・テキスト、複数可）の処理
+    if reference_files:
         try:
-            file_name = reference_file.get("file_name", "upload.pdf")
-            base64_data = reference_file.get("base64_data", "")
-            file_size = reference_file.get("size", 0)
-
-            if file_size > MAX_PDF_SIZE:
-                yield {"type": "error", "error": "ファイルサイズが10MBを超えています"}
-                return
-
+            check_reference_files(reference_files)
             yield {"type": "status", "data": "参考資料を読み込んでいます..."}
-            print(f"[INFO] PDF upload received: {file_name} ({file_size} bytes)")
-
-            pdf_bytes = base64.b64decode(base64_data)
-            pdf_path = f"/tmp/{file_name}"
-            with open(pdf_path, "wb") as f:
-                f.write(pdf_bytes)
-
-            extracted_text = extract_text_from_pdf(pdf_path)
-
-            # 一時ファイルを削除
-            os.remove(pdf_path)
+            print("[INFO] Reference files received: "
+                  + ", ".join(f"{file.get('file_name')} ({file.get('size', 0)} bytes)" for file in reference_files))
+
+            # デコード・抽出ともイベントループを止めないよう別スレッド・別プロセスで行う（一時ファイルは作らない）
+            decoded_files = await decode_reference_files(reference_files)
+
+            mux = StreamMultiplexer(STREAM_KEEPALIVE_INTERVAL, "参考資料を読み込んでいます...",
+                                    cancel_event=state.cancel_event)
+            several = len(decoded_files) > 1
+
+            def on_progress(file_name: str, pages_read: int, page_count: int) -> None:
+                label = f"{file_name} " if several else ""
+                mux.publish({"type": "status", "data": f"参考資料を読み込んでいます...（{label}{pages_read}/{page_count}ページ）"})
+
+            with phase("reference.extract", file_count=len(decoded_files),
+                       total_size=sum(len(file.data) for file in decoded_files)) as extraction_phase:
+                task = asyncio.ensure_future(
+                    load_reference_files(decoded_files, MAX_EXTRACTED_CHARS, on_progress, state.cancel_event,
+                                         cache=get_extraction_cache())
+                )
+                mux.attach_task(task)
+                try:
+                    async for event in mux:
+                        yield event
+                finally:
+                    await mux.aclose()
+                documents = task.result()
+                extraction_phase.set(
+                    extracted_chars=sum(len(document.text) for document in documents),
+                    page_count=sum(document.page_count for document in documents),
+                    truncated=any(document.truncated for document in documents),
+                    failed=sum(1 for document in documents if document.error),
+                )
+
+            # ファイルごとの失敗・抽出ゼロを通知し、読めたファイルだけを使う（順序はペイロードどおり）
+            usable = []
+            for document in documents:
+                if document.error:
+                    yield {"type": "text", "data": f"「{document.file_name}」の読み取りに失敗しました: {document.error}\n\n"}
+                elif not document.text.strip():
+                    print(f"[WARN] No text extracted from reference: {document.file_name}")
+                    yield {"type": "text", "data": f"「{document.file_name}」からテキストを抽出できませんでした（画像ベースのPDFの可能性があります）。\n\n"}
+                else:
+                    print(f"[INFO] Reference text extracted: {len(document.text)} chars from {document.file_name} "
+                          f"(cached={document.cached})")
+                    usable.append(document)
 
-            if not extracted_text.strip():
-                print(f"[WARN] No text extracted from PDF: {file_name}")
-                yield {"type": "text", "data": "このPDFからテキストを抽出できませんでした（画像ベースのPDFの可能性があります）。テキスト情報なしでスライドを作成します。\n\n"}
+            if not usable:
+                yield {"type": "text", "data": "テキスト情報なしでスライドを作成します。\n\n"}
             else:
-                print(f"[INFO] PDF text extracted: {len(extracted_text)} chars from {file_name}")
-                user_message = f"""以下は参考資料「{file_name}」の内容です：
+                # チャンクに分けてBM25で索引し、依頼に関連する箇所だけを全ファイル共通のトークン予算内で入れる
+                with phase("reference.select") as select_phase:
+                    reference = await asyncio.to_thread(build_reference_index, usable)
+                    selection = reference.select(user_message, token_budget())
+                    select_phase.set(
+                        chunks_total=selection.total_chunks,
+                        chunks_selected=len(selection.chunks),
+                        document_tokens=selection.document_tokens,
+                        selected_tokens=selection.selected_tokens,
+                    )
+                if session_id and session_index_enabled():
+                    remember_session_reference(session_id, reference)
+
+                print(f"[INFO] Reference selection: chunks={len(selection.chunks)}/{selection.total_chunks}, "
+                      f"tokens={selection.selected_tokens}/{selection.document_tokens}")
+                names = "・".join(f"「{name}」" for name in reference.file_names)
+                if selection.complete:
+                    heading = f"以下は参考資料{names}の内容です："
+                else:
+                    heading = f"以下は参考資料{names}から、依頼に関連する部分を抜粋したものです（[p.N]はページ番号）："
+                user_message = f"""{heading}
 
----参考資料ここから---
-{extracted_text}
----参考資料ここまで---
+{reference.format(selection)}
 
 上記の参考資料を踏まえて、{user_message}"""
 
+        except ReferenceFileError as e:
+            yield {"type": "error", "error": str(e)}
+            return
         except Exception as e:
-            print(f"[ERROR] PDF processing failed: {e}")
-            yield {"type": "text", "data": f"PDFの読み取りに失敗しました: {e}\nテキスト情報なしでスライドを作成します。\n\n"}
-
-    # セッションIDとモデルタイプとテーマに対応するAgentを取得
-    agent = get_or_create_agent(session_id, model_type, theme)
+            print(f"[ERROR] Reference processing failed: {e}")
+            yield {"type": "text", "data": f"参考資料の読み取りに失敗しました: {e}\nテキスト情報なしでスライドを作成します。\n\n"}
+
+    # 同じセッションで以前に添付された参考資料から、今回の依頼に関連する未送信の箇所を追加する
+    elif session_id and session_index_enabled():
+        reference = get_session_reference(session_id)
+        if reference is not None:
+            with phase("reference.select", follow_up=True) as select_phase:
+                selection = reference.select(user_message, token_budget(), follow_up=True)
+                select_phase.set(
+                    chunks_total=selection.total_chunks,
+                    chunks_selected=len(selection.chunks),
+                    selected_tokens=selection.selected_tokens,
+                )
+            if selection.chunks:
+                print(f"[INFO] Reference follow-up excerpt: {len(selection.chunks)} chunks "
+                      f"({selection.selected_tokens} tokens)")
+                names = "・".join(f"「{name}」" for name in reference.file_names)
+                user_message = f"""以下は参考資料{names}から、今回の依頼に関連する部分を追加で抜粋したものです（[p.N]はページ番号）：
+
+{reference.format(selection)}
+
+{user_message}"""
+
+    # MODEL_FALLBACKS が指定されていれば、スロットリング中・失敗続きのモデルは代わりのモデルに回す
+    router = get_model_router()
+    if router is not None:
+        model_type = router.choose(model_type)
+
+    # セッションIDに対応するAgentを取得（モデルを切り替えた場合も会話履歴を引き継ぐ）
+    with phase("agent.get_or_create", model_type=model_type, theme=theme) as lookup:
+        agent = get_or_create_agent(session_id, model_type)
+        lookup.set(history_messages=len(agent.messages))
 
     # 既存セッション（Agent履歴にスライド内容が残っている）ではMarkdown付加をスキップ
     # 新規セッションまたは履歴がない場合のみ、フロントからのMarkdownをメッセージに結合
     if current_markdown and not agent.messages:
         user_message = f"現在のスライド:\n```markdown\n{current_markdown}\n```\n\nユーザーの指示: {user_message}"
 
-    reset_generated_markdown()
     configure_slide_validation(user_message, model_type)
-    web_search_executed = False
-    slide_outputted = False
-    suppress_text = False
+    validation_message = user_message
+    # テーマはシステムプロンプトに入れず、ターンごとに指定する（切り替えても履歴とプロンプトキャッシュを保つ）
+    user_message = format_turn_context(theme, user_message)
+    # patch_slidesはフロントから受け取った現在のスライドを適用元にする
+    set_current_markdown(current_markdown)
+    translator = ChatEventTranslator()
     stream_error = False
 
+    # モデルのストリームと、output_slide / patch_slides が受け入れたスライドの通知（ツールスレッドから）を
+    # 1本のイベント列にまとめる。テキストdeltaは文字数・待ち時間の予算内で結合してSSEフレーム数を減らす
+    # クライアントが切断したら cancel_event でStrands（モデルのストリーム）とツールに中断を伝える
+    mux = StreamMultiplexer(
+        STREAM_KEEPALIVE_INTERVAL,
+        coalescer=create_text_coalescer(),
+        cancel_event=state.cancel_event,
+    )
+    state.subscribe_markdown(
+        asyncio.get_running_loop(),
+        lambda markdown: mux.publish(markdown, translator.on_markdown),
+    )
+
+    # ルーターが有効なら、初回出力の前のスロットリング・エラー・遅れに代わりのモデルで備える（応答したほうを採用）
+    turn = None
+    if router is not None:
+        turn = RoutedTurn(router, session_id, agent, model_type, state.cancel_event,
+                          on_switch=lambda fallback: configure_slide_validation(validation_message, fallback))
+
+    stream_started_at = time.perf_counter()
     try:
-        stream = agent.stream_async(user_message)
-        stream_iter = stream.__aiter__()
-        pending = asyncio.ensure_future(_safe_anext(stream_iter))
-
-        while True:
-            done, _ = await asyncio.wait({pending}, timeout=STREAM_KEEPALIVE_INTERVAL)
-            if not done:
-                yield {"type": "progress", "message": "処理中..."}
-                continue
-            event = pending.result()
-            if event is _STREAM_SENTINEL:
-                break
-            if "data" in event:
-                # output_slide完了後はテキスト送信を抑制
-                if not suppress_text:
-                    # ツール実行でmarkdownがセットされていたら即座に送信＆抑制開始
-                    generated_markdown = get_generated_markdown()
-                    if generated_markdown:
-                        yield {"type": "markdown", "data": generated_markdown}
-                        reset_generated_markdown()
-                        slide_outputted = True
-                        suppress_text = True
-                    else:
-                        chunk = event["data"]
-                        yield {"type": "text", "data": chunk}
-
-            elif "current_tool_use" in event:
-                tool_info = event["current_tool_use"]
-                tool_name = tool_info.get("name", "unknown")
-                tool_input = tool_info.get("input", {})
-
-                # 文字列の場合はJSONパースを試みる
-                if isinstance(tool_input, str):
-                    try:
-                        tool_input = json.loads(tool_input)
-                    except json.JSONDecodeError:
-                        pass
-
-                if tool_name == "web_search":
-                    web_search_executed = True
-                    if isinstance(tool_input, dict) and "query" in tool_input:
-                        yield {"type": "tool_use", "data": tool_name, "query": tool_input["query"]}
-                elif tool_name == "http_request":
-                    if isinstance(tool_input, dict) and "url" in tool_input:
-                        yield {"type": "tool_use", "data": tool_name, "query": tool_input["url"]}
-                    else:
-                        yield {"type": "tool_use", "data": tool_name}
-                else:
-                    yield {"type": "tool_use", "data": tool_name}
-
-            elif "result" in event:
-                result = event["result"]
-                if hasattr(result, 'message') and result.message:
-                    for content in getattr(result.message, 'content', []):
-                        if hasattr(content, 'text') and content.text:
-                            yield {"type": "text", "data": content.text}
-
-                # ツール完了直後にマークダウンを送信（スピナーを即座に停止）
-                generated_markdown = get_generated_markdown()
-                if generated_markdown:
-                    yield {"type": "markdown", "data": generated_markdown}
-                    reset_generated_markdown()
-                    slide_outputted = True
-                    suppress_text = True
-
-            pending = asyncio.ensure_future(_safe_anext(stream_iter))
-
+        if turn is not None:
+            mux.attach(turn.stream(user_message), translator.on_stream_event)
+        else:
+            mux.attach(stream_agent(agent, user_message, state.cancel_event), translator.on_stream_event)
+        async for event in mux:
+            yield event
+
+    except (asyncio.CancelledError, GeneratorExit):
+        print(f"[INFO] Client disconnected, cancelling stream (model_type={model_type})")
+        record_interval("chat.stream", stream_started_at, model_type=model_type, theme=theme, outcome="cancelled")
+        raise
     except Exception as e:
         stream_error = True
         print(f"[ERROR] Stream failed (model_type={model_type}): {e}")
+        for event in mux.flush():
+            yield event
         yield {"type": "error", "error": str(e)}
-
-    # マークダウン出力
-    generated_markdown = get_generated_markdown()
-    if generated_markdown:
-        yield {"type": "markdown", "data": generated_markdown}
+    finally:
+        state.unsubscribe_markdown()
+        await mux.aclose()
+        if turn is not None:
+            agent, model_type = turn.agent, turn.model_type
+
+    # モデルの初回出力・markdown送信・ストリーム全体の所要時間
+    slide_count = count_slides(state.generated_markdown) if state.generated_markdown else None
+    if translator.first_token_at is not None:
+        record_interval("chat.first_token", stream_started_at, translator.first_token_at,
+                        model_type=model_type, theme=theme)
+    if translator.markdown_at is not None:
+        record_interval("chat.markdown", invoke_started_at, translator.markdown_at,
+                        model_type=model_type, theme=theme, slide_count=slide_count)
+    record_interval("chat.stream", stream_started_at, model_type=model_type, theme=theme,
+                    slide_count=slide_count, outcome="error" if stream_error else "ok")
+    # 会話履歴のスナップショット（メモリから追い出された後・再起動後に読み戻す）。失敗したターンは保存しない
+    # 長い履歴のJSON化はイベントループを止めるため別スレッドで行う（応答を終える前なので、次のターンと重ならない）
+    if not stream_error:
+        await asyncio.to_thread(save_session_snapshot, session_id, agent)
+    # プロンプトキャッシュの読み込み・書き込みトークン数（キャッシュが止まるとすべて miss になる）
+    if translator.usage:
+        record_cache_usage(model_type, translator.usage, uses_prompt_cache(model_type))
 
     # Web検索後にスライドが生成されなかった場合のフォールバック
-    last_search_result = get_last_search_result()
-    if web_search_executed and not slide_outputted and last_search_result:
+    last_search_result = state.last_search_result
+    if translator.web_search_executed and not translator.slide_outputted and last_search_result:
         truncated_result = last_search_result[:500]
         if len(last_search_result) > 500:
             truncated_result += "..."
@@ -297,12 +369,29 @@ async def invoke(payload, context=None):
         yield {"type": "text", "data": fallback_message}
 
     # ツイートURL出力
-    generated_tweet_url = get_generated_tweet_url()
+    generated_tweet_url = state.generated_tweet_url
     if generated_tweet_url:
         yield {"type": "tweet_url", "data": generated_tweet_url}
 
     yield {"type": "done"}
 
 
+def main() -> None:
+    """ランタイムを起動する（コンテナでは main.py から呼ぶ）"""
+    port = worker_port()
+    if port is None and runtime_workers() > 1:
+        # ルーターとして起動し、ワーカー（main.py）をN個立ち上げて中継する
+        from workers.router import run_router
+        run_router(runtime_workers())
+    else:
+        if is_primary_worker():
+            # キャッシュするプレフィックスの最低トークン数を確認（CountTokens APIを呼ぶため起動は待たせない）
+            threading.Thread(target=verify_prompt_cache_layout, name="prompt-cache-check", daemon=True).start()
+        # RUNTIME_WARMUP が指定されていれば、エクスポート・PDF抽出・モデルの初回コストを先に払う
+        start_warmup()
+        # ワーカーはルーターからだけ受けるため、ループバックで待ち受ける
+        app.run(port=port or 8080, host="127.0.0.1" if port else None)
+
+
 if __name__ == "__main__":
-    app.run()
+    main()
@@ -1,6 +1,23 @@
 """モデル設定・定数・システムプロンプト"""
 
 import os
+from collections.abc import Callable
+
+
+def env_number(name: str, default, minimum=0, cast: Callable[[str], int | float] = int):
+    """数値の環境変数を読む（未設定は default、読めない値は警告して default、minimum 未満は minimum にする）
+
+    minimum=None なら下限を設けない。
+    """
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        print(f"[WARN] Invalid {name}={value!r}, using default {default}")
+        return default
+    return number if minimum is None else max(number, minimum)
 
 
 def _get_required_model_id(environment_variable: str) -> str:
@@ -55,8 +72,8 @@ def get_model_config(model_type: str = "sonnet") -> dict:
             MODEL_ENVIRONMENT_VARIABLES[normalized_model_type]
         ),
         # OSS系モデルはBedrockのプロンプトキャッシュを使用しない。
-        "cache_prompt": "default" if uses_prompt_cache else None,
-        "cache_tools": "default" if uses_prompt_cache else None,
+        # キャッシュポイントの配置は session/prompt_cache.py（ツール定義・システムプロンプトの末尾）
+        "prompt_cache": uses_prompt_cache,
     }
 
 
@@ -110,16 +127,29 @@ MODEL_SPECIFIC_PROMPTS = {
 }
 
 
-def get_system_prompt(theme: str = "speee", model_type: str = "sonnet") -> str:
-    """テーマに応じたシステムプロンプトを生成"""
+def get_system_prompt(theme: str | None = "speee", model_type: str = "sonnet") -> str:
+    """テーマに応じたシステムプロンプトを生成
+
+    theme=None の場合はテーマを含めず、各ターンのユーザーメッセージ冒頭（format_turn_context）で指定する。
+    テーマを切り替えてもシステムプロンプトが変わらないため、会話履歴とプロンプトキャッシュを引き継げる。
+    """
     model_prompt = MODEL_SPECIFIC_PROMPTS.get(model_type, "")
+    if theme:
+        theme_rule = f"スライドのフロントマターには `theme: {theme}` を使用してください。"
+    else:
+        theme_rule = "スライドのフロントマターの `theme` には、最新のユーザーメッセージ冒頭の [テーマ: ...] で指定されたものを使用してください。"
     return f"""あなたは「パワポ作るマン」、Marp形式スライド作成AIアシスタントです。
 ユーザーと壁打ちしながらスライドの完成度を高めます。現在は2026年です。
-スライドのフロントマターには `theme: {theme}` を使用してください。
+{theme_rule}
 各ツールのdocstringに記載されたルールに従って動作してください。
 {model_prompt}
 """
 
 
+def format_turn_context(theme: str, user_message: str) -> str:
+    """ターンごとのコンテキスト（テーマ）をユーザーメッセージの冒頭に付ける"""
+    return f"[テーマ: {theme}]\n{user_message}"
+
+
 # 後方互換性のため、デフォルトテーマのプロンプトも残す
 SYSTEM_PROMPT = get_system_prompt("border")
@@ -1,6 +1,7 @@
 """スライドエクスポート機能のエクスポート"""
 
 from .slide_exporter import (
+    ExportCancelledError,
     generate_pdf,
     generate_pptx,
     generate_editable_pptx,
@@ -9,6 +10,7 @@ from .slide_exporter import (
 )
 
 __all__ = [
+    "ExportCancelledError",
     "generate_pdf",
     "generate_pptx",
     "generate_editable_pptx",
@@ -1,11 +1,61 @@
 """スライドエクスポート（PDF/PPTX/HTML/サムネイル生成）"""
 
+import os
+import signal
 import subprocess
 import tempfile
+import threading
+import time
 from pathlib import Path
 
-
-def _run_marp_cli(markdown: str, output_format: str, theme: str = 'border', editable: bool = False) -> Path:
+MARP_TIMEOUT = 120  # Marp CLIのタイムアウト（秒）
+CANCEL_POLL_INTERVAL = 0.1  # 中断・タイムアウトを確認する間隔（秒）
+
+
+class ExportCancelledError(RuntimeError):
+    """クライアント切断により変換を中断した"""
+
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    """Marp CLIと、そこから起動されたChromium等の子プロセスをまとめて終了させる"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.communicate()
+
+
+def _run_process(cmd: list[str], cancel_event: threading.Event | None) -> subprocess.CompletedProcess:
+    """プロセスグループを分けて起動し、完了・中断・タイムアウトのいずれかまで待つ"""
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + MARP_TIMEOUT
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=CANCEL_POLL_INTERVAL)
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            pass
+        if cancel_event is not None and cancel_event.is_set():
+            _kill_process_group(proc)
+            raise ExportCancelledError("クライアントが切断したため変換を中断しました")
+        if time.monotonic() >= deadline:
+            _kill_process_group(proc)
+            raise subprocess.TimeoutExpired(cmd, MARP_TIMEOUT)
+
+
+def _run_marp_cli(
+    markdown: str,
+    output_format: str,
+    theme: str = 'border',
+    editable: bool = False,
+    cancel_event: threading.Event | None = None,
+) -> Path:
     """Marp CLIを実行して出力ファイルのパスを返す（共通処理）
 
     Args:
@@ -13,6 +63,7 @@ def _run_marp_cli(markdown: str, output_format: str, theme: str = 'border', edit
         output_format: 出力形式（"pdf", "pptx", "html", "png"）
         theme: テーマ名
         editable: PPTXを編集可能形式で出力（LibreOffice必要）
+        cancel_event: セットされたらMarp CLIをプロセスグループごと終了させる
 
     Returns:
         出力ファイルのPath
@@ -53,7 +104,7 @@ def _run_marp_cli(markdown: str, output_format: str, theme: str = 'border', edit
     if theme_path.exists():
         cmd.extend(["--theme", str(theme_path)])
 
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    result = _run_process(cmd, cancel_event)
 
     if result.returncode != 0:
         raise RuntimeError(f"Marp CLI error: {result.stderr}")
@@ -61,33 +112,33 @@ def _run_marp_cli(markdown: str, output_format: str, theme: str = 'border', edit
     return output_path
 
 
-def generate_pdf(markdown: str, theme: str = 'border') -> bytes:
+def generate_pdf(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> bytes:
     """Marp CLIでPDFを生成"""
-    output_path = _run_marp_cli(markdown, "pdf", theme)
+    output_path = _run_marp_cli(markdown, "pdf", theme, cancel_event=cancel_event)
     return output_path.read_bytes()
 
 
-def generate_pptx(markdown: str, theme: str = 'border') -> bytes:
+def generate_pptx(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> bytes:
     """Marp CLIでPPTXを生成"""
-    output_path = _run_marp_cli(markdown, "pptx", theme)
+    output_path = _run_marp_cli(markdown, "pptx", theme, cancel_event=cancel_event)
     return output_path.read_bytes()
 
 
-def generate_editable_pptx(markdown: str, theme: str = 'border') -> bytes:
+def generate_editable_pptx(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> bytes:
     """Marp CLIで編集可能なPPTXを生成（実験的機能、LibreOffice必要）"""
-    output_path = _run_marp_cli(markdown, "pptx", theme, editable=True)
+    output_path = _run_marp_cli(markdown, "pptx", theme, editable=True, cancel_event=cancel_event)
     return output_path.read_bytes()
 
 
-def generate_standalone_html(markdown: str, theme: str = 'border') -> str:
+def generate_standalone_html(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> str:
     """Marp CLIでスタンドアロンHTMLを生成（共有用）"""
-    output_path = _run_marp_cli(markdown, "html", theme)
+    output_path = _run_marp_cli(markdown, "html", theme, cancel_event=cancel_event)
     return output_path.read_text(encoding="utf-8")
 
 
-def generate_thumbnail(markdown: str, theme: str = 'border') -> bytes:
+def generate_thumbnail(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> bytes:
     """Marp CLIで1枚目のスライドをPNG画像として生成（OGP用サムネイル）"""
-    output_path = _run_marp_cli(markdown, "png", theme)
+    output_path = _run_marp_cli(markdown, "png", theme, cancel_event=cancel_event)
 
     # Marpは複数スライドの場合 slide.001.png, slide.002.png... を生成
     # 1枚目のサムネイルを取得
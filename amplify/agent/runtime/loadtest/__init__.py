@@ -0,0 +1 @@
+"""invoke の負荷試験（台本モデル・ローカルスタブ・負荷生成）"""
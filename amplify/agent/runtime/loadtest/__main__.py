@@ -0,0 +1,194 @@
+"""invoke の負荷試験（Bedrock・Tavily・S3を使わずオフラインで実行）
+
+台本モデル（loadtest/fake_model.py）で多数の invoke セッションを同時に流し、
+スループット・初回テキストまでの時間（TTFT）・イベントループの遅延・セッションあたりのメモリを報告する。
+
+使い方（amplify/agent/runtime から、requirements.txt の依存をインストールした環境で）:
+    python -m loadtest --sessions 50 --turns 2
+    python -m loadtest --sessions 200 --ttft-ms 300 --token-ms 5 --json result.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """最近接順位法のパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(p / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def rss_bytes() -> int | None:
+    """現在の常駐メモリ（Linuxの /proc/self/statm）"""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def monitor_loop_lag(interval: float, samples: list[float], stop: asyncio.Event) -> None:
+    """一定間隔でsleepし、予定より遅れて起きた時間をイベントループの遅延として記録する"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - expected, 0.0))
+
+
+async def run_request(invoke, payload: dict, session_id: str) -> dict:
+    """1リクエスト分のイベントを受信し、クライアント側から見た時間を記録する"""
+    start = time.perf_counter()
+    result = {"ttft": None, "markdown": None, "events": 0, "error": None}
+    try:
+        async for event in invoke(payload, SimpleNamespace(session_id=session_id)):
+            result["events"] += 1
+            elapsed = time.perf_counter() - start
+            if event.get("type") == "text" and result["ttft"] is None:
+                result["ttft"] = elapsed
+            elif event.get("type") == "markdown" and result["markdown"] is None:
+                result["markdown"] = elapsed
+            elif event.get("type") == "error":
+                result["error"] = event.get("error") or event.get("message")
+    except Exception as e:
+        result["error"] = str(e)
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+async def run_session(invoke, args, index: int, results: list[dict]) -> None:
+    """1ユーザー分: 同じセッションIDで turns 回のリクエストを順に送る"""
+    await asyncio.sleep(args.ramp * index / max(args.sessions, 1))
+    session_id = str(uuid.uuid4())
+    prompts = ["生成AIの業務活用について10枚のスライドを作って"] + ["箇条書きをもっと簡潔にして"] * (args.turns - 1)
+    for prompt in prompts:
+        payload = {"prompt": prompt, "model_type": args.model_type, "theme": "border"}
+        results.append(await run_request(invoke, payload, session_id))
+
+
+def _configure_environment(args) -> None:
+    os.environ["AGENT_MODEL_PROVIDER"] = "fake"
+    os.environ["FAKE_MODEL_TTFT_MS"] = str(args.ttft_ms)
+    os.environ["FAKE_MODEL_TOKEN_MS"] = str(args.token_ms)
+    os.environ["FAKE_MODEL_OVERFLOW_RETRIES"] = str(args.overflow_retries)
+    os.environ["FAKE_MODEL_WEB_SEARCH"] = "0" if args.no_web_search else "1"
+    os.environ["FAKE_MODEL_SLIDES"] = str(args.slides)
+
+
+async def run_load_test(args) -> dict:
+    _configure_environment(args)
+    # ランタイムのモジュールは環境変数を設定してから読み込む
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import agent
+    from loadtest.stubs import install_offline_stubs
+
+    stubs = install_offline_stubs(search_latency=args.search_ms / 1000)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_bytes()
+    heap_before = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+
+    lag_samples: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval_ms / 1000, lag_samples, stop))
+
+    results: list[dict] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(agent.invoke, args, index, results) for index in range(args.sessions)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    # セッションのAgent（会話履歴）は保持されたままなので、差分をセッション数で割る
+    rss_after = rss_bytes()
+    heap_after = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+
+    completed = [r for r in results if not r["error"]]
+    ttft = [r["ttft"] for r in completed if r["ttft"] is not None]
+    to_markdown = [r["markdown"] for r in completed if r["markdown"] is not None]
+    totals = [r["total"] for r in completed]
+
+    def summary(values: list[float]) -> dict:
+        return {f"p{p}": percentile(values, p) for p in (50, 95, 99)} | {"max": max(values, default=None)}
+
+    report = {
+        "sessions": args.sessions,
+        "requests": len(results),
+        "errors": len(results) - len(completed),
+        "wall_seconds": wall,
+        "throughput_rps": len(completed) / wall if wall else None,
+        "events_per_request": sum(r["events"] for r in results) / len(results) if results else None,
+        "ttft_seconds": summary(ttft),
+        "markdown_seconds": summary(to_markdown),
+        "total_seconds": summary(totals),
+        "loop_lag_seconds": summary(lag_samples),
+        "rss_per_session_bytes": (rss_after - rss_before) / args.sessions if rss_before and rss_after else None,
+        "heap_per_session_bytes": (heap_after - heap_before) / args.sessions if args.tracemalloc else None,
+        "search_calls": stubs["tavily"].calls,
+        "first_error": next((r["error"] for r in results if r["error"]), None),
+    }
+    if args.tracemalloc:
+        tracemalloc.stop()
+    return report
+
+
+def print_report(report: dict) -> None:
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f}ms"
+
+    def kb(value):
+        return "-" if value is None else f"{value / 1024:.0f}KB"
+
+    print(f"requests: {report['requests']} (errors: {report['errors']}) in {report['wall_seconds']:.1f}s "
+          f"→ {report['throughput_rps']:.2f} req/s, {report['events_per_request']:.0f} SSE events/request")
+    for key, label in [("ttft_seconds", "TTFT"), ("markdown_seconds", "markdown"),
+                       ("total_seconds", "total"), ("loop_lag_seconds", "loop lag")]:
+        stats = report[key]
+        print(f"{label:<9} p50={ms(stats['p50'])} p95={ms(stats['p95'])} p99={ms(stats['p99'])} max={ms(stats['max'])}")
+    print(f"memory/session: rss={kb(report['rss_per_session_bytes'])} heap={kb(report['heap_per_session_bytes'])}")
+    if report["first_error"]:
+        print(f"first error: {report['first_error']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="同時に動かすセッション数")
+    parser.add_argument("--turns", type=int, default=1, help="1セッションあたりのリクエスト数（2回目以降は修正依頼）")
+    parser.add_argument("--ramp", type=float, default=1.0, help="全セッションを開始し終えるまでの秒数")
+    parser.add_argument("--model-type", default="sonnet")
+    parser.add_argument("--ttft-ms", type=float, default=800, help="台本モデルの初回トークンまでの時間")
+    parser.add_argument("--token-ms", type=float, default=20, help="台本モデルのチャンク間隔")
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--overflow-retries", type=int, default=1, help="あふれるデッキを出す回数")
+    parser.add_argument("--no-web-search", action="store_true")
+    parser.add_argument("--search-ms", type=float, default=300, help="スタブ検索の応答時間")
+    parser.add_argument("--lag-interval-ms", type=float, default=50, help="イベントループ遅延の計測間隔")
+    parser.add_argument("--tracemalloc", action="store_true", help="Pythonヒープのセッションあたり増分も計測（遅くなる）")
+    parser.add_argument("--quiet", action="store_true", help="実行中の標準出力（エージェントの応答テキスト）を表示しない")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    # Strandsの標準コールバック（テキストの標準出力）は本番と同じく動かし、表示だけ捨てる
+    with contextlib.redirect_stdout(open(os.devnull, "w")) if args.quiet else contextlib.nullcontext():
+        report = asyncio.run(run_load_test(args))
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""負荷試験用の台本モデル（Bedrockを呼ばないStrandsモデルプロバイダー）
+
+環境変数 `AGENT_MODEL_PROVIDER=fake` のとき session.manager._create_model がこのモデルを返す。
+実モデルに近いタイミング（初回トークンまでの待ち・トークン間隔）で、次の流れを再生する：
+
+1. 前置きのテキスト → web_search（FAKE_MODEL_WEB_SEARCH=1 のとき）
+2. output_slide（FAKE_MODEL_OVERFLOW_RETRIES 回はあふれるデッキを出し、検証のリトライを発生させる）
+3. 受け入れられたら締めのテキストで終了
+
+どのステップかは会話履歴（直前のユーザー発話以降のツール呼び出しと結果）から判断するため、
+Strandsのイベントループ・ツール実行・output_slideの検証は本番と同じコードが動く。
+"""
+
+import asyncio
+import json
+import os
+import random
+import uuid
+from collections.abc import AsyncGenerator, AsyncIterable
+from dataclasses import asdict, dataclass, replace
+from typing import Any
+
+from strands.models import Model
+
+from config import env_number
+
+
+@dataclass
+class FakeModelConfig:
+    """台本モデルのタイミングとシナリオ"""
+
+    model_id: str = "fake-sonnet"
+    ttft: float = 0.8                 # リクエストから最初のトークンまで（秒）
+    token_interval: float = 0.02      # チャンク間隔（秒）
+    jitter: float = 0.3               # 間隔のゆらぎ（±割合）
+    text_chunk_chars: int = 4         # テキスト1チャンクの文字数
+    tool_chunk_chars: int = 16        # ツール入力JSON 1チャンクの文字数
+    slide_count: int = 10
+    overflow_retries: int = 1         # あふれるデッキを出す回数
+    web_search: bool = True
+    seed: int | None = None
+
+
+def config_from_env(model_type: str = "sonnet") -> FakeModelConfig:
+    """FAKE_MODEL_* 環境変数から設定を作る（時間はミリ秒で指定）"""
+    return FakeModelConfig(
+        model_id=f"fake-{model_type}",
+        ttft=env_number("FAKE_MODEL_TTFT_MS", 800, cast=float) / 1000,
+        token_interval=env_number("FAKE_MODEL_TOKEN_MS", 20, cast=float) / 1000,
+        jitter=env_number("FAKE_MODEL_JITTER", 0.3, cast=float),
+        text_chunk_chars=env_number("FAKE_MODEL_TEXT_CHUNK_CHARS", 4, minimum=1),
+        tool_chunk_chars=env_number("FAKE_MODEL_TOOL_CHUNK_CHARS", 16, minimum=1),
+        slide_count=env_number("FAKE_MODEL_SLIDES", 10),
+        overflow_retries=env_number("FAKE_MODEL_OVERFLOW_RETRIES", 1),
+        web_search=os.getenv("FAKE_MODEL_WEB_SEARCH", "1").strip() != "0",
+        seed=env_number("FAKE_MODEL_SEED", 0, minimum=None) or None,
+    )
+
+
+_BODY_TOPICS = [
+    "背景と課題", "現状の整理", "解決のアプローチ", "アーキテクチャ概要", "導入ステップ",
+    "運用体制", "効果測定", "リスクと対策", "今後の展望", "活用事例",
+]
+
+
+def build_deck(slide_count: int, overflow: bool = False) -> str:
+    """検証を通過するデッキ（overflow=True なら2枚目が行数超過）"""
+    slides = ["<!-- _class: top --><!-- _paginate: skip -->\n\n# 負荷試験用スライド\n\n2026年版"]
+    for index in range(2, slide_count):
+        topic = _BODY_TOPICS[(index - 2) % len(_BODY_TOPICS)]
+        # 箇条書き・表・小見出しを交互にして構成チェック（同一パターンの連続）を避ける
+        kind = (index - 2) % 3
+        if overflow and index == 2:
+            body = "\n".join(f"- {topic}の検討項目{n}" for n in range(1, 15))
+        elif kind == 0:
+            body = "\n".join(f"- {topic}のポイント{n}" for n in range(1, 5))
+        elif kind == 1:
+            body = "| 観点 | 内容 |\n|---|---|\n| 目的 | 業務効率化 |\n| 期間 | 3か月 |"
+        else:
+            body = f"### {topic}の要点\n\n段階的に進めて効果を確かめる。"
+        slides.append(f"## {topic}\n\n{body}")
+    slides.append("<!-- _class: end --><!-- _paginate: skip -->\n\n# Thank you!")
+    return "---\nmarp: true\ntheme: border\nsize: 16:9\npaginate: true\n---\n\n" + "\n\n---\n\n".join(slides) + "\n"
+
+
+def _turn_tool_history(messages: list[dict]) -> list[tuple[str, str]]:
+    """直前のユーザー発話以降の（ツール名, 結果テキスト）を呼び出し順に返す"""
+    start = 0
+    for index, message in enumerate(messages):
+        if message.get("role") == "user" and any("text" in block for block in message.get("content", [])):
+            start = index
+    names = {}
+    history = []
+    for message in messages[start:]:
+        for block in message.get("content", []):
+            if "toolUse" in block:
+                names[block["toolUse"]["toolUseId"]] = block["toolUse"]["name"]
+            elif "toolResult" in block:
+                result = block["toolResult"]
+                text = "".join(item.get("text", "") for item in result.get("content", []))
+                history.append((names.get(result.get("toolUseId"), "unknown"), text))
+    return history
+
+
+class FakeStreamingModel(Model):
+    """台本どおりにConverseStream形式のイベントを返すモデル"""
+
+    def __init__(self, config: FakeModelConfig | None = None):
+        self.settings = config or FakeModelConfig()
+        self._rng = random.Random(self.settings.seed)
+
+    @classmethod
+    def from_env(cls, model_type: str = "sonnet") -> "FakeStreamingModel":
+        return cls(config_from_env(model_type))
+
+    @property
+    def config(self) -> dict:
+        # Strandsは model.config.get("model_id") でモデルIDを参照する
+        return self.get_config()
+
+    def update_config(self, **model_config: Any) -> None:
+        self.settings = replace(self.settings, **model_config)
+
+    def get_config(self) -> dict:
+        return asdict(self.settings)
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs) -> AsyncGenerator:
+        raise NotImplementedError("FakeStreamingModel does not support structured output")
+        yield
+
+    def next_step(self, messages: list[dict]) -> tuple[str, str | None, dict | None]:
+        """会話履歴から次の応答を決める: （テキスト, ツール名, ツール入力）"""
+        history = _turn_tool_history(messages)
+        slide_attempts = sum(1 for name, _ in history if name == "output_slide")
+        last_name, last_result = history[-1] if history else (None, "")
+
+        if last_name == "output_slide" and last_result.startswith("スライドを出力しました"):
+            return "スライドが完成しました。修正したい点があれば教えてください。", None, None
+        if not history and self.settings.web_search:
+            return "最新情報を調べてからスライドを作成します。", "web_search", {"query": "生成AI 業務活用 事例"}
+        text = "" if history else "スライドを作成します。"
+        overflow = slide_attempts < self.settings.overflow_retries
+        return text, "output_slide", {"markdown": build_deck(self.settings.slide_count, overflow)}
+
+    async def _pause(self, seconds: float) -> None:
+        if seconds > 0:
+            await asyncio.sleep(seconds * (1 + self._rng.uniform(-self.settings.jitter, self.settings.jitter)))
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs) -> AsyncIterable[dict]:
+        text, tool_name, tool_input = self.next_step(messages)
+        config = self.settings
+
+        await self._pause(config.ttft)
+        yield {"messageStart": {"role": "assistant"}}
+        output_chars = 0
+
+        if text:
+            yield {"contentBlockStart": {"start": {}}}
+            for offset in range(0, len(text), config.text_chunk_chars):
+                if offset:
+                    await self._pause(config.token_interval)
+                yield {"contentBlockDelta": {"delta": {"text": text[offset:offset + config.text_chunk_chars]}}}
+            yield {"contentBlockStop": {}}
+            output_chars += len(text)
+
+        if tool_name:
+            raw_input = json.dumps(tool_input, ensure_ascii=False)
+            yield {"contentBlockStart": {"start": {"toolUse": {"toolUseId": f"tooluse_{uuid.uuid4().hex[:12]}", "name": tool_name}}}}
+            for offset in range(0, len(raw_input), config.tool_chunk_chars):
+                await self._pause(config.token_interval)
+                yield {"contentBlockDelta": {"delta": {"toolUse": {"input": raw_input[offset:offset + config.tool_chunk_chars]}}}}
+            yield {"contentBlockStop": {}}
+            output_chars += len(raw_input)
+
+        yield {"messageStop": {"stopReason": "tool_use" if tool_name else "end_turn"}}
+        # 日本語は概ね1文字1トークン弱。負荷試験では目安で十分
+        input_chars = sum(len(json.dumps(message, ensure_ascii=False)) for message in messages)
+        yield {
+            "metadata": {
+                "usage": {
+                    "inputTokens": input_chars,
+                    "outputTokens": output_chars,
+                    "totalTokens": input_chars + output_chars,
+                },
+                "metrics": {"latencyMs": int(config.ttft * 1000)},
+            }
+        }
@@ -0,0 +1,195 @@
+"""ランタイムの起動時間の計測（importの内訳と、起動して /ping に応答するまでの時間）
+
+コンテナのコールドスタートは `python main.py` から読み込む `agent` の import が大半を占める。
+`-X importtime` の結果をパッケージごとに集計して重い import を一覧にし、
+実際にランタイムを起動して /ping が200を返すまでの時間（time-to-ready）を予算と比べる。
+予算を超えたら終了コード1を返すので、CIや手元で回帰を追える。
+
+使い方（amplify/agent/runtime から、requirements.txt の依存をインストールした環境で）:
+    python -m loadtest.startup
+    python -m loadtest.startup --runs 10 --budget-ms 1500 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+
+RUNTIME_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_READY_BUDGET_MS = 1500.0  # python main.py の起動から /ping が応答するまで
+DEFAULT_IMPORT_BUDGET_MS = 1200.0  # import agent の累積時間
+READY_TIMEOUT_SECONDS = 60.0
+PING_INTERVAL_SECONDS = 0.01
+
+
+@dataclass
+class ImportRecord:
+    """`-X importtime` の1行（時間はマイクロ秒）"""
+
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> list[ImportRecord]:
+    """`-X importtime` の出力を読む（ヘッダーや他のログの行は飛ばす）"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip(" ")
+        records.append(ImportRecord(
+            name=stripped,
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+            depth=(len(name) - len(stripped) - 1) // 2,
+        ))
+    return records
+
+
+def summarize_imports(records: list[ImportRecord], root: str = "agent", top: int = 15) -> dict:
+    """import の内訳をまとめる
+
+    - total_ms: root の累積時間
+    - direct: root が直接 import したモジュールの累積時間（そのモジュールで初めて読み込まれた分）
+    - packages: トップレベルのパッケージごとの自己時間の合計（どの依存が重いか）
+    """
+    total = next((record.cumulative_us for record in records if record.name == root), None)
+    if total is None:
+        total = sum(record.self_us for record in records)
+    # -X importtime は子を親より先に出力するので、root の直前の深さ0の行（site など）より後ろで
+    # root までの深さ1の行が、root が直接 import したもの
+    direct = []
+    for record in records:
+        if record.name == root:
+            break
+        if record.depth == 0:
+            direct = []
+        elif record.depth == 1:
+            direct.append((record.name, record.cumulative_us))
+    packages: dict[str, int] = {}
+    for record in records:
+        package = record.name.split(".")[0]
+        packages[package] = packages.get(package, 0) + record.self_us
+
+    def ranked(items) -> list[dict]:
+        return [{"name": name, "ms": us / 1000} for name, us in sorted(items, key=lambda item: -item[1])[:top]]
+
+    return {"total_ms": total / 1000, "direct": ranked(direct), "packages": ranked(packages.items())}
+
+
+def _runtime_env(**extra: str) -> dict[str, str]:
+    # 台本モデルにして、起動時のプロンプトキャッシュ確認でBedrockを呼ばないようにする
+    return dict(os.environ, AGENT_MODEL_PROVIDER="fake", RUNTIME_WORKERS="1", **extra)
+
+
+def measure_imports(python: str = sys.executable) -> list[ImportRecord]:
+    """別プロセスで `import agent` し、`-X importtime` の結果を返す"""
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", "import agent"],
+        cwd=RUNTIME_DIR, env=_runtime_env(), capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(completed.stderr)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_time_to_ready(python: str = sys.executable, timeout: float = READY_TIMEOUT_SECONDS) -> float:
+    """`python main.py` を起動し、/ping が200を返すまでの秒数を返す（計測後にプロセスは止める）"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/ping"
+    start = time.perf_counter()
+    # ワーカーとしてのポート指定で起動する（ループバックで待ち受け、ワーカー0なので起動時の処理も同じ）
+    process = subprocess.Popen(
+        [python, "main.py"], cwd=RUNTIME_DIR, env=_runtime_env(RUNTIME_WORKER_PORT=str(port)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py exited with code {process.returncode} before becoming ready")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(PING_INTERVAL_SECONDS)
+        raise TimeoutError(f"main.py did not answer /ping within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_benchmark(args) -> dict:
+    # 1回目は .pyc の作成が入るため計測に含めない
+    measure_imports(args.python)
+    imports = summarize_imports(measure_imports(args.python), top=args.top)
+    ready = [measure_time_to_ready(args.python) for _ in range(args.runs)]
+    ready_p50 = statistics.median(ready)
+    return {
+        "runs": args.runs,
+        "import_ms": imports["total_ms"],
+        "import_budget_ms": args.import_budget_ms,
+        "ready_ms": {"p50": ready_p50 * 1000, "max": max(ready) * 1000, "all": [value * 1000 for value in ready]},
+        "ready_budget_ms": args.budget_ms,
+        "over_budget": ready_p50 * 1000 > args.budget_ms or imports["total_ms"] > args.import_budget_ms,
+        "imports": imports,
+    }
+
+
+def print_report(report: dict) -> None:
+    imports = report["imports"]
+    print(f"import agent: {report['import_ms']:.0f}ms (budget {report['import_budget_ms']:.0f}ms)")
+    print("  direct imports (cumulative):")
+    for item in imports["direct"]:
+        print(f"    {item['ms']:8.1f}ms  {item['name']}")
+    print("  packages (self time):")
+    for item in imports["packages"]:
+        print(f"    {item['ms']:8.1f}ms  {item['name']}")
+    ready = report["ready_ms"]
+    print(f"time-to-ready: p50={ready['p50']:.0f}ms max={ready['max']:.0f}ms over {report['runs']} runs "
+          f"(budget {report['ready_budget_ms']:.0f}ms)")
+    if report["over_budget"]:
+        print("OVER BUDGET")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="time-to-ready を計測する回数")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_READY_BUDGET_MS, help="time-to-ready（p50）の予算")
+    parser.add_argument("--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS, help="import agent の予算")
+    parser.add_argument("--top", type=int, default=15, help="内訳に表示する件数")
+    parser.add_argument("--python", default=sys.executable, help="ランタイムを起動するPython")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+    return 1 if report["over_budget"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""負荷試験用のローカルスタブ（Tavily・S3）
+
+ネットワークに出ずに web_search と共有機能が動くよう、ツールが使うクライアントを差し替える。
+"""
+
+import os
+import time
+
+
+class FakeTavilyClient:
+    """TavilyClient.search の代わりに固定の検索結果を返す"""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query: str, **kwargs) -> dict:
+        self.calls += 1
+        time.sleep(self.latency)
+        return {
+            "results": [
+                {
+                    "title": f"{query} に関する記事{n}",
+                    "content": "生成AIの業務活用が進み、開発生産性やドキュメント作成の効率化に効果が出ている。" * 2,
+                    "url": f"https://example.com/articles/{n}",
+                }
+                for n in range(1, 4)
+            ]
+        }
+
+
+class InMemoryS3Client:
+    """boto3 S3クライアントの put_object だけをメモリ上で再現する"""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self.objects[(Bucket, Key)] = Body
+        return {"ETag": f'"{len(Body)}"'}
+
+
+def install_offline_stubs(search_latency: float = 0.3) -> dict:
+    """ツール・共有モジュールのクライアントをスタブに差し替え、差し替えたオブジェクトを返す"""
+    from sharing import s3_uploader
+    from tools import tavily_clients
+
+    tavily = FakeTavilyClient(search_latency)
+    # web_search はモジュール変数のリストを参照するため、中身を入れ替える
+    tavily_clients[:] = [tavily]
+
+    s3 = InMemoryS3Client()
+    s3_uploader._s3_client = s3
+    os.environ.setdefault("SHARED_SLIDES_BUCKET", "loadtest-bucket")
+    os.environ.setdefault("SHARED_SLIDES_PUBLIC_DOMAIN", "loadtest.example.com")
+    return {"tavily": tavily, "s3": s3}
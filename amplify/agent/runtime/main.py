@@ -0,0 +1,11 @@
+"""ランタイムの起動スクリプト（コンテナ・ルーターのワーカーはこのスクリプトで起動する）
+
+multiprocessing のワーカー（参考資料PDFの抽出）は起動時に __main__ を読み込み直すため、
+__main__ をランタイム本体（agent.py）にすると、ワーカーごとに strands・bedrock_agentcore まで import してしまう。
+このスクリプトはモジュールの先頭で何も読み込まず、起動処理は agent.main() に任せる。
+"""
+
+if __name__ == "__main__":
+    import agent
+
+    agent.main()
@@ -0,0 +1,41 @@
+"""参考資料（ユーザーが添付したファイル）の取り込み"""
+
+from .cache import ExtractionCache, get_extraction_cache
+from .loader import (
+    ReferenceDocument,
+    ReferenceFileError,
+    check_reference_files,
+    decode_reference_files,
+    load_reference_files,
+    reference_files_from_payload,
+)
+from .pdf_text import PdfExtraction, extract_pdf_text, get_pdf_executor, prewarm_pdf_executor
+from .retrieval import (
+    ReferenceIndex,
+    build_reference_index,
+    get_session_reference,
+    remember_session_reference,
+    session_index_enabled,
+    token_budget,
+)
+
+__all__ = [
+    "ExtractionCache",
+    "get_extraction_cache",
+    "ReferenceDocument",
+    "ReferenceFileError",
+    "check_reference_files",
+    "decode_reference_files",
+    "load_reference_files",
+    "reference_files_from_payload",
+    "PdfExtraction",
+    "extract_pdf_text",
+    "get_pdf_executor",
+    "prewarm_pdf_executor",
+    "ReferenceIndex",
+    "build_reference_index",
+    "get_session_reference",
+    "remember_session_reference",
+    "session_index_enabled",
+    "token_budget",
+]
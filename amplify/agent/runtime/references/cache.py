@@ -0,0 +1,179 @@
+"""参考資料の抽出結果キャッシュ（内容のハッシュがキー）
+
+同じPDFをターンやセッションをまたいで添付し直しても、pdfplumberの解析をやり直さないようにする。
+
+- メモリ: LRU（テキストの合計サイズで上限）
+- ディスク: `/tmp` 配下のJSON（合計サイズで上限、古い順に削除）。プロセス再起動後やメモリから追い出された後に使う
+
+抽出を途中で打ち切った結果も保存し、要求された文字数を満たす範囲なら再利用する。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from config import env_number
+from telemetry import annotate, count
+
+DEFAULT_CACHE_DIR = "/tmp/marp-agent-reference-cache"
+DEFAULT_MEMORY_MB = 32
+DEFAULT_DISK_MB = 256
+
+
+@dataclass
+class CachedExtraction:
+    """抽出済みテキストとページ位置"""
+
+    text: str
+    page_offsets: list[int]   # 各ページの本文が text の何文字目から始まるか（読んだページのみ）
+    page_count: int
+
+    @property
+    def complete(self) -> bool:
+        return len(self.page_offsets) >= self.page_count
+
+    def covers(self, max_chars: int) -> bool:
+        """max_chars までの抽出要求をこの結果だけで満たせるか"""
+        return self.complete or len(self.text) >= max_chars
+
+
+def content_key(data: bytes) -> str:
+    """ファイル内容のハッシュ（キャッシュキー）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """メモリLRU + ディスクの2段キャッシュ"""
+
+    def __init__(self, memory_bytes: int, disk_dir: str | None, disk_bytes: int):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self._entries: OrderedDict[str, CachedExtraction] = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float | None:
+        lookups = sum(self.hits.values()) + self.misses
+        return sum(self.hits.values()) / lookups if lookups else None
+
+    async def get(self, key: str, max_chars: int) -> CachedExtraction | None:
+        """max_chars までを満たすキャッシュがあれば返す（ヒット・ミスをメトリクスに記録）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.covers(max_chars):
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        if entry is not None:
+            return self._hit("memory", entry)
+
+        if self.disk_dir is not None:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None and entry.covers(max_chars):
+                self._remember(key, entry)
+                return self._hit("disk", entry)
+
+        with self._lock:
+            self.misses += 1
+        count("cache.lookups", cache="reference", result="miss")
+        annotate(cache="miss")
+        return None
+
+    async def put(self, key: str, entry: CachedExtraction) -> None:
+        """抽出結果を保存する（既存より長く読めた場合だけ置き換える）"""
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and (existing.complete or len(existing.text) >= len(entry.text)):
+                return
+        self._remember(key, entry)
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def _hit(self, tier: str, entry: CachedExtraction) -> CachedExtraction:
+        with self._lock:
+            self.hits[tier] += 1
+        count("cache.lookups", cache="reference", result=f"hit_{tier}")
+        annotate(cache=tier)
+        return entry
+
+    def _remember(self, key: str, entry: CachedExtraction) -> None:
+        size = sys.getsizeof(entry.text)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_used -= sys.getsizeof(previous.text)
+            self._entries[key] = entry
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_used -= sys.getsizeof(evicted.text)
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> CachedExtraction | None:
+        path = self._path(key)
+        try:
+            entry = CachedExtraction(**json.loads(path.read_text(encoding="utf-8")))
+            # 最終利用時刻として更新し、ディスクの追い出しをLRUに近づける
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[WARN] Reference cache entry unreadable, ignoring: {path.name} ({e})")
+            return None
+
+    def _write_disk(self, key: str, entry: CachedExtraction) -> None:
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps(asdict(entry), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+            self._trim_disk()
+        except OSError as e:
+            print(f"[WARN] Reference cache write failed: {e}")
+
+    def _trim_disk(self) -> None:
+        """合計サイズが上限を超えたら、最終利用が古いファイルから削除する"""
+        files = []
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+_cache: ExtractionCache | None = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """プロセス共通の抽出キャッシュ（環境変数で容量を変更、0で無効）"""
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache(
+            memory_bytes=env_number("REFERENCE_CACHE_MEMORY_MB", DEFAULT_MEMORY_MB) * 1024 * 1024,
+            disk_dir=os.getenv("REFERENCE_CACHE_DIR", DEFAULT_CACHE_DIR),
+            disk_bytes=env_number("REFERENCE_CACHE_DISK_MB", DEFAULT_DISK_MB) * 1024 * 1024,
+        )
+    return _cache
@@ -0,0 +1,171 @@
+"""参考資料ファイルの読み込み（複数ファイル・PDF / テキスト）
+
+ペイロードの `reference_files`（旧形式の `reference_file` 1件も可）をデコードし、
+サイズ上限を検査したうえで全ファイルを並行して抽出する。PDFはプロセスプール、テキストはスレッドで処理する。
+結果はペイロードの順序どおりに返すため、完了順によってプロンプトが変わることはない。
+"""
+
+import asyncio
+import base64
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import PurePath
+
+from .cache import ExtractionCache
+from .pdf_text import extract_pdf_text
+
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 1ファイル10MB
+MAX_TOTAL_SIZE = 20 * 1024 * 1024  # 1リクエストの合計20MB
+MAX_FILES = 5
+
+PDF_SUFFIXES = {".pdf"}
+TEXT_SUFFIXES = {".txt", ".md", ".markdown"}
+TEXT_ENCODINGS = ("utf-8-sig", "cp932")  # Windowsで保存された日本語のテキストも読めるようにする
+
+
+class ReferenceFileError(ValueError):
+    """リクエスト全体を受け付けない参考資料（サイズ超過・件数超過・未対応の形式）"""
+
+
+@dataclass
+class ReferenceDocument:
+    """1ファイル分の抽出結果（error がある場合は text は空）"""
+
+    file_name: str
+    text: str = ""
+    page_offsets: list[int] = field(default_factory=list)
+    page_count: int = 0
+    truncated: bool = False
+    cached: bool = False
+    error: str | None = None
+
+
+@dataclass
+class DecodedReferenceFile:
+    file_name: str
+    kind: str
+    data: bytes
+
+
+def reference_files_from_payload(payload: dict) -> list[dict]:
+    """`reference_files`（リスト）と旧形式の `reference_file`（1件）をまとめる"""
+    files = list(payload.get("reference_files") or [])
+    if payload.get("reference_file"):
+        files.insert(0, payload["reference_file"])
+    return files
+
+
+def _kind(file: dict) -> str | None:
+    suffix = PurePath(file.get("file_name", "")).suffix.lower()
+    content_type = (file.get("content_type") or "").lower()
+    if suffix in PDF_SUFFIXES or content_type == "application/pdf":
+        return "pdf"
+    if suffix in TEXT_SUFFIXES or content_type.startswith("text/"):
+        return "text"
+    return None
+
+
+def _size_error(file_name: str, limit_mb: int, several: bool) -> ReferenceFileError:
+    if several:
+        return ReferenceFileError(f"「{file_name}」のファイルサイズが{limit_mb}MBを超えています")
+    return ReferenceFileError(f"ファイルサイズが{limit_mb}MBを超えています")
+
+
+def check_reference_files(files: list[dict]) -> None:
+    """申告サイズ・件数・形式を検査する（デコード前に弾けるものはここで弾く）"""
+    if len(files) > MAX_FILES:
+        raise ReferenceFileError(f"参考資料は{MAX_FILES}件までです")
+    several = len(files) > 1
+    for file in files:
+        file_name = file.get("file_name", "upload.pdf")
+        if file.get("size", 0) > MAX_FILE_SIZE:
+            raise _size_error(file_name, MAX_FILE_SIZE // (1024 * 1024), several)
+        if _kind(file) is None:
+            raise ReferenceFileError(f"「{file_name}」は対応していない形式です（PDF・テキスト・Markdownのみ）")
+    if sum(file.get("size", 0) for file in files) > MAX_TOTAL_SIZE:
+        raise ReferenceFileError(f"参考資料の合計サイズが{MAX_TOTAL_SIZE // (1024 * 1024)}MBを超えています")
+
+
+async def decode_reference_files(files: list[dict]) -> list[DecodedReferenceFile]:
+    """Base64をデコードし、実際のサイズで上限を検査し直す（申告サイズは信用しない）"""
+    decoded = []
+    several = len(files) > 1
+    for file in files:
+        file_name = file.get("file_name", "upload.pdf")
+        data = await asyncio.to_thread(base64.b64decode, file.get("base64_data", ""))
+        if len(data) > MAX_FILE_SIZE:
+            raise _size_error(file_name, MAX_FILE_SIZE // (1024 * 1024), several)
+        decoded.append(DecodedReferenceFile(file_name=file_name, kind=_kind(file), data=data))
+    if sum(len(file.data) for file in decoded) > MAX_TOTAL_SIZE:
+        raise ReferenceFileError(f"参考資料の合計サイズが{MAX_TOTAL_SIZE // (1024 * 1024)}MBを超えています")
+    return decoded
+
+
+def _decode_text(data: bytes) -> str:
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+async def _load_one(
+    file: DecodedReferenceFile,
+    max_chars: int,
+    on_progress: Callable[[str, int, int], None] | None,
+    cancel_event: threading.Event | None,
+    cache: ExtractionCache | None,
+) -> ReferenceDocument:
+    try:
+        if file.kind == "text":
+            text = (await asyncio.to_thread(_decode_text, file.data)).strip()
+            if on_progress is not None:
+                on_progress(file.file_name, 1, 1)
+            return ReferenceDocument(
+                file_name=file.file_name,
+                text=text[:max_chars],
+                page_offsets=[0],
+                page_count=1,
+                truncated=len(text) > max_chars,
+            )
+
+        def pdf_progress(pages_read: int, page_count: int) -> None:
+            if on_progress is not None:
+                on_progress(file.file_name, pages_read, page_count)
+
+        extraction = await extract_pdf_text(file.data, max_chars, pdf_progress, cancel_event, cache=cache)
+        return ReferenceDocument(
+            file_name=file.file_name,
+            text=extraction.text,
+            page_offsets=extraction.page_offsets,
+            page_count=extraction.page_count,
+            truncated=extraction.truncated,
+            cached=extraction.cached,
+        )
+    except Exception as e:
+        print(f"[ERROR] Reference extraction failed: {file.file_name} ({e})")
+        return ReferenceDocument(file_name=file.file_name, error=str(e))
+
+
+async def load_reference_files(
+    files: list[DecodedReferenceFile],
+    max_chars: int,
+    on_progress: Callable[[str, int, int], None] | None = None,
+    cancel_event: threading.Event | None = None,
+    cache: ExtractionCache | None = None,
+) -> list[ReferenceDocument]:
+    """全ファイルを並行して抽出する（失敗したファイルは error 付きで返し、他のファイルは続行）
+
+    Args:
+        files: decode_reference_files() の結果
+        max_chars: 全ファイル合計の抽出文字数の上限（ファイル数で均等に分ける）
+        on_progress: ファイル名・処理済みページ数・総ページ数を受け取るコールバック
+        cancel_event: セットされたら未着手のページを抽出しない
+        cache: PDFの抽出結果のキャッシュ
+    """
+    per_file_chars = max_chars // max(len(files), 1)
+    return list(await asyncio.gather(*(
+        _load_one(file, per_file_chars, on_progress, cancel_event, cache) for file in files
+    )))
@@ -0,0 +1,156 @@
+"""参考資料PDFのテキスト抽出（プロセスプール）
+
+pdfplumberの解析はCPUを使い続けるため、イベントループやスレッドプールではなく別プロセスで実行する。
+一時ファイルは作らず、PDFのバイト列はワーカーごとに1回だけ渡し（pdf_worker.py）、ページ範囲ごとに並列で抽出する。
+先頭から連続して抽出できた文字数が上限に達したら、残りのページは抽出しない。
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+
+from config import env_number
+
+from . import pdf_worker
+from .cache import CachedExtraction, ExtractionCache, content_key
+
+PAGES_PER_TASK = 4  # 1タスクで抽出するページ数（小さいほど早く打ち切れる）
+PAGE_SEPARATOR = "\n\n"
+FORKSERVER_PRELOAD = ["references.pdf_worker", "pdfplumber"]  # ワーカーのfork元で読み込んでおくモジュール
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class PdfExtraction:
+    """PDFから抽出したテキスト"""
+
+    text: str
+    page_count: int
+    pages_read: int
+    truncated: bool
+    page_offsets: list[int]   # 各ページの本文が text の何文字目から始まるか（読んだページのみ）
+    cached: bool = False
+
+
+def _to_extraction(entry: CachedExtraction, max_chars: int, cached: bool) -> PdfExtraction:
+    """抽出済みの全文を max_chars で切り、上限を超えたか（または未読のページが残るか）を判定する"""
+    return PdfExtraction(
+        text=entry.text[:max_chars],
+        page_count=entry.page_count,
+        pages_read=len(entry.page_offsets),
+        truncated=len(entry.text) > max_chars or (len(entry.text) >= max_chars and not entry.complete),
+        page_offsets=[offset for offset in entry.page_offsets if offset < max_chars],
+        cached=cached,
+    )
+
+
+def _worker_count() -> int:
+    return env_number("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1), minimum=1)
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """PDF抽出用のプロセスプールを取得（初回のみ作成）
+
+    ランタイムはOTelのエクスポーターやツール用のスレッドを持つため、スレッドごとforkしないよう
+    forkserver で起動する。forkserver には pdf_worker と pdfplumber だけを読み込ませておき、ワーカーはそこからforkする。
+    ワーカーが読み込み直す __main__ は中身のない main.py なので、ランタイムのモジュールは読み込まない。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(FORKSERVER_PRELOAD)
+            _executor = ProcessPoolExecutor(max_workers=_worker_count(), mp_context=context)
+        return _executor
+
+
+def prewarm_pdf_executor(timeout: float = 60.0) -> int:
+    """PDF抽出のプロセスプールのワーカーを起動し、pdfplumber を読み込ませる（起動できたワーカー数を返す）
+
+    最初のPDF添付では forkserver の起動とワーカーのforkを待つことになるため、起動直後に済ませておき、
+    スケールアウト後の最初のリクエストで待たせないようにする。
+    """
+    executor = get_pdf_executor()
+    futures = [executor.submit(pdf_worker.preload) for _ in range(_worker_count())]
+    return len({future.result(timeout=timeout) for future in futures})
+
+
+async def extract_pdf_text(
+    data: bytes,
+    max_chars: int,
+    on_progress: Callable[[int, int], None] | None = None,
+    cancel_event: threading.Event | None = None,
+    executor: Executor | None = None,
+    cache: ExtractionCache | None = None,
+) -> PdfExtraction:
+    """PDFのバイト列からテキストを抽出する
+
+    Args:
+        data: PDFのバイト列
+        max_chars: 抽出する最大文字数（超えた分は切り捨てて truncated=True）
+        on_progress: 抽出済みページ数・総ページ数を受け取るコールバック（イベントループ上で呼ぶ）
+        cancel_event: セットされたら未着手のページを抽出しない
+        executor: 抽出に使うExecutor（省略時はプロセスプール）
+        cache: 抽出結果のキャッシュ（同じ内容のPDFなら解析しない）
+    """
+    loop = asyncio.get_running_loop()
+    key = await asyncio.to_thread(content_key, data)
+    if cache is not None:
+        entry = await cache.get(key, max_chars)
+        if entry is not None:
+            if on_progress is not None:
+                on_progress(len(entry.page_offsets), entry.page_count)
+            return _to_extraction(entry, max_chars, cached=True)
+
+    executor = executor or get_pdf_executor()
+    # バイト列を渡すのはページ数を数えるワーカーと、文書をまだ持っていないワーカーだけ
+    page_count = await loop.run_in_executor(executor, pdf_worker.count_pages, key, data)
+
+    ranges = [
+        list(range(start, min(start + PAGES_PER_TASK - 1, page_count) + 1))
+        for start in range(1, page_count + 1, PAGES_PER_TASK)
+    ]
+    # 投入するのはワーカー数の2倍先まで（上限に達したとき、無駄な抽出を少なくする）
+    in_flight = 2 * getattr(executor, "_max_workers", 1)
+    futures: dict[int, Future] = {}
+    next_submit = 0
+    texts: list[str] = []
+    page_offsets: list[int] = []
+    chars = 0
+
+    try:
+        for index, page_numbers in enumerate(ranges):
+            while next_submit < len(ranges) and next_submit < index + in_flight:
+                futures[next_submit] = executor.submit(pdf_worker.extract_pages, key, ranges[next_submit])
+                next_submit += 1
+            page_texts = await asyncio.wrap_future(futures.pop(index))
+            if page_texts is None:
+                # 文書を持っていないワーカーに当たったので、バイト列つきで投入し直す
+                futures[index] = executor.submit(pdf_worker.extract_pages, key, page_numbers, data)
+                page_texts = await asyncio.wrap_future(futures.pop(index))
+            for text in page_texts:
+                if text:
+                    chars += len(PAGE_SEPARATOR) if texts else 0
+                    texts.append(text)
+                page_offsets.append(chars)
+                chars += len(text)
+            if on_progress is not None:
+                on_progress(len(page_offsets), page_count)
+            if chars >= max_chars or (cancel_event is not None and cancel_event.is_set()):
+                break
+    finally:
+        # 打ち切り・キャンセル時は未着手のタスクを取り消す
+        for future in futures.values():
+            future.cancel()
+
+    entry = CachedExtraction(text=PAGE_SEPARATOR.join(texts), page_offsets=page_offsets, page_count=page_count)
+    # 途中で中断した結果は保存しない（打ち切りは上限に達したときだけ）
+    if cache is not None and not (cancel_event is not None and cancel_event.is_set()):
+        await cache.put(key, entry)
+    return _to_extraction(entry, max_chars, cached=False)
@@ -0,0 +1,58 @@
+"""参考資料PDFの抽出ワーカーで実行する関数（プロセスプールのワーカーが読み込むモジュール）
+
+PDFのバイト列はワーカーごとに1回だけ受け取り、内容のハッシュをキーに開いた文書を持っておく。
+以降のタスクはキーとページ範囲だけを受け取るため、タスクごとに数MBのバイト列を送ったり、
+同じ文書を開き直したりしない。文書を持っていないワーカーは None を返し、呼び出し側がバイト列つきで投入し直す。
+"""
+
+import io
+import os
+import time
+from collections import OrderedDict
+
+MAX_OPEN_DOCUMENTS = 2  # ワーカーごとに開いたままにする文書の数（古いものから閉じる）
+PRELOAD_HOLD_SECONDS = 0.2  # 事前起動のタスクが同じワーカーに偏らないよう、各タスクを少し待たせる
+
+_documents: OrderedDict = OrderedDict()  # 内容のハッシュ → pdfplumber.PDF
+
+
+def preload() -> int:
+    """pdfplumber を読み込んでおく（ウォームアップ用。プロセスIDを返す）"""
+    # pdfplumber はワーカープロセスでだけ使うため、ランタイムの起動時には読み込まない
+    import pdfplumber  # noqa: F401
+
+    time.sleep(PRELOAD_HOLD_SECONDS)
+    return os.getpid()
+
+
+def _open_document(key: str, data: bytes):
+    import pdfplumber
+
+    pdf = _documents.get(key)
+    if pdf is None:
+        pdf = pdfplumber.open(io.BytesIO(data))
+        _documents[key] = pdf
+        while len(_documents) > MAX_OPEN_DOCUMENTS:
+            _, oldest = _documents.popitem(last=False)
+            oldest.close()
+    _documents.move_to_end(key)
+    return pdf
+
+
+def count_pages(key: str, data: bytes) -> int:
+    """文書を開いてページ数を数える（このワーカーは以降のタスクでバイト列を受け取らなくてよい）"""
+    return len(_open_document(key, data).pages)
+
+
+def extract_pages(key: str, page_numbers: list[int], data: bytes | None = None) -> list[str] | None:
+    """指定ページ（1始まり）のテキストを抽出する（文書を持っておらず data もなければ None）"""
+    if data is None and key not in _documents:
+        return None
+    pdf = _open_document(key, data)
+    texts = []
+    for number in page_numbers:
+        page = pdf.pages[number - 1]
+        texts.append(page.extract_text() or "")
+        # ページごとの解析結果は残さない（開いたままの文書のメモリを増やさない）
+        page.close()
+    return texts
@@ -0,0 +1,300 @@
+"""参考資料の関連箇所の選択（BM25）
+
+長い資料を先頭から切り詰めて全部プロンプトに入れると、入力トークンがかさむうえに後半の章が落ちる。
+抽出テキストをページ・段落単位のチャンクに分け、ユーザーの依頼に対するBM25のスコア順に
+トークン予算の範囲でチャンクを選び、資料内の順序に並べ直して渡す。
+
+日本語は形態素解析なしで扱えるよう、CJK文字は2文字ずつ（bigram）、英数字は単語単位でトークン化する。
+"""
+
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+
+from config import env_number
+
+CHUNK_CHARS = 1200  # 1チャンクの目安の文字数（段落の途中では切らない。長すぎる段落のみ分割）
+DEFAULT_TOKEN_BUDGET = 8000  # 参考資料に使う入力トークンの上限
+CHARS_PER_TOKEN = 2  # 日本語の目安（50,000文字 ≒ 25,000トークン）
+
+SESSION_INDEX_LIMIT = 64  # セッションごとに保持するインデックスの最大数（古い順に破棄）
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[぀-ヿ㐀-鿿豈-﫿ｦ-ﾟ]+")
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-鿿豈-﫿ｦ-ﾟ]")
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
+
+@dataclass
+class Chunk:
+    """資料の一部分（page は1始まり、source は何番目のファイルか）"""
+
+    index: int
+    page: int
+    start: int
+    text: str
+    source: int = 0
+
+
+@dataclass
+class Selection:
+    """プロンプトに入れるチャンクの選択結果"""
+
+    chunks: list[Chunk]
+    total_chunks: int
+    document_tokens: int
+    selected_tokens: int
+
+    @property
+    def complete(self) -> bool:
+        """資料全体を選んだか（抜粋ではない）"""
+        return len(self.chunks) == self.total_chunks
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def token_budget() -> int:
+    """参考資料に使う入力トークンの上限（環境変数 REFERENCE_TOKEN_BUDGET）"""
+    return env_number("REFERENCE_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)
+
+
+def session_index_enabled() -> bool:
+    """インデックスをセッションに保持して後続ターンでも抜粋するか（環境変数 REFERENCE_SESSION_INDEX）"""
+    return os.getenv("REFERENCE_SESSION_INDEX", "").strip().lower() in ("1", "true", "yes")
+
+
+def tokenize(text: str) -> list[str]:
+    """英数字は単語、CJKの連続は2文字ずつ（1文字だけの場合はその1文字）に分ける"""
+    tokens = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if not _CJK_PATTERN.match(word):
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def _page_of(offset: int, page_offsets: list[int]) -> int:
+    page = 1
+    for number, start in enumerate(page_offsets, start=1):
+        if start > offset:
+            break
+        page = number
+    return page
+
+
+def chunk_document(text: str, page_offsets: list[int], chunk_chars: int = CHUNK_CHARS,
+                   source: int = 0, first_index: int = 0) -> list[Chunk]:
+    """段落をまとめて chunk_chars 前後のチャンクにする（ページをまたがない）"""
+    boundaries = sorted({offset for offset in page_offsets if offset < len(text)} | {0}) + [len(text)]
+    chunks: list[Chunk] = []
+
+    def add(start: int, body: str) -> None:
+        body = body.strip()
+        if body:
+            chunks.append(Chunk(index=first_index + len(chunks), page=_page_of(start, page_offsets),
+                                start=start, text=body, source=source))
+
+    for page_start, page_end in zip(boundaries, boundaries[1:]):
+        current_start, current = page_start, ""
+        position = page_start
+        for paragraph in _PARAGRAPH_SPLIT.split(text[page_start:page_end]):
+            paragraph_start = text.find(paragraph, position) if paragraph else position
+            position = paragraph_start + len(paragraph)
+            if current and len(current) + len(paragraph) > chunk_chars:
+                add(current_start, current)
+                current_start, current = paragraph_start, ""
+            # 1段落だけで長すぎる場合は文字数で分割する
+            while len(paragraph) > chunk_chars:
+                add(paragraph_start, paragraph[:chunk_chars])
+                paragraph, paragraph_start = paragraph[chunk_chars:], paragraph_start + chunk_chars
+                current_start = paragraph_start
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        add(current_start, current)
+    return chunks
+
+
+@dataclass
+class BM25Index:
+    """チャンクのBM25インデックス"""
+
+    chunks: list[Chunk]
+    term_frequencies: list[Counter] = field(default_factory=list, repr=False)
+    document_frequency: Counter = field(default_factory=Counter, repr=False)
+    average_length: float = 0.0
+
+    @classmethod
+    def build(cls, chunks: list[Chunk]) -> "BM25Index":
+        index = cls(chunks=chunks)
+        for chunk in chunks:
+            frequencies = Counter(tokenize(chunk.text))
+            index.term_frequencies.append(frequencies)
+            index.document_frequency.update(frequencies.keys())
+        lengths = [sum(frequencies.values()) for frequencies in index.term_frequencies]
+        index.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        return index
+
+    def scores(self, query: str) -> list[float]:
+        """各チャンクのスコア（チャンクの並び順）"""
+        terms = set(tokenize(query))
+        count = len(self.chunks)
+        results = []
+        for frequencies in self.term_frequencies:
+            length = sum(frequencies.values())
+            score = 0.0
+            for term in terms:
+                tf = frequencies.get(term)
+                if not tf:
+                    continue
+                df = self.document_frequency[term]
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (self.average_length or 1))
+                score += idf * tf * (BM25_K1 + 1) / norm
+            results.append(score)
+        return results
+
+    def select(self, query: str, budget: int, exclude: set[int] = frozenset(),
+               relevant_only: bool = False) -> Selection:
+        """スコア順に予算内でチャンクを選び、資料内の順序で返す
+
+        資料全体が予算に収まる場合はすべて返す。収まらない場合は依頼の語を含むチャンクをスコア順に選び、
+        各ファイルの冒頭のチャンク（タイトル・概要が多い）も含める。
+        relevant_only=True（2ターン目以降の追加抜粋）では全体が収まっても関連チャンクだけを選び、冒頭も足さない。
+        """
+        token_counts = [estimate_tokens(chunk.text) for chunk in self.chunks]
+        candidates = [chunk.index for chunk in self.chunks if chunk.index not in exclude]
+
+        if not relevant_only and sum(token_counts[i] for i in candidates) <= budget:
+            chosen = candidates
+        else:
+            # 依頼の語を1つも含まないチャンクは予算が余っていても入れない
+            scores = self.scores(query)
+            ranked = sorted((i for i in candidates if scores[i] > 0), key=lambda i: (-scores[i], i))
+            if not relevant_only:
+                leading = [i for i in candidates if i == 0 or self.chunks[i - 1].source != self.chunks[i].source]
+                ranked = leading + [i for i in ranked if i not in leading]
+            chosen, used = [], 0
+            for i in ranked:
+                if used + token_counts[i] > budget:
+                    continue
+                chosen.append(i)
+                used += token_counts[i]
+
+        chosen.sort()
+        return Selection(
+            chunks=[self.chunks[i] for i in chosen],
+            total_chunks=len(self.chunks),
+            document_tokens=sum(token_counts),
+            selected_tokens=sum(token_counts[i] for i in chosen),
+        )
+
+
+def _format_chunks(chunks: list[Chunk], excerpt: bool, paged: bool) -> str:
+    if not excerpt:
+        return "\n\n".join(chunk.text for chunk in chunks)
+    parts = []
+    previous = None
+    for chunk in chunks:
+        if previous is not None and chunk.index != previous + 1:
+            parts.append("（中略）")
+        parts.append(f"[p.{chunk.page}]\n{chunk.text}" if paged else chunk.text)
+        previous = chunk.index
+    return "\n\n".join(parts)
+
+
+@dataclass
+class ReferenceSource:
+    """インデックスに含まれる1ファイルの情報"""
+
+    file_name: str
+    page_count: int
+    truncated: bool = False
+    chunk_count: int = 0
+
+
+@dataclass
+class ReferenceIndex:
+    """参考資料（1件以上）のインデックスと、プロンプトに入れ済みのチャンク"""
+
+    sources: list[ReferenceSource]
+    index: BM25Index
+    sent: set[int] = field(default_factory=set)
+
+    @property
+    def file_names(self) -> list[str]:
+        return [source.file_name for source in self.sources]
+
+    def select(self, query: str, budget: int, follow_up: bool = False) -> Selection:
+        """チャンクを選び、入れ済みとして記録する（follow_up=True では入れ済みを除いた関連チャンクのみ）"""
+        if follow_up:
+            selection = self.index.select(query, budget, exclude=self.sent, relevant_only=True)
+        else:
+            selection = self.index.select(query, budget)
+        self.sent.update(chunk.index for chunk in selection.chunks)
+        return selection
+
+    def format(self, selection: Selection) -> str:
+        """選んだチャンクをファイルの順・資料内の順で、ファイルごとに区切って連結する
+
+        ファイル全体を選んだ場合はそのまま、抜粋の場合はページ番号（複数ページのPDFのみ）と省略を明示する。
+        """
+        blocks = []
+        for number, source in enumerate(self.sources):
+            chunks = [chunk for chunk in selection.chunks if chunk.source == number]
+            if not chunks:
+                continue
+            whole = len(chunks) == source.chunk_count
+            body = _format_chunks(chunks, excerpt=not whole, paged=source.page_count > 1)
+            if whole and source.truncated:
+                body += "\n\n（以降省略）"
+            blocks.append(f"---参考資料「{source.file_name}」ここから---\n{body}\n---参考資料「{source.file_name}」ここまで---")
+        return "\n\n".join(blocks)
+
+
+def build_reference_index(documents: list) -> ReferenceIndex:
+    """抽出結果（ReferenceDocument のリスト）をチャンクに分けて1つのインデックスにする
+
+    CPUを使うため asyncio.to_thread で呼ぶ。チャンクの番号はファイルの順に振るため、同じ入力なら結果も同じになる。
+    """
+    chunks: list[Chunk] = []
+    sources = []
+    for number, document in enumerate(documents):
+        document_chunks = chunk_document(document.text, document.page_offsets, source=number, first_index=len(chunks))
+        chunks.extend(document_chunks)
+        sources.append(ReferenceSource(
+            file_name=document.file_name,
+            page_count=document.page_count,
+            truncated=document.truncated,
+            chunk_count=len(document_chunks),
+        ))
+    return ReferenceIndex(sources=sources, index=BM25Index.build(chunks))
+
+
+_session_indexes: OrderedDict[str, ReferenceIndex] = OrderedDict()
+_session_lock = threading.Lock()
+
+
+def remember_session_reference(session_id: str, reference: ReferenceIndex) -> None:
+    """セッションの参考資料インデックスを保持する（同じセッションで添付し直したら置き換える）"""
+    with _session_lock:
+        _session_indexes[session_id] = reference
+        _session_indexes.move_to_end(session_id)
+        while len(_session_indexes) > SESSION_INDEX_LIMIT:
+            _session_indexes.popitem(last=False)
+
+
+def get_session_reference(session_id: str) -> ReferenceIndex | None:
+    with _session_lock:
+        reference = _session_indexes.get(session_id)
+        if reference is not None:
+            _session_indexes.move_to_end(session_id)
+        return reference
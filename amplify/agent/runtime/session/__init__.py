@@ -1,5 +1,39 @@
 """セッション管理のエクスポート"""
 
-from .manager import get_or_create_agent
+from .manager import (
+    fork_agent,
+    get_or_create_agent,
+    prime_model_clients,
+    replace_session_agent,
+    save_session_snapshot,
+    stream_agent,
+    supports_cancel_signal,
+    uses_prompt_cache,
+    verify_prompt_cache_layout,
+)
+from .model_router import ModelRouter, RoutedTurn, get_model_router
+from .prompt_cache import record_cache_usage
+from .snapshots import FileSnapshotBackend, SnapshotStore, SqliteSnapshotBackend, get_snapshot_store
+from .store import SessionStore, get_session_store
 
-__all__ = ["get_or_create_agent"]
+__all__ = [
+    "get_or_create_agent",
+    "prime_model_clients",
+    "save_session_snapshot",
+    "stream_agent",
+    "supports_cancel_signal",
+    "uses_prompt_cache",
+    "verify_prompt_cache_layout",
+    "fork_agent",
+    "replace_session_agent",
+    "ModelRouter",
+    "RoutedTurn",
+    "get_model_router",
+    "record_cache_usage",
+    "SessionStore",
+    "get_session_store",
+    "SnapshotStore",
+    "SqliteSnapshotBackend",
+    "FileSnapshotBackend",
+    "get_snapshot_store",
+]
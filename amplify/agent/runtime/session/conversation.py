@@ -0,0 +1,229 @@
+"""会話履歴の圧縮（メッセージ数ではなく推定トークン数の上限で管理）
+
+履歴で大きいのは、過去の output_slide の入力（毎回スライド全文）と Web検索・HTTP取得の結果。
+メッセージ数で古い順に消すと、最新のスライドや直前の指示まで消える一方で、
+残った範囲の古いスライド全文は毎ターン送り続けることになる。
+そこで、ターンの終わりに推定トークン数が上限を超えていたら、次の順で上限の COMPACTION_TARGET_RATIO まで小さくする。
+
+1. 置き換え済みのスライド（最新の output_slide より前の output_slide / patch_slides の入力）を、
+   枚数と各スライドの見出しだけの短い参照に置き換える（最新のスライドとその後のパッチはそのまま残す）
+2. 直前のターンより前の web_search / http_request の結果を要約に縮める
+   （検索結果はタイトル・URL・本文の冒頭だけ残し、参考文献スライドを作り直せるようにする）
+3. それでも上限を超える場合は、古いターンから丸ごと削除する
+   （直前のターンと、最新のスライドを含むターンは残す）
+
+圧縮はターンの終わり（Strandsの apply_management）にだけ行い、ツール実行の途中では行わない
+（並列ツールの結果が揃う前に履歴を触ると再検索が増えるため。per_turn=True を使わないのと同じ理由）。
+上限以内のターンでは履歴を書き換えない。古いメッセージを毎ターン書き換えるとメッセージのプレフィックスが
+前のターンと一致しなくなり、プロンプトキャッシュが効かなくなるため。上限より少し下まで縮めておき、
+圧縮（プレフィックスが変わるターン）が数ターンに1回で済むようにする。
+"""
+
+import json
+
+from strands.agent.conversation_manager import SlidingWindowConversationManager
+
+from config import env_number
+from telemetry import count
+from tools import slide_titles
+
+DEFAULT_TOKEN_BUDGET = 20000
+COMPACTION_TARGET_RATIO = 0.75  # 上限を超えたら、上限のこの割合まで縮める
+CHARS_PER_TOKEN = 2  # 日本語が中心の履歴での目安（references.retrieval と同じ）
+OVERFLOW_WINDOW_SIZE = 40  # コンテキスト超過時に Strands の既定の削減で残すメッセージ数
+
+SLIDE_TOOLS = ("output_slide", "patch_slides")
+SUMMARIZED_TOOLS = ("web_search", "http_request")
+SUPERSEDED_MARK = "（置き換え済み"
+SUMMARY_MARK = "（要約済み"
+SEARCH_SNIPPET_CHARS = 80  # 要約後に残す検索結果1件あたりの本文の文字数
+RESULT_HEAD_CHARS = 300  # 要約後に残すHTTP取得結果などの冒頭の文字数
+
+_SEARCH_RESULT_SEPARATOR = "\n\n---\n\n"
+
+
+def token_budget() -> int:
+    """会話履歴の推定トークン数の上限（環境変数 CONVERSATION_TOKEN_BUDGET）"""
+    return env_number("CONVERSATION_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """会話履歴の推定トークン数（JSONにした文字数から見積もる）"""
+    return sum(_message_tokens(message) for message in messages)
+
+
+def _message_tokens(message: dict) -> int:
+    return len(json.dumps(message.get("content") or [], ensure_ascii=False, default=str)) // CHARS_PER_TOKEN
+
+
+def _tool_uses(messages: list[dict]):
+    for index, message in enumerate(messages):
+        for block in message.get("content") or []:
+            if "toolUse" in block:
+                yield index, block["toolUse"]
+
+
+def _turn_starts(messages: list[dict]) -> list[int]:
+    """ユーザーの発言（ツール結果ではないユーザーメッセージ）の位置"""
+    return [
+        index for index, message in enumerate(messages)
+        if message.get("role") == "user"
+        and not any("toolResult" in block for block in message.get("content") or [])
+    ]
+
+
+def _slide_outline(markdown: str) -> str:
+    """スライドの枚数と見出しの一覧（置き換え済みのスライドの代わりに残す）"""
+    titles = slide_titles(markdown)
+    return f"{len(titles)}枚: " + "".join(f"「{title or '（見出しなし）'}」" for title in titles)
+
+
+def _compact_superseded_slides(messages: list[dict]) -> int:
+    """最新の output_slide より前のスライド出力を短い参照に置き換える（置き換えた数を返す）"""
+    uses = [(index, use) for index, use in _tool_uses(messages) if use.get("name") in SLIDE_TOOLS]
+    latest = max((position for position, (_, use) in enumerate(uses) if use["name"] == "output_slide"), default=None)
+    if latest is None:
+        return 0
+
+    compacted = 0
+    for _, use in uses[:latest]:
+        tool_input = use.get("input")
+        if not isinstance(tool_input, dict):
+            continue
+        if use["name"] == "output_slide":
+            markdown = tool_input.get("markdown")
+            if not isinstance(markdown, str) or markdown.startswith(SUPERSEDED_MARK):
+                continue
+            tool_input["markdown"] = (
+                f"{SUPERSEDED_MARK}のため本文は省略。最新のスライドは後の output_slide を参照）{_slide_outline(markdown)}"
+            )
+            compacted += 1
+        else:
+            patches = tool_input.get("patches")
+            if not isinstance(patches, list):
+                continue
+            changed = False
+            for patch in patches:
+                content = patch.get("markdown") if isinstance(patch, dict) else None
+                if isinstance(content, str) and not content.startswith(SUPERSEDED_MARK):
+                    patch["markdown"] = f"{SUPERSEDED_MARK}のため省略）"
+                    changed = True
+            compacted += changed
+    return compacted
+
+
+def _summarize_search_result(text: str) -> str:
+    """web_search の結果をタイトル・URL・本文の冒頭だけにする"""
+    entries = []
+    for entry in text.split(_SEARCH_RESULT_SEPARATOR):
+        lines = entry.strip().splitlines()
+        if len(lines) < 2 or not lines[-1].startswith("URL: "):
+            entries.append(entry.strip()[:SEARCH_SNIPPET_CHARS])
+            continue
+        body = " ".join(lines[1:-1])
+        if len(body) > SEARCH_SNIPPET_CHARS:
+            body = body[:SEARCH_SNIPPET_CHARS] + "…"
+        entries.append(f"{lines[0]}\n{body}\n{lines[-1]}")
+    return f"{SUMMARY_MARK}の検索結果）\n" + _SEARCH_RESULT_SEPARATOR.join(entries)
+
+
+def _summarize_text(text: str) -> str:
+    omitted = len(text) - RESULT_HEAD_CHARS
+    return f"{SUMMARY_MARK}の取得結果）\n{text[:RESULT_HEAD_CHARS]}…（以下{omitted}文字省略）"
+
+
+def _summarize_tool_results(messages: list[dict], end: int) -> int:
+    """messages[:end] の web_search / http_request の結果を要約に縮める（縮めた数を返す）"""
+    names = {use.get("toolUseId"): use.get("name") for _, use in _tool_uses(messages)}
+    summarized = 0
+    for message in messages[:end]:
+        for block in message.get("content") or []:
+            result = block.get("toolResult")
+            if not result:
+                continue
+            name = names.get(result.get("toolUseId"))
+            if name not in SUMMARIZED_TOOLS:
+                continue
+            for item in result.get("content") or []:
+                text = item.get("text")
+                if not isinstance(text, str) or text.startswith(SUMMARY_MARK):
+                    continue
+                if name == "web_search":
+                    summary = _summarize_search_result(text)
+                elif len(text) > RESULT_HEAD_CHARS:
+                    summary = _summarize_text(text)
+                else:
+                    continue
+                if len(summary) < len(text):
+                    item["text"] = summary
+                    summarized += 1
+    return summarized
+
+
+def _latest_deck_turn(messages: list[dict], turn_starts: list[int]) -> int | None:
+    """最新の output_slide を含むターンの開始位置"""
+    latest = None
+    for index, use in _tool_uses(messages):
+        if use.get("name") == "output_slide":
+            latest = index
+    if latest is None:
+        return None
+    return max((start for start in turn_starts if start <= latest), default=None)
+
+
+def compact_history(messages: list[dict], budget: int) -> int:
+    """会話履歴が推定トークン数の上限を超えていたら、上限の COMPACTION_TARGET_RATIO まで圧縮する（削除したメッセージ数を返す）
+
+    上限以内なら何もしない。messages はその場で書き換える。直前のターンと最新のスライドを含むターンは
+    削除しないため、それだけで上限を超える場合は上限を超えたまま残る。
+    """
+    if estimate_tokens(messages) <= budget:
+        return 0
+    target = int(budget * COMPACTION_TARGET_RATIO)
+    turn_starts = _turn_starts(messages)
+    _compact_superseded_slides(messages)
+    if len(turn_starts) > 1:
+        _summarize_tool_results(messages, turn_starts[-1])
+
+    removed = 0
+    if estimate_tokens(messages) <= target:
+        return removed
+    keep_from = turn_starts[-1] if turn_starts else 0
+    deck_turn = _latest_deck_turn(messages, turn_starts)
+    if deck_turn is not None:
+        keep_from = min(keep_from, deck_turn)
+    # 古いターンから丸ごと消す（先頭はユーザーの発言のまま。ツールの呼び出しと結果の組も崩さない）
+    tokens = estimate_tokens(messages)
+    cut = 0
+    for start in turn_starts[1:]:
+        if tokens <= target or start > keep_from:
+            break
+        tokens -= sum(_message_tokens(message) for message in messages[cut:start])
+        cut = start
+    if cut:
+        del messages[:cut]
+        removed = cut
+    return removed
+
+
+class TokenBudgetConversationManager(SlidingWindowConversationManager):
+    """推定トークン数の上限で会話履歴を圧縮する（コンテキスト超過時の削減は Strands の既定の動作）"""
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        # per_turn は False のまま（ツール実行の途中では圧縮しない）
+        super().__init__(window_size=OVERFLOW_WINDOW_SIZE)
+        self.token_budget = token_budget
+
+    def apply_management(self, agent, **kwargs) -> None:
+        """ターンの終わりに呼ばれ、会話履歴を圧縮する"""
+        messages = agent.messages
+        before = estimate_tokens(messages)
+        removed = compact_history(messages, self.token_budget)
+        after = estimate_tokens(messages)
+        self.removed_message_count += removed
+        if before > after:
+            count("conversation.compacted_tokens", before - after)
+            print(f"[INFO] Conversation compacted: {before} -> {after} tokens "
+                  f"(budget={self.token_budget}, removed_messages={removed})")
+        if removed:
+            count("conversation.removed_messages", removed)
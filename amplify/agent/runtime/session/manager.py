@@ -1,68 +1,274 @@
 """セッション管理（Agent作成・キャッシュ）"""
 
+import copy
+import inspect
+import os
+import threading
+from collections.abc import AsyncIterator
+
 from strands import Agent
-from strands.agent.conversation_manager import SlidingWindowConversationManager
 from strands.models import BedrockModel, Model
-from strands.models.openai_responses import OpenAIResponsesModel
 
-from config import get_model_config, get_system_prompt, normalize_model_type
-from tools import web_search, output_slide, generate_tweet_url, http_request
+from config import ENABLED_MODEL_TYPES, get_model_config, get_system_prompt, normalize_model_type
+from telemetry import annotate, count
+from tools import web_search, output_slide, patch_slides, generate_tweet_url, http_request
+
+from .conversation import TokenBudgetConversationManager, token_budget
+from .model_pool import bedrock_client_config, get_shared_model, mantle_http_client
+from .prompt_cache import (
+    CACHE_TOOLS,
+    bedrock_token_counter,
+    measure_cache_prefixes,
+    report_cache_prefixes,
+    system_prompt_blocks,
+)
+from .snapshots import SessionSnapshot, get_snapshot_store
+from .store import get_session_store
 
-# セッションごとのAgentインスタンスを管理（会話履歴保持用）
-_agent_sessions: dict[str, Agent] = {}
+# 会話履歴の圧縮（置き換え済みのスライド・古い検索結果を縮め、推定トークン数の上限を超えたら古いターンを削除）
+_conversation_manager = TokenBudgetConversationManager(token_budget=token_budget())
 
-# 会話履歴のトリミング設定（古いメッセージを自動削除してトークンコスト削減）
-_conversation_manager = SlidingWindowConversationManager(window_size=6)
+TOOLS = [web_search, output_slide, patch_slides, generate_tweet_url, http_request]
 
 
 def _create_model(model_type: str = "sonnet") -> Model:
-    """モデル設定に基づいてStrandsのモデルプロバイダーを作成"""
+    """モデル設定に基づいてStrandsのモデルプロバイダーを取得（プロバイダー・モデルID・リージョンごとに共有）"""
+    # 負荷試験用: Bedrockを呼ばない台本モデル（loadtest/ はコンテナイメージに含めない）
+    if os.getenv("AGENT_MODEL_PROVIDER", "").strip() == "fake":
+        from loadtest.fake_model import FakeStreamingModel
+        return FakeStreamingModel.from_env(model_type)
+
     config = get_model_config(model_type)
 
     if config["provider"] == "mantle":
-        return OpenAIResponsesModel(
+        # openai SDK の読み込みは約0.7秒かかり、Mantleのモデルを使うまで不要なので初回に読み込む
+        from strands.models.openai_responses import OpenAIResponsesModel
+
+        key = ("mantle", config["model_id"], config["region"], config["max_output_tokens"])
+        return get_shared_model(key, lambda: OpenAIResponsesModel(
             model_id=config["model_id"],
             bedrock_mantle_config={"region": config["region"]},
+            client_args={"http_client": mantle_http_client()},
             params={"max_output_tokens": config["max_output_tokens"]},
-        )
+        ))
 
-    if config["cache_prompt"] is None:
-        return BedrockModel(model_id=config["model_id"])
+    key = ("bedrock", config["model_id"], os.getenv("AWS_REGION"), config["prompt_cache"])
+    if config["prompt_cache"]:
+        return get_shared_model(key, lambda: BedrockModel(
+            model_id=config["model_id"],
+            cache_tools=CACHE_TOOLS,
+            boto_client_config=bedrock_client_config(),
+        ))
     else:
-        return BedrockModel(
+        return get_shared_model(key, lambda: BedrockModel(
             model_id=config["model_id"],
-            cache_prompt=config["cache_prompt"],
-            cache_tools=config["cache_tools"],
-        )
+            boto_client_config=bedrock_client_config(),
+        ))
 
 
-def get_or_create_agent(session_id: str | None, model_type: str = "sonnet", theme: str = "border") -> Agent:
-    """セッションIDとモデルタイプとテーマに対応するAgentを取得または作成"""
-    model_type = normalize_model_type(model_type)
-    system_prompt = get_system_prompt(theme, model_type)
+def uses_prompt_cache(model_type: str) -> bool:
+    """プロンプトキャッシュを使うモデルか（負荷試験用の台本モデルは使わない）"""
+    if os.getenv("AGENT_MODEL_PROVIDER", "").strip() == "fake":
+        return False
+    return bool(get_model_config(model_type).get("prompt_cache"))
 
-    # セッションキーにモデルタイプとテーマを含める（切り替え時に新しいAgentを作成）
-    cache_key = f"{session_id}:{model_type}:{theme}" if session_id else None
 
-    # セッションIDがない場合は新規Agentを作成（履歴なし）
-    if not cache_key:
-        return Agent(
-            model=_create_model(model_type),
-            system_prompt=system_prompt,
-            tools=[web_search, output_slide, generate_tweet_url, http_request],
-            conversation_manager=_conversation_manager,
-        )
-
-    # 既存のセッションがあればそのAgentを返す
-    if cache_key in _agent_sessions:
-        return _agent_sessions[cache_key]
-
-    # 新規セッションの場合はAgentを作成して保存
+def _system_prompt(model_type: str):
+    return system_prompt_blocks(get_system_prompt(None, model_type), uses_prompt_cache(model_type))
+
+
+def verify_prompt_cache_layout() -> None:
+    """キャッシュする各プレフィックスがプロバイダーの最低トークン数を満たすか確認する（起動時に1回）"""
+    for model_type in sorted(ENABLED_MODEL_TYPES):
+        try:
+            if not uses_prompt_cache(model_type):
+                continue
+            model = _create_model(model_type)
+            prefixes = measure_cache_prefixes(
+                bedrock_token_counter(model),
+                [tool.tool_spec for tool in TOOLS],
+                get_system_prompt(None, model_type),
+            )
+        except Exception as e:
+            print(f"[WARN] Prompt cache layout check skipped (model_type={model_type}): {e}")
+            continue
+        report_cache_prefixes(model_type, prefixes)
+
+
+def prime_model_clients() -> None:
+    """有効な各モデルのクライアントを作り、Bedrockへの接続と認証情報の解決を済ませる（ウォームアップ用）
+
+    BedrockのモデルはCountTokensを1回呼んでTLS接続を張っておく。CountTokensに対応しないモデルでも
+    エラー応答が返れば接続と署名は済んでいる。Mantleの接続はランタイムのイベントループに紐づくため、
+    ここではクライアントを作るだけにする。
+    """
+    if os.getenv("AGENT_MODEL_PROVIDER", "").strip() == "fake":
+        return
+    for model_type in sorted(ENABLED_MODEL_TYPES):
+        try:
+            model = _create_model(model_type)
+            if get_model_config(model_type)["provider"] != "mantle":
+                bedrock_token_counter(model)({"messages": [{"role": "user", "content": [{"text": "a"}]}]})
+        except Exception as e:
+            # botocoreのClientErrorは応答を受け取れている（接続は張れた）
+            if getattr(e, "response", None) is None:
+                print(f"[WARN] Model client priming failed (model_type={model_type}): {e}")
+                continue
+        print(f"[INFO] Model client primed (model_type={model_type})")
+
+
+def _strip_reasoning(messages: list[dict]) -> int:
+    """会話履歴から推論ブロック（reasoningContent）を取り除く（取り除いた数を返す）
+
+    推論ブロックの署名は生成したモデルでしか検証できないため、別のモデルに履歴を引き継ぐ前に消す。
+    推論だけのメッセージは空にせず短いテキストに置き換え、ユーザー・アシスタントの交互の並びを保つ。
+    """
+    removed = 0
+    for message in messages:
+        content = message.get("content") or []
+        kept = [block for block in content if "reasoningContent" not in block]
+        if len(kept) != len(content):
+            removed += len(content) - len(kept)
+            message["content"] = kept or [{"text": "（省略）"}]
+    return removed
+
+
+def _new_agent(model_type: str) -> Agent:
     agent = Agent(
         model=_create_model(model_type),
-        system_prompt=system_prompt,
-        tools=[web_search, output_slide, generate_tweet_url, http_request],
+        system_prompt=_system_prompt(model_type),
+        tools=TOOLS,
         conversation_manager=_conversation_manager,
     )
-    _agent_sessions[cache_key] = agent
+    agent.state.set("model_type", model_type)
+    return agent
+
+
+def _switch_model(agent: Agent, model_type: str) -> None:
+    """会話履歴を保ったまま、Agentのモデルとシステムプロンプトを切り替える"""
+    previous = agent.state.get("model_type")
+    agent.model = _create_model(model_type)
+    agent.system_prompt = _system_prompt(model_type)
+    removed = _strip_reasoning(agent.messages)
+    agent.state.set("model_type", model_type)
+    count("session.model_switches", model_type=model_type)
+    print(f"[INFO] Session model switched: {previous} -> {model_type} "
+          f"(history_messages={len(agent.messages)}, reasoning_blocks_removed={removed})")
+
+
+def _rehydrate_agent(session_id: str, model_type: str) -> Agent | None:
+    """スナップショットから会話履歴を読み戻したAgentを作る（スナップショットがなければ None）"""
+    snapshots = get_snapshot_store()
+    if snapshots is None:
+        return None
+    snapshot = snapshots.load(session_id)
+    if snapshot is None:
+        count("session.rehydrations", outcome="miss")
+        return None
+    agent = _new_agent(model_type)
+    agent.messages = snapshot.messages
+    # 別のモデルで保存した履歴は、切り替えと同じく推論ブロックを除いて引き継ぐ
+    if snapshot.model_type != model_type:
+        _strip_reasoning(agent.messages)
+    count("session.rehydrations", outcome="hit")
+    annotate(rehydrated=True)
+    print(f"[INFO] Session rehydrated from snapshot (history_messages={len(agent.messages)}, "
+          f"saved_model={snapshot.model_type}, model_type={model_type})")
+    return agent
+
+
+_cancel_signal_support: dict[type, bool] = {}
+
+
+def supports_cancel_signal(agent_type: type) -> bool:
+    """Agent.stream_async が cancel_signal 引数を受け付けるか（型ごとに1回だけ調べる）
+
+    stream_async は **kwargs も受け取るため、名前で明示された引数かで判断する
+    （cancel_signal のないStrandsは未知の引数を invocation_state に入れて無視する）。
+    """
+    supported = _cancel_signal_support.get(agent_type)
+    if supported is None:
+        try:
+            parameters = inspect.signature(agent_type.stream_async).parameters
+        except (AttributeError, TypeError, ValueError):
+            parameters = {}
+        supported = "cancel_signal" in parameters
+        _cancel_signal_support[agent_type] = supported
+        if not supported:
+            print(f"[WARN] {agent_type.__name__}.stream_async does not accept cancel_signal, "
+                  "cancelling by closing the stream instead")
+    return supported
+
+
+async def stream_agent(agent: Agent, prompt, cancel_event: threading.Event) -> AsyncIterator[dict]:
+    """cancel_event で中断できる agent.stream_async(prompt)
+
+    cancel_signal に対応したStrandsならモデルのストリーム・ツールの実行もStrandsに止めさせる。
+    対応していなければ、cancel_event がセットされたら次のイベントで抜けてストリームを閉じる。
+    """
+    if supports_cancel_signal(type(agent)):
+        async for event in agent.stream_async(prompt, cancel_signal=cancel_event):
+            yield event
+        return
+    stream = agent.stream_async(prompt)
+    try:
+        async for event in stream:
+            yield event
+            if cancel_event.is_set():
+                break
+    finally:
+        await stream.aclose()
+
+
+def fork_agent(agent: Agent, model_type: str, history_end: int) -> Agent:
+    """agent.messages[:history_end] の複製を持つ別のAgentを作る（フォールバック・ヘッジ用。元のAgentは変更しない）"""
+    forked = _new_agent(model_type)
+    forked.messages = copy.deepcopy(agent.messages[:history_end])
+    if agent.state.get("model_type") != model_type:
+        _strip_reasoning(forked.messages)
+    return forked
+
+
+def replace_session_agent(session_id: str | None, agent: Agent) -> None:
+    """セッションのAgentを差し替える（フォールバック・ヘッジで応答したAgentを次のターンに引き継ぐ）"""
+    if session_id:
+        get_session_store().put(session_id, agent)
+
+
+def save_session_snapshot(session_id: str | None, agent: Agent) -> None:
+    """ターンの終わりの会話履歴をスナップショットとして保存する（JSONにするため、イベントループの外で呼ぶ。書き込みはバックグラウンド）"""
+    snapshots = get_snapshot_store()
+    if snapshots is None or not session_id:
+        return
+    try:
+        snapshots.save_async(session_id, SessionSnapshot(
+            model_type=agent.state.get("model_type") or "sonnet",
+            messages=agent.messages,
+        ))
+    except (TypeError, ValueError) as e:
+        print(f"[WARN] Session snapshot skipped: {e}")
+
+
+def get_or_create_agent(session_id: str | None, model_type: str = "sonnet") -> Agent:
+    """セッションIDに対応するAgentを取得または作成
+
+    セッションのキーはセッションIDだけにする。モデルを切り替えたときは同じAgentのモデルとシステムプロンプトを
+    差し替えて会話履歴を引き継ぎ、テーマはシステムプロンプトではなく各ターンのメッセージで指定する
+    （config.format_turn_context）。
+    """
+    model_type = normalize_model_type(model_type)
+
+    # セッションIDがない場合は新規Agentを作成（履歴なし）
+    if not session_id:
+        return _new_agent(model_type)
+
+    # 既存のセッションがあればそのAgentを返す（件数・メモリ・アイドル時間の上限で追い出されていれば
+    # スナップショットから履歴を読み戻し、なければ新しく作る）
+    store = get_session_store()
+    agent = store.get(session_id)
+    if agent is None:
+        agent = _rehydrate_agent(session_id, model_type) or _new_agent(model_type)
+        store.put(session_id, agent)
+    elif agent.state.get("model_type") != model_type:
+        _switch_model(agent, model_type)
     return agent
@@ -0,0 +1,81 @@
+"""モデルクライアントの共有（プロバイダー・モデルID・リージョンごとに1つ）
+
+StrandsのモデルはAgentの会話履歴を持たないため、同じモデルを使うセッション間で1つのインスタンスを共有できる。
+セッションごとに作ると、boto3のクライアント・コネクションプール・認証情報の解決が毎回走り、
+新規セッションの作成が遅くなるうえにソケットとメモリもセッション数だけ増える。
+
+- Bedrock: boto3クライアント（スレッドセーフ）を共有し、プールサイズとTCP keep-aliveを設定する
+- Bedrock Mantle（OpenAI互換）: StrandsはリクエストごとにOpenAIクライアントを作って閉じるため、
+  閉じても接続プールを捨てないHTTPクライアントを渡してコネクションを使い回す
+"""
+
+import threading
+from collections.abc import Callable, Hashable
+
+from strands.models import Model
+
+from config import env_number
+
+DEFAULT_MAX_POOL_CONNECTIONS = 50  # 同時ストリーム数の目安（botocoreの既定は10）
+READ_TIMEOUT = 120  # Strandsの既定と同じ（長いスライド生成のストリームを切らない）
+CONNECT_TIMEOUT = 10
+KEEPALIVE_EXPIRY = 60  # Mantleのアイドル接続を保持する秒数
+
+_models: dict[Hashable, Model] = {}
+_models_lock = threading.Lock()
+_mantle_http_client = None
+
+
+def _max_pool_connections() -> int:
+    return env_number("MODEL_MAX_POOL_CONNECTIONS", DEFAULT_MAX_POOL_CONNECTIONS, minimum=1)
+
+
+def get_shared_model(key: Hashable, factory: Callable[[], Model]) -> Model:
+    """key に対応するモデルを返す（初回のみ factory で作成）"""
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = factory()
+            print(f"[INFO] Model client created: {key}")
+        return model
+
+
+def bedrock_client_config():
+    """共有するbedrock-runtimeクライアントの設定（プールサイズ・keep-alive・タイムアウト）"""
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=_max_pool_connections(),
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={"mode": "standard", "max_attempts": 3},
+    )
+
+
+def mantle_http_client():
+    """Mantle用の共有HTTPクライアント（接続プールはプロセスで1つ）
+
+    StrandsはリクエストごとにOpenAIクライアントを `async with` で作って閉じ、その際に http_client も閉じる。
+    閉じる処理を無視するクライアントを渡し、接続プールをリクエスト間で使い回す。
+    接続はイベントループに紐づくため、ランタイムのイベントループ（1つ）からだけ使う。
+    """
+    global _mantle_http_client
+    if _mantle_http_client is None:
+        import httpx
+
+        class _PersistentAsyncClient(httpx.AsyncClient):
+            async def aclose(self) -> None:
+                # プロセス終了まで接続プールを保持する
+                pass
+
+        limit = _max_pool_connections()
+        _mantle_http_client = _PersistentAsyncClient(
+            limits=httpx.Limits(
+                max_connections=limit,
+                max_keepalive_connections=limit,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _mantle_http_client
@@ -0,0 +1,356 @@
+"""モデルのフォールバックとヘッジ（スロットリング・初回出力の遅れへの対策）
+
+Bedrockがスロットリングを返したり、モデルの応答が一時的に遅くなったりすると、ターンはStrandsの再試行を
+待ち続け、最後はエラーになる。MODEL_FALLBACKS でモデルごとの代わりのモデルを指定すると、次のように動く。
+
+- モデルごとに直近の初回出力までの時間（TTFT）とエラー率を記録する
+- スロットリング・エラー率の高いモデルは、しばらく新しいターンを代わりのモデルに回す（choose）
+- ターンの途中でスロットリング・エラーが起きたら、初回出力の前に限り代わりのモデルで同じターンをやり直す
+- MODEL_HEDGE_AFTER_MS を指定すると、その時間内に初回出力がなければ代わりのモデルでも同時に始め（ヘッジ）、
+  先に出力したほうを採用する
+
+採用は最初の出力（テキスト・ツール呼び出し）で決め、それより前のイベントは送らずに保留する。
+ツールは出力の後に実行されるため、採用されなかったほうのツールが動くことはない。
+代わりのモデルは、ターン開始時点の会話履歴の複製を持つ別のAgentで動かし、採用されたらセッションのAgentを差し替える。
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+
+from strands import Agent
+
+from config import ENABLED_MODEL_TYPES, env_number
+from telemetry import count
+
+from .manager import fork_agent, replace_session_agent, stream_agent
+
+STATS_WINDOW_SECONDS = 300.0  # TTFT・エラー率の集計対象にする直近の時間
+STATS_MAX_SAMPLES = 200
+MIN_SAMPLES = 5  # これより少ないうちはエラー率・p95で判断しない
+UNHEALTHY_ERROR_RATE = 0.5
+DEFAULT_COOLDOWN_SECONDS = 60.0  # スロットリングされたモデルに新しいターンを回さない時間
+DEFAULT_AUTO_HEDGE_SECONDS = 8.0  # MODEL_HEDGE_AFTER_MS=auto で、TTFTの記録が少ないうちに使う値
+MIN_HEDGE_SECONDS = 1.0
+LOSER_CANCEL_GRACE = 1.0  # 採用しなかった試行が cancel_signal で止まるのを待つ時間（秒）
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """スロットリング（ThrottlingException・ModelThrottledException・429）か"""
+    message = str(error)
+    return (
+        "Throttl" in type(error).__name__
+        or "ThrottlingException" in message
+        or "Too many requests" in message
+    )
+
+
+def is_model_output(event: dict) -> bool:
+    """モデルの出力（テキスト・ツール呼び出し）のイベントか（ChatEventTranslator と同じ判定）"""
+    return "data" in event or "current_tool_use" in event
+
+
+class ModelStats:
+    """1つのモデルの直近のTTFT・エラーの記録"""
+
+    def __init__(self):
+        self.samples: deque[tuple[float, float | None]] = deque(maxlen=STATS_MAX_SAMPLES)  # (時刻, TTFT。エラーは None)
+        self.throttled_until = 0.0
+
+    def add(self, now: float, ttft: float | None) -> None:
+        self.samples.append((now, ttft))
+
+    def recent(self, now: float) -> list[float | None]:
+        while self.samples and now - self.samples[0][0] > STATS_WINDOW_SECONDS:
+            self.samples.popleft()
+        return [ttft for _, ttft in self.samples]
+
+    def error_rate(self, now: float) -> float | None:
+        recent = self.recent(now)
+        if len(recent) < MIN_SAMPLES:
+            return None
+        return sum(1 for ttft in recent if ttft is None) / len(recent)
+
+    def ttft_p95(self, now: float) -> float | None:
+        ttfts = sorted(ttft for ttft in self.recent(now) if ttft is not None)
+        if len(ttfts) < MIN_SAMPLES:
+            return None
+        return ttfts[min(math.ceil(len(ttfts) * 0.95) - 1, len(ttfts) - 1)]
+
+
+class ModelRouter:
+    """モデルごとの状態を持ち、ターンを回すモデル・ヘッジを始めるまでの時間を決める（スレッドセーフ）"""
+
+    def __init__(self, fallbacks: dict[str, str], hedge_after: float | str | None = None,
+                 cooldown: float = DEFAULT_COOLDOWN_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.fallbacks = fallbacks
+        self.hedge_after = hedge_after  # 秒・"auto"（直近のp95）・None（ヘッジしない）
+        self.cooldown = cooldown
+        self.clock = clock
+        self._stats: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model_type: str) -> ModelStats:
+        return self._stats.setdefault(model_type, ModelStats())
+
+    def record_first_token(self, model_type: str, ttft: float) -> None:
+        with self._lock:
+            self._get(model_type).add(self.clock(), ttft)
+
+    def record_error(self, model_type: str, throttled: bool = False) -> None:
+        with self._lock:
+            stats = self._get(model_type)
+            now = self.clock()
+            stats.add(now, None)
+            if throttled:
+                stats.throttled_until = now + self.cooldown
+        count("model_router.errors", model_type=model_type, outcome="throttled" if throttled else "error")
+
+    def record_throttle(self, model_type: str) -> None:
+        """Strandsの再試行中に届いたスロットリングの通知（ターンはまだ失敗していない）"""
+        with self._lock:
+            self._get(model_type).throttled_until = self.clock() + self.cooldown
+
+    def is_healthy(self, model_type: str) -> bool:
+        with self._lock:
+            stats = self._get(model_type)
+            now = self.clock()
+            if now < stats.throttled_until:
+                return False
+            error_rate = stats.error_rate(now)
+            return error_rate is None or error_rate < UNHEALTHY_ERROR_RATE
+
+    def fallback_for(self, model_type: str) -> str | None:
+        return self.fallbacks.get(model_type)
+
+    def choose(self, model_type: str) -> str:
+        """ターンを回すモデル（不調なら、調子のよい代わりのモデル）"""
+        if self.is_healthy(model_type):
+            return model_type
+        fallback = self.fallback_for(model_type)
+        if fallback is None or not self.is_healthy(fallback):
+            return model_type
+        count("model_router.reroutes", model_type=fallback)
+        print(f"[INFO] Model rerouted: {model_type} -> {fallback} (model is throttled or failing)")
+        return fallback
+
+    def hedge_delay(self, model_type: str) -> float | None:
+        """代わりのモデルでヘッジを始めるまでの秒数（ヘッジしないなら None）"""
+        if self.hedge_after is None or self.fallback_for(model_type) is None:
+            return None
+        if self.hedge_after != "auto":
+            return self.hedge_after
+        with self._lock:
+            p95 = self._get(model_type).ttft_p95(self.clock())
+        return DEFAULT_AUTO_HEDGE_SECONDS if p95 is None else max(p95, MIN_HEDGE_SECONDS)
+
+
+def _parse_fallbacks(value: str) -> dict[str, str]:
+    """MODEL_FALLBACKS（例: "sonnet:kimi,kimi:sonnet"）を読む（有効でないモデルの組は無視する）"""
+    fallbacks = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        model_type, _, fallback = (part.strip() for part in pair.partition(":"))
+        if model_type not in ENABLED_MODEL_TYPES or fallback not in ENABLED_MODEL_TYPES or model_type == fallback:
+            print(f"[WARN] Invalid MODEL_FALLBACKS entry ignored: {pair.strip()!r}")
+            continue
+        fallbacks[model_type] = fallback
+    return fallbacks
+
+
+def _hedge_after() -> float | str | None:
+    value = os.getenv("MODEL_HEDGE_AFTER_MS", "").strip().lower()
+    if value == "auto":
+        return "auto"
+    if value == "off":
+        return None
+    # 未設定・0・読めない値はヘッジしない
+    hedge_after_ms = env_number("MODEL_HEDGE_AFTER_MS", 0.0, cast=float)
+    return hedge_after_ms / 1000 if hedge_after_ms > 0 else None
+
+
+_router: ModelRouter | None = None
+_router_created = False
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter | None:
+    """プロセス共通のモデルルーター（MODEL_FALLBACKS が未設定なら None で、従来どおり指定のモデルだけを使う）
+
+    MODEL_FALLBACKS: モデルごとの代わりのモデル（例: "sonnet:kimi,kimi:sonnet"。ENABLED_MODEL_TYPES のモデルのみ）
+    MODEL_HEDGE_AFTER_MS: 初回出力がこの時間内になければ代わりのモデルでも始める（"auto" は直近のTTFTのp95、未設定はしない）
+    MODEL_ROUTER_COOLDOWN_SECONDS: スロットリングされたモデルに新しいターンを回さない秒数（既定60）
+    """
+    global _router, _router_created
+    with _router_lock:
+        if _router_created:
+            return _router
+        _router_created = True
+        fallbacks = _parse_fallbacks(os.getenv("MODEL_FALLBACKS", ""))
+        if not fallbacks:
+            return None
+        _router = ModelRouter(fallbacks, hedge_after=_hedge_after(),
+                              cooldown=env_number("MODEL_ROUTER_COOLDOWN_SECONDS", DEFAULT_COOLDOWN_SECONDS, cast=float))
+        print(f"[INFO] Model router enabled: fallbacks={fallbacks}, hedge_after={_router.hedge_after}")
+        return _router
+
+
+class _AttemptCancel(threading.Event):
+    """試行ごとの中断シグナル（リクエストの cancel_event がセットされても中断する）
+
+    Strandsは cancel_signal.is_set() を見るため、採用しなかった試行だけを止めつつ、
+    クライアントの切断はすべての試行に伝わる。
+    """
+
+    def __init__(self, parent: threading.Event | None):
+        super().__init__()
+        self.parent = parent
+
+    def is_set(self) -> bool:
+        return super().is_set() or (self.parent is not None and self.parent.is_set())
+
+
+class _Attempt:
+    def __init__(self, agent: Agent, model_type: str, reason: str, parent_cancel: threading.Event | None):
+        self.agent = agent
+        self.model_type = model_type
+        self.reason = reason  # primary / hedge / throttled / error
+        self.cancel_event = _AttemptCancel(parent_cancel)
+        self.started_at = time.perf_counter()
+        self.buffer: list[dict] = []
+        self.finished = False
+        self.task: asyncio.Task | None = None
+
+
+class RoutedTurn:
+    """1ターンのモデル呼び出しを、フォールバック・ヘッジ付きで行う
+
+    使い方:
+        turn = RoutedTurn(router, session_id, agent, model_type, cancel_event)
+        mux.attach(turn.stream(prompt), handler)   # agent.stream_async(prompt) の代わり
+        ...
+        turn.agent / turn.model_type               # 応答したAgentとモデル（スナップショット・計測に使う）
+    """
+
+    def __init__(self, router: ModelRouter, session_id: str | None, agent: Agent, model_type: str,
+                 cancel_event: threading.Event | None = None, on_switch: Callable[[str], None] | None = None):
+        self.router = router
+        self.session_id = session_id
+        self.agent = agent
+        self.model_type = model_type
+        self.cancel_event = cancel_event
+        self.on_switch = on_switch
+
+    async def stream(self, prompt) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        history_end = len(self.agent.messages)
+        primary = self._start(_Attempt(self.agent, self.model_type, "primary", self.cancel_event), prompt, queue)
+        attempts = [primary]
+        fallback_model = self.router.fallback_for(self.model_type)
+        hedge_delay = self.router.hedge_delay(self.model_type)
+        committed: _Attempt | None = None
+
+        def start_fallback(reason: str) -> None:
+            agent = fork_agent(self.agent, fallback_model, history_end)
+            attempts.append(self._start(_Attempt(agent, fallback_model, reason, self.cancel_event), prompt, queue))
+            count("model_router.fallbacks", model_type=fallback_model, outcome=reason)
+            print(f"[INFO] Model fallback started: {self.model_type} -> {fallback_model} ({reason})")
+
+        try:
+            while True:
+                timeout = None
+                if committed is None and hedge_delay is not None and len(attempts) == 1:
+                    timeout = max(primary.started_at + hedge_delay - time.perf_counter(), 0.0)
+                try:
+                    attempt, kind, item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    start_fallback("hedge")
+                    continue
+
+                if committed is not None:
+                    if attempt is not committed:
+                        continue
+                    if kind == "event":
+                        yield item
+                    elif kind == "error":
+                        self.router.record_error(attempt.model_type, is_throttling_error(item))
+                        raise item
+                    else:
+                        return
+                    continue
+
+                if kind == "event":
+                    if is_model_output(item):
+                        self.router.record_first_token(attempt.model_type, time.perf_counter() - attempt.started_at)
+                        committed = self._commit(attempt, attempts)
+                        for event in attempt.buffer:
+                            yield event
+                        yield item
+                        continue
+                    attempt.buffer.append(item)
+                    # Strandsはスロットリングで再試行を待った後にこのイベントを出す。待っている間に代わりのモデルで始める
+                    if "event_loop_throttled_delay" in item and len(attempts) == 1 and fallback_model:
+                        self.router.record_throttle(attempt.model_type)
+                        start_fallback("throttled")
+                    continue
+
+                attempt.finished = True
+                if kind == "error":
+                    throttled = is_throttling_error(item)
+                    self.router.record_error(attempt.model_type, throttled)
+                    print(f"[WARN] Model attempt failed before output (model_type={attempt.model_type}): {item}")
+                    if len(attempts) == 1 and fallback_model:
+                        start_fallback("throttled" if throttled else "error")
+                        continue
+                    if any(not other.finished for other in attempts):
+                        continue
+                    raise item
+                # 出力なしで終わった（中断など）。ほかに動いている試行がなければ、この試行の結果で終える
+                if any(not other.finished for other in attempts):
+                    continue
+                committed = self._commit(attempt, attempts)
+                for event in attempt.buffer:
+                    yield event
+                return
+        finally:
+            for attempt in attempts:
+                if attempt.task is not None and not attempt.task.done():
+                    attempt.cancel_event.set()
+                    asyncio.get_running_loop().call_later(LOSER_CANCEL_GRACE, attempt.task.cancel)
+
+    def _start(self, attempt: _Attempt, prompt, queue: asyncio.Queue) -> _Attempt:
+        async def pump():
+            try:
+                async for event in stream_agent(attempt.agent, prompt, attempt.cancel_event):
+                    queue.put_nowait((attempt, "event", event))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                queue.put_nowait((attempt, "error", e))
+            else:
+                queue.put_nowait((attempt, "done", None))
+
+        attempt.task = asyncio.ensure_future(pump())
+        return attempt
+
+    def _commit(self, winner: _Attempt, attempts: list[_Attempt]) -> _Attempt:
+        """最初に出力した試行を採用し、ほかの試行を止める"""
+        for attempt in attempts:
+            if attempt is winner or attempt.finished:
+                continue
+            # 負けた試行の経過時間は中断までの時間でTTFTではないため記録しない（記録すると auto のヘッジが早まる）
+            attempt.cancel_event.set()
+        if winner.reason != "primary":
+            count("model_router.fallback_wins", model_type=winner.model_type, outcome=winner.reason)
+            print(f"[INFO] Model fallback answered: {self.model_type} -> {winner.model_type} ({winner.reason})")
+            self.agent = winner.agent
+            self.model_type = winner.model_type
+            replace_session_agent(self.session_id, winner.agent)
+            if self.on_switch is not None:
+                self.on_switch(winner.model_type)
+        return winner
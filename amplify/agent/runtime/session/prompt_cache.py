@@ -0,0 +1,116 @@
+"""プロンプトキャッシュのレイアウト（ツール定義・システムプロンプトのキャッシュポイント）と計測
+
+Bedrockはツール定義 → システムプロンプト → メッセージの順に読み、キャッシュポイントまでのプレフィックスを
+キャッシュする。プレフィックスがプロバイダーの最低トークン数（Claudeは1024）に届かないと、
+エラーにならずにキャッシュされなくなる（2026-02-21にツール定義が~302トークンに減ってキャッシュが止まった。
+`docs/temp/cache-investigation.md`）。
+
+- ツール定義のキャッシュは従来どおり BedrockModel の cache_tools="default"（ツール定義の末尾）、
+  システムプロンプトのキャッシュは非推奨の cache_prompt の代わりに末尾に置いた cachePoint ブロックで明示する
+- 起動時に各プレフィックスのトークン数をBedrockのCountTokens APIで数え、最低ラインを下回れば警告する
+- リクエストごとのキャッシュ読み込み・書き込みトークン数をメトリクスに記録し、止まった日に気付けるようにする
+"""
+
+import json
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from telemetry import count
+
+PROVIDER_MIN_CACHE_TOKENS = 1024  # Bedrockのプロンプトキャッシュの最低トークン数（Claude Sonnet / Opus）
+CACHE_TOOLS = "default"  # BedrockModel の cache_tools（ツール定義の末尾のキャッシュポイントの種類）
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+_PROBE_MESSAGES = [{"role": "user", "content": [{"text": "a"}]}]  # CountTokens はメッセージが1件以上必要
+
+
+def system_prompt_blocks(prompt: str, use_cache: bool) -> str | list[dict]:
+    """システムプロンプト（キャッシュするモデルでは末尾にキャッシュポイントを置いたブロックのリスト）"""
+    if not use_cache:
+        return prompt
+    return [{"text": prompt}, dict(CACHE_POINT)]
+
+
+@dataclass
+class CachePrefix:
+    """キャッシュポイントまでのプレフィックス（ツール定義だけ、ツール定義＋システムプロンプト）"""
+
+    name: str
+    tokens: int
+    minimum: int
+    estimated: bool = False
+
+    @property
+    def cacheable(self) -> bool:
+        return self.tokens >= self.minimum
+
+
+def estimate_prefix_tokens(text: str) -> int:
+    """CountTokens が使えないときの見積もり（日本語などASCII以外は1文字1トークン、ASCIIは4文字1トークン）"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def bedrock_token_counter(model) -> Callable[[dict], int]:
+    """BedrockのCountTokens APIで Converse の入力のトークン数を数える関数"""
+    def count_tokens(converse_input: dict) -> int:
+        response = model.client.count_tokens(modelId=model.config["model_id"], input={"converse": converse_input})
+        return response["inputTokens"]
+    return count_tokens
+
+
+def measure_cache_prefixes(
+    count_tokens: Callable[[dict], int],
+    tool_specs: list[dict],
+    system_prompt: str,
+    minimum: int = PROVIDER_MIN_CACHE_TOKENS,
+) -> list[CachePrefix]:
+    """キャッシュポイントまでの各プレフィックスのトークン数を数える
+
+    count_tokens が失敗した場合は文字数からの見積もりにする（estimated=True）。
+    """
+    tool_config = {"tools": [{"toolSpec": spec} for spec in tool_specs]}
+    system = [{"text": system_prompt}]
+    try:
+        probe = count_tokens({"messages": _PROBE_MESSAGES})
+        tools = count_tokens({"messages": _PROBE_MESSAGES, "toolConfig": tool_config}) - probe
+        tools_and_system = count_tokens({"messages": _PROBE_MESSAGES, "toolConfig": tool_config, "system": system}) - probe
+        estimated = False
+    except Exception as e:
+        print(f"[WARN] CountTokens failed, estimating cache prefix tokens from characters: {e}")
+        tools = estimate_prefix_tokens(json.dumps(tool_config, ensure_ascii=False))
+        tools_and_system = tools + estimate_prefix_tokens(system_prompt)
+        estimated = True
+    return [
+        CachePrefix("tools", tools, minimum, estimated),
+        CachePrefix("tools+system", tools_and_system, minimum, estimated),
+    ]
+
+
+def report_cache_prefixes(model_type: str, prefixes: list[CachePrefix]) -> None:
+    """プレフィックスの計測結果をログに出し、最低ラインを下回ったものをカウンターに記録する"""
+    for prefix in prefixes:
+        source = "estimated" if prefix.estimated else "counted"
+        if prefix.cacheable:
+            print(f"[INFO] Prompt cache prefix ok: model_type={model_type} {prefix.name}={prefix.tokens} tokens "
+                  f"(minimum={prefix.minimum}, {source})")
+        else:
+            count("prompt_cache.undersized_prefixes", model_type=model_type)
+            print(f"[WARN] Prompt cache prefix below minimum, it will not be cached: model_type={model_type} "
+                  f"{prefix.name}={prefix.tokens} tokens (minimum={prefix.minimum}, {source})")
+
+
+def record_cache_usage(model_type: str, usage: dict, use_cache: bool) -> None:
+    """1リクエストのキャッシュ読み込み・書き込みトークン数を記録する
+
+    キャッシュするモデルで読み込みも書き込みも0のリクエストは outcome="miss" として数える
+    （プレフィックスが最低ラインを割ると、すべてのリクエストが miss になる）。
+    """
+    read = usage.get("cacheReadInputTokens", 0)
+    write = usage.get("cacheWriteInputTokens", 0)
+    count("model.input_tokens", usage.get("inputTokens", 0), model_type=model_type)
+    if not use_cache:
+        return
+    count("prompt_cache.read_tokens", read, model_type=model_type)
+    count("prompt_cache.write_tokens", write, model_type=model_type)
+    outcome = "hit" if read else "write" if write else "miss"
+    count("prompt_cache.requests", model_type=model_type, outcome=outcome)
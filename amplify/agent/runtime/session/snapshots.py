@@ -0,0 +1,341 @@
+"""会話履歴のスナップショット（プロセスの再起動やメモリからの追い出し後も会話を続けるため）
+
+セッションストア（store.py）はメモリ上のLRUで、追い出されたセッションや再起動前のセッションは
+次のターンで履歴のないAgentになる。そこでターンの終わりに会話履歴をローカルの永続ストアへ保存し、
+メモリにないセッションの最初のターンで読み戻す。
+
+- 保存: ターンの終わりにイベントループ外のスレッドで履歴をJSONにし、圧縮と書き込みはバックグラウンドのスレッドで行う
+  （同じセッションの未書き込みのスナップショットは最新のものだけ書く）
+- 読み戻し: セッションストアにないときだけ読む（通常のターンではストアを読まない）
+- 保存先: SQLite（既定）・ファイル（1セッション1ファイル）を環境変数で切り替える。
+  同じ形の load / save / delete / purge を持つクラスを渡せば別の保存先にできる
+"""
+
+import base64
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Protocol
+
+from config import env_number
+from telemetry import count
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_DIR = "/tmp/marp-agent/sessions"
+DEFAULT_SNAPSHOT_TTL_SECONDS = 24 * 60 * 60
+PURGE_INTERVAL_SECONDS = 60 * 60
+_BYTES_KEY = "__bytes__"
+
+
+@dataclass
+class SessionSnapshot:
+    """1セッションの保存内容（Agentを作り直すのに必要なものだけ）"""
+
+    model_type: str
+    messages: list[dict]
+    saved_at: float = field(default_factory=time.time)
+
+
+def _encode_bytes(value):
+    # 画像・ドキュメントのブロックは bytes を含むため、JSONでは base64 にする
+    if isinstance(value, bytes | bytearray):
+        return {_BYTES_KEY: base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(value: dict):
+    if len(value) == 1 and _BYTES_KEY in value:
+        return base64.b64decode(value[_BYTES_KEY])
+    return value
+
+
+def dump_snapshot(snapshot: SessionSnapshot) -> str:
+    """スナップショットをJSONにする（書き込み待ちに入れる前に行い、以降に履歴が変わっても影響しないようにする）"""
+    return json.dumps(
+        {"v": SNAPSHOT_VERSION, "model_type": snapshot.model_type, "saved_at": snapshot.saved_at,
+         "messages": snapshot.messages},
+        ensure_ascii=False, separators=(",", ":"), default=_encode_bytes,
+    )
+
+
+def compress_snapshot(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def parse_snapshot(text: str) -> SessionSnapshot | None:
+    """JSONをスナップショットに戻す（形式が違うものは None）"""
+    try:
+        payload = json.loads(text, object_hook=_decode_bytes)
+    except json.JSONDecodeError as e:
+        print(f"[WARN] Broken session snapshot ignored: {e}")
+        return None
+    if payload.get("v") != SNAPSHOT_VERSION:
+        return None
+    return SessionSnapshot(
+        model_type=payload["model_type"], messages=payload["messages"], saved_at=payload["saved_at"],
+    )
+
+
+def load_snapshot(data: bytes) -> SessionSnapshot | None:
+    """保存したバイト列をスナップショットに戻す"""
+    try:
+        text = zlib.decompress(data).decode("utf-8")
+    except (zlib.error, UnicodeDecodeError) as e:
+        print(f"[WARN] Broken session snapshot ignored: {e}")
+        return None
+    return parse_snapshot(text)
+
+
+class SnapshotBackend(Protocol):
+    """スナップショットの保存先（セッションIDごとにバイト列を1つ持つ）"""
+
+    def load(self, session_id: str) -> bytes | None: ...
+
+    def save(self, session_id: str, data: bytes, saved_at: float) -> None: ...
+
+    def delete(self, session_id: str) -> None: ...
+
+    def purge(self, older_than: float) -> int: ...
+
+
+class SqliteSnapshotBackend:
+    """SQLiteの1テーブルに保存する（WALモードで、同じファイルを複数プロセスから読み書きできる）"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, saved_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 接続はスレッドごとに持つ（リクエスト処理のスレッドと書き込みスレッド）
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, session_id: str) -> bytes | None:
+        row = self._connect().execute(
+            "SELECT data FROM snapshots WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, session_id: str, data: bytes, saved_at: float) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO snapshots (session_id, data, saved_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, saved_at = excluded.saved_at "
+                "WHERE excluded.saved_at >= snapshots.saved_at",
+                (session_id, data, saved_at),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM snapshots WHERE session_id = ?", (session_id,))
+
+    def purge(self, older_than: float) -> int:
+        with self._connect() as connection:
+            return connection.execute("DELETE FROM snapshots WHERE saved_at < ?", (older_than,)).rowcount
+
+
+class FileSnapshotBackend:
+    """1セッション1ファイルで保存する（ファイル名はセッションIDのハッシュ）"""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id: str) -> Path:
+        return self.directory / f"{hashlib.sha256(session_id.encode('utf-8')).hexdigest()}.snapshot"
+
+    def load(self, session_id: str) -> bytes | None:
+        try:
+            return self._path(session_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def save(self, session_id: str, data: bytes, saved_at: float) -> None:
+        path = self._path(session_id)
+        # 書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+        temporary = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        temporary.write_bytes(data)
+        os.utime(temporary, (saved_at, saved_at))  # 更新時刻を保存時刻にする（purge の基準）
+        os.replace(temporary, path)
+
+    def delete(self, session_id: str) -> None:
+        self._path(session_id).unlink(missing_ok=True)
+
+    def purge(self, older_than: float) -> int:
+        removed = 0
+        for path in self.directory.glob("*.snapshot"):
+            try:
+                if path.stat().st_mtime < older_than:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+class SnapshotStore:
+    """スナップショットの非同期書き込みと読み戻し"""
+
+    def __init__(self, backend: SnapshotBackend, ttl: float = DEFAULT_SNAPSHOT_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._pending: dict[str, str] = {}
+        self._pending_lock = threading.Lock()
+        self._queue: queue.Queue[str | None] = queue.Queue()
+        self._writer: threading.Thread | None = None
+        self._last_purge = 0.0
+
+    def save_async(self, session_id: str, snapshot: SessionSnapshot) -> None:
+        """スナップショットを書き込み待ちに入れる（JSONにするのは呼び出し元、圧縮と書き込みは書き込みスレッド）
+
+        JSONにするのは履歴の長さに比例して重いため、イベントループからは asyncio.to_thread で呼ぶ。
+        """
+        text = dump_snapshot(snapshot)
+        with self._pending_lock:
+            queued = session_id in self._pending
+            self._pending[session_id] = text
+        if not queued:
+            self._ensure_writer()
+            self._queue.put(session_id)
+
+    def load(self, session_id: str) -> SessionSnapshot | None:
+        """保存したスナップショットを読む（書き込み待ちのものがあればそれを返す）"""
+        with self._pending_lock:
+            text = self._pending.get(session_id)
+        if text is not None:
+            return parse_snapshot(text)
+        try:
+            data = self.backend.load(session_id)
+        except Exception as e:
+            print(f"[WARN] Session snapshot load failed: {e}")
+            return None
+        if data is None:
+            return None
+        snapshot = load_snapshot(data)
+        if snapshot is not None and time.time() - snapshot.saved_at > self.ttl:
+            return None
+        return snapshot
+
+    def flush(self, timeout: float | None = None) -> None:
+        """書き込み待ちがなくなるまで待つ（終了時・テスト用）"""
+        if self._writer is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            time.sleep(0.01)
+
+    def _ensure_writer(self) -> None:
+        with self._pending_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="session-snapshot-writer", daemon=True)
+        self._writer.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            try:
+                session_id = self._queue.get(timeout=PURGE_INTERVAL_SECONDS)
+            except queue.Empty:
+                self._purge_expired()
+                continue
+            try:
+                self._write(session_id)
+            finally:
+                self._queue.task_done()
+            if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._purge_expired()
+
+    def _write(self, session_id: str) -> None:
+        with self._pending_lock:
+            text = self._pending.get(session_id)
+        if text is None:
+            return
+        data = compress_snapshot(text)
+        try:
+            self.backend.save(session_id, data, time.time())
+            count("session.snapshots", outcome="saved")
+        except Exception as e:
+            count("session.snapshots", outcome="error")
+            print(f"[WARN] Session snapshot save failed: {e}")
+        finally:
+            with self._pending_lock:
+                # 書き込み中に新しいスナップショットが来ていたら、それは次の書き込みに残す
+                if self._pending.get(session_id) is text:
+                    del self._pending[session_id]
+                else:
+                    self._queue.put(session_id)
+
+    def _purge_expired(self) -> None:
+        self._last_purge = time.time()
+        try:
+            removed = self.backend.purge(self._last_purge - self.ttl)
+        except Exception as e:
+            print(f"[WARN] Session snapshot purge failed: {e}")
+            return
+        if removed:
+            print(f"[INFO] Purged {removed} expired session snapshot(s)")
+
+
+def snapshot_backend_name() -> str:
+    """スナップショットの保存先（環境変数 SESSION_SNAPSHOT_BACKEND: sqlite / file / none）"""
+    return os.getenv("SESSION_SNAPSHOT_BACKEND", "sqlite").strip().lower() or "sqlite"
+
+
+def _snapshot_ttl() -> float:
+    return env_number("SESSION_SNAPSHOT_TTL_SECONDS", DEFAULT_SNAPSHOT_TTL_SECONDS, cast=float)
+
+
+_snapshot_store: SnapshotStore | None = None
+_snapshot_store_created = False
+_snapshot_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore | None:
+    """プロセス共通のスナップショットストア（SESSION_SNAPSHOT_BACKEND=none なら None）
+
+    SESSION_SNAPSHOT_BACKEND: sqlite（既定）/ file / none
+    SESSION_SNAPSHOT_DIR: 保存先のディレクトリ（既定 /tmp/marp-agent/sessions）
+    SESSION_SNAPSHOT_TTL_SECONDS: 最後に保存してから読み戻さなくなるまでの秒数（既定86400）
+    """
+    global _snapshot_store, _snapshot_store_created
+    with _snapshot_store_lock:
+        if _snapshot_store_created:
+            return _snapshot_store
+        _snapshot_store_created = True
+        name = snapshot_backend_name()
+        directory = Path(os.getenv("SESSION_SNAPSHOT_DIR", "").strip() or DEFAULT_SNAPSHOT_DIR)
+        try:
+            if name == "sqlite":
+                backend = SqliteSnapshotBackend(directory / "sessions.sqlite3")
+            elif name == "file":
+                backend = FileSnapshotBackend(directory)
+            else:
+                if name != "none":
+                    print(f"[WARN] Unknown SESSION_SNAPSHOT_BACKEND={name!r}, session snapshots disabled")
+                return None
+        except (OSError, sqlite3.Error) as e:
+            print(f"[WARN] Session snapshots disabled: {e}")
+            return None
+        _snapshot_store = SnapshotStore(backend, ttl=_snapshot_ttl())
+        print(f"[INFO] Session snapshots enabled (backend={name}, dir={directory})")
+        return _snapshot_store
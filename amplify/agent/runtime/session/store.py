@@ -0,0 +1,212 @@
+"""セッションごとのAgentの保持（件数・メモリ・アイドル時間の上限つきLRU）
+
+Agentはモデルクライアントと会話履歴を持つため、無制限に保持するとコンテナのメモリが増え続ける。
+次のいずれかに当たったものを追い出す（追い出されたセッションは次のターンで新しいAgentになる）。
+
+- 件数: 上限を超えたら最後に使ったのが古い順
+- メモリ: 会話履歴の推定サイズの合計が上限を超えたら古い順
+- アイドル時間: 最後に使ってからTTLを過ぎたもの
+
+会話履歴のサイズ計測と期限切れの削除はバックグラウンドのスレッドで定期的に行い、リクエストの処理では計測しない。
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from config import env_number
+from telemetry import count
+
+from .snapshots import snapshot_backend_name
+
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_MEMORY_MB = 512
+DEFAULT_IDLE_TTL_SECONDS = 900  # AgentCoreの非アクティブタイムアウト（15分）に合わせる
+SNAPSHOT_IDLE_TTL_SECONDS = 300  # スナップショットから読み戻せる場合は早めにメモリから追い出す
+DEFAULT_CLEAN_INTERVAL_SECONDS = 60
+AGENT_OVERHEAD_BYTES = 1024 * 1024  # 会話履歴以外（モデルクライアント・ツール定義など）の1セッションあたりの見積もり
+
+
+def estimate_agent_bytes(agent) -> int:
+    """Agentのメモリ使用量の見積もり（会話履歴をJSONにしたサイズ + 固定の上乗せ）"""
+    messages = getattr(agent, "messages", None) or []
+    return AGENT_OVERHEAD_BYTES + len(json.dumps(messages, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+@dataclass
+class _Entry:
+    agent: object
+    size: int
+    last_used: float
+
+
+class SessionStore:
+    """セッションキー → Agent のLRU（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        memory_bytes: int,
+        idle_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        size_of: Callable[[object], int] = estimate_agent_bytes,
+    ):
+        self.max_entries = max_entries
+        self.memory_bytes = memory_bytes
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._size_of = size_of
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._cleaner: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    @property
+    def memory_used(self) -> int:
+        """保持中のAgentの推定サイズの合計（最後に計測した値）"""
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def get(self, key: str):
+        """Agentを返して最終利用時刻を更新する（期限切れなら追い出して None）"""
+        evicted = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = self._clock()
+            if now - entry.last_used > self.idle_ttl:
+                del self._entries[key]
+                evicted = key
+            else:
+                entry.last_used = now
+                self._entries.move_to_end(key)
+                return entry.agent
+        self._record_evictions([evicted], "ttl")
+        return None
+
+    def put(self, key: str, agent) -> None:
+        """Agentを保存し、件数・メモリの上限を超えた分を古い順に追い出す"""
+        size = self._size_of(agent)
+        with self._lock:
+            self._entries[key] = _Entry(agent=agent, size=size, last_used=self._clock())
+            self._entries.move_to_end(key)
+            evicted = self._evict_over_limits_locked(keep=key)
+        for reason, keys in evicted.items():
+            self._record_evictions(keys, reason)
+
+    def pop(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry.agent if entry else None
+
+    def clean(self) -> int:
+        """会話履歴のサイズを計測し直し、期限切れと上限超過を追い出す（追い出した件数を返す）"""
+        with self._lock:
+            snapshot = list(self._entries.items())
+        # 計測はロックの外で行う（リクエスト処理側の get / put を待たせない）
+        sizes = {}
+        for key, entry in snapshot:
+            try:
+                sizes[key] = self._size_of(entry.agent)
+            except (RuntimeError, TypeError, ValueError):
+                # ストリーム中に履歴が変わった場合などは前回の値を使う
+                continue
+
+        with self._lock:
+            for key, size in sizes.items():
+                if key in self._entries:
+                    self._entries[key].size = size
+            now = self._clock()
+            expired = [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_ttl]
+            for key in expired:
+                del self._entries[key]
+            evicted = self._evict_over_limits_locked()
+        evicted["ttl"] = expired
+        for reason, keys in evicted.items():
+            self._record_evictions(keys, reason)
+        return sum(len(keys) for keys in evicted.values())
+
+    def _evict_over_limits_locked(self, keep: str | None = None) -> dict[str, list[str]]:
+        """件数・メモリの上限を超えた分を古い順に追い出す（最後に使ったセッションは残す）"""
+        evicted: dict[str, list[str]] = {"lru": [], "memory": []}
+        while len(self._entries) > max(self.max_entries, 1):
+            key, _ = self._pop_oldest_locked(keep)
+            evicted["lru"].append(key)
+        used = sum(entry.size for entry in self._entries.values())
+        while used > self.memory_bytes and len(self._entries) > 1:
+            key, entry = self._pop_oldest_locked(keep)
+            evicted["memory"].append(key)
+            used -= entry.size
+        return evicted
+
+    def _pop_oldest_locked(self, keep: str | None) -> tuple[str, _Entry]:
+        key = next(key for key in self._entries if key != keep)
+        return key, self._entries.pop(key)
+
+    def _record_evictions(self, keys: list[str], reason: str) -> None:
+        if not keys:
+            return
+        count("session.evictions", len(keys), reason=reason)
+        print(f"[INFO] Evicted {len(keys)} session(s) (reason={reason}, remaining={len(self._entries)})")
+
+    def start_cleaner(self, interval: float) -> None:
+        """clean() を interval 秒ごとに実行するデーモンスレッドを起動する（起動済みなら何もしない）"""
+        with self._lock:
+            if self._cleaner is not None or interval <= 0:
+                return
+            self._stop.clear()
+            self._cleaner = threading.Thread(
+                target=self._run_cleaner, args=(interval,), name="session-cleaner", daemon=True
+            )
+        self._cleaner.start()
+
+    def stop_cleaner(self) -> None:
+        self._stop.set()
+        cleaner, self._cleaner = self._cleaner, None
+        if cleaner is not None:
+            cleaner.join()
+
+    def _run_cleaner(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.clean()
+            except Exception as e:
+                print(f"[WARN] Session cleaner failed: {e}")
+
+
+def _default_idle_ttl() -> int:
+    return DEFAULT_IDLE_TTL_SECONDS if snapshot_backend_name() == "none" else SNAPSHOT_IDLE_TTL_SECONDS
+
+
+_store: SessionStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """プロセス共通のセッションストア（初回に作成してクリーナーを起動）
+
+    SESSION_MAX_ENTRIES: 保持するセッション数の上限（既定200）
+    SESSION_MEMORY_MB: 会話履歴の推定サイズの合計の上限（既定512）
+    SESSION_IDLE_TTL_SECONDS: 最後に使ってから追い出すまでの秒数（既定900、スナップショットが有効なら300）
+    SESSION_CLEAN_INTERVAL_SECONDS: クリーナーの実行間隔（既定60、0で起動しない）
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(
+                max_entries=env_number("SESSION_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                memory_bytes=env_number("SESSION_MEMORY_MB", DEFAULT_MEMORY_MB) * 1024 * 1024,
+                idle_ttl=env_number("SESSION_IDLE_TTL_SECONDS", _default_idle_ttl()),
+            )
+            _store.start_cleaner(env_number("SESSION_CLEAN_INTERVAL_SECONDS", DEFAULT_CLEAN_INTERVAL_SECONDS))
+        return _store
@@ -3,12 +3,13 @@
 import os
 import re
 import html as html_escape
+import threading
 import uuid
 from datetime import datetime, timedelta, UTC
 
 import boto3
 
-from exports import generate_standalone_html, generate_thumbnail
+from exports import ExportCancelledError, generate_standalone_html, generate_thumbnail
 
 # S3クライアント（遅延初期化）
 _s3_client = None
@@ -54,7 +55,7 @@ def _inject_ogp_tags(html: str, title: str, image_url: str, page_url: str) -> st
     return html.replace('</head>', f'{ogp_tags}</head>')
 
 
-def share_slide(markdown: str, theme: str = 'border') -> dict:
+def share_slide(markdown: str, theme: str = 'border', cancel_event: threading.Event | None = None) -> dict:
     """スライドをHTML化してS3に保存し、公開URLを返す（OGP対応）"""
     bucket_name = os.environ.get('SHARED_SLIDES_BUCKET')
     cloudfront_domain = os.environ.get('CLOUDFRONT_DOMAIN')
@@ -71,7 +72,7 @@ def share_slide(markdown: str, theme: str = 'border') -> dict:
     # サムネイル生成・アップロード
     thumbnail_url = None
     try:
-        thumbnail_bytes = generate_thumbnail(markdown, theme)
+        thumbnail_bytes = generate_thumbnail(markdown, theme, cancel_event=cancel_event)
         thumbnail_key = f"{slide_path}/thumbnail.png"
         s3_client.put_object(
             Bucket=bucket_name,
@@ -81,6 +82,8 @@ def share_slide(markdown: str, theme: str = 'border') -> dict:
         )
         thumbnail_url = f"https://{public_domain}/{thumbnail_key}"
         print(f"[INFO] Thumbnail uploaded: {thumbnail_url}")
+    except ExportCancelledError:
+        raise
     except Exception as e:
         # サムネイル生成に失敗してもHTML共有は続行
         print(f"[WARN] Thumbnail generation failed: {e}")
@@ -89,7 +92,7 @@ def share_slide(markdown: str, theme: str = 'border') -> dict:
     share_url = f"https://{public_domain}/{slide_path}/index.html"
 
     # HTML生成
-    html_content = generate_standalone_html(markdown, theme)
+    html_content = generate_standalone_html(markdown, theme, cancel_event=cancel_event)
 
     # OGPタグ挿入（サムネイルがある場合のみ）
     if thumbnail_url:
@@ -0,0 +1,14 @@
+"""ストリーミング応答の補助モジュール"""
+
+from .chat_events import ChatEventTranslator
+from .multiplexer import StreamMultiplexer
+from .partial_slides import PartialSlideExtractor
+from .text_coalescer import TextCoalescer, create_text_coalescer
+
+__all__ = [
+    "ChatEventTranslator",
+    "StreamMultiplexer",
+    "PartialSlideExtractor",
+    "TextCoalescer",
+    "create_text_coalescer",
+]
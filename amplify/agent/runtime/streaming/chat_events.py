@@ -0,0 +1,108 @@
+"""Strands AgentのストリームイベントをSSEイベントに変換"""
+
+import json
+import time
+
+from .partial_slides import PartialSlideExtractor
+
+
+class ChatEventTranslator:
+    """1回のチャットのストリームイベントと受け入れ済みスライドの通知をSSEイベントに変換する"""
+
+    def __init__(self):
+        self.web_search_executed = False
+        self.slide_outputted = False
+        # output_slide完了後はテキスト送信を抑制
+        self.suppress_text = False
+        # 生成途中のoutput_slide入力から完成したスライドを先行送信する（ツール呼び出しごとに作り直す）
+        self._partial_extractor: PartialSlideExtractor | None = None
+        self._partial_tool_use_id = None
+        # 計測用（time.perf_counter()）: モデルの最初の出力（テキストまたはツール入力）・最初のmarkdown送信
+        self.first_token_at: float | None = None
+        self.markdown_at: float | None = None
+        # モデル呼び出しごとの使用トークン数の合計（キャッシュの読み込み・書き込みを含む）
+        self.usage: dict[str, int] = {}
+
+    def on_markdown(self, markdown: str) -> list[dict]:
+        """output_slide / patch_slides が受け入れたスライド"""
+        # 検証を通過した時点で次のトークンを待たずに送信（スピナーを即座に停止）し、以降のテキストを抑制
+        self.slide_outputted = True
+        self.suppress_text = True
+        if self.markdown_at is None:
+            self.markdown_at = time.perf_counter()
+        return [{"type": "markdown", "data": markdown}]
+
+    def on_stream_event(self, event: dict) -> list[dict]:
+        """agent.stream_async のイベント"""
+        # init_event_loop などのライフサイクルイベントはモデルの出力に数えない
+        if self.first_token_at is None and ("data" in event or "current_tool_use" in event):
+            self.first_token_at = time.perf_counter()
+        if "data" in event:
+            if self.suppress_text:
+                return []
+            return [{"type": "text", "data": event["data"]}]
+        if "current_tool_use" in event:
+            return self._on_tool_use(event["current_tool_use"])
+        if "event" in event:
+            self._add_usage(event["event"])
+            return []
+        if "result" in event:
+            result = event["result"]
+            events = []
+            if hasattr(result, 'message') and result.message:
+                for content in getattr(result.message, 'content', []):
+                    if hasattr(content, 'text') and content.text:
+                        events.append({"type": "text", "data": content.text})
+            return events
+        return []
+
+    def _add_usage(self, chunk: dict) -> None:
+        usage = (chunk.get("metadata") or {}).get("usage") or {}
+        for key, value in usage.items():
+            if isinstance(value, int):
+                self.usage[key] = self.usage.get(key, 0) + value
+
+    def _on_tool_use(self, tool_info: dict) -> list[dict]:
+        tool_name = tool_info.get("name", "unknown")
+        tool_input = tool_info.get("input", {})
+        events = []
+
+        if tool_name == "output_slide" and isinstance(tool_input, str):
+            events.extend(self._partial_slides(tool_info.get("toolUseId"), tool_input))
+
+        # 文字列の場合はJSONパースを試みる
+        if isinstance(tool_input, str):
+            try:
+                tool_input = json.loads(tool_input)
+            except json.JSONDecodeError:
+                pass
+
+        # ⚠️ 重複スキップしない。inputが段階的にビルドされるため、最初のチャンクではqueryが空のことがある
+        if tool_name == "web_search":
+            self.web_search_executed = True
+            if isinstance(tool_input, dict) and "query" in tool_input:
+                events.append({"type": "tool_use", "data": tool_name, "query": tool_input["query"]})
+        elif tool_name == "http_request":
+            if isinstance(tool_input, dict) and "url" in tool_input:
+                events.append({"type": "tool_use", "data": tool_name, "query": tool_input["url"]})
+            else:
+                events.append({"type": "tool_use", "data": tool_name})
+        else:
+            events.append({"type": "tool_use", "data": tool_name})
+        return events
+
+    def _partial_slides(self, tool_use_id, raw_input: str) -> list[dict]:
+        if self._partial_extractor is None or tool_use_id != self._partial_tool_use_id:
+            self._partial_extractor = PartialSlideExtractor()
+            self._partial_tool_use_id = tool_use_id
+        extractor = self._partial_extractor
+        start_index = len(extractor.slides)
+        return [
+            {
+                "type": "slide_partial",
+                "index": start_index + offset,
+                "data": slide,
+                "frontmatter": extractor.frontmatter,
+            }
+            for offset, slide in enumerate(extractor.feed(raw_input), start=1)
+        ]
@@ -0,0 +1,207 @@
+"""SSEストリームの多重化（ソース・サイドチャネル・keep-alive）
+
+チャット・エクスポート・共有の全アクションで共通に使う。
+
+- ソース（モデルのストリーム等）は1本のポンプタスクがキューへ流し込む（イベントごとにタスクを作らない）
+- サイドチャネル（ツールからの通知など）は `publish()` で同じキューに積むため、到着順が保たれる
+- keep-alive は `loop.call_later` の単一タイマーで、最後の送信から一定時間経ったときだけ送る
+- テキストの結合（TextCoalescer）の送信期限も同じキューへのタイマーで処理する
+- ソースが終わる前に受信側が離れたら（クライアント切断）、cancel_event でソースに中断を伝える
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterable
+from typing import Any
+
+from .text_coalescer import TextCoalescer
+
+Handler = Callable[[Any], Iterable[dict]]
+
+# キューに積む制御用の目印
+_SOURCE_DONE = object()
+_HEARTBEAT = object()
+_FLUSH_DUE = object()
+
+# 切断後、ソースが自発的に止まるのを待つ時間（秒）。過ぎたらポンプタスクをキャンセルする
+CANCEL_GRACE_PERIOD = 1.0
+
+# 切断後にソースの停止を待つタスク（GCで消えないよう参照を持つ）
+_reapers: set[asyncio.Task] = set()
+
+
+def _as_event(item: Any) -> Iterable[dict]:
+    return [item]
+
+
+class _SourceError:
+    """ポンプタスクで発生した例外を受信側で再送出するための包み"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class StreamMultiplexer:
+    """複数の入力を1本のSSEイベント列にまとめ、無通信時にkeep-aliveを挟む
+
+    使い方:
+        mux = StreamMultiplexer(5.0, "処理中...")
+        mux.attach(agent.stream_async(prompt), handle_event)   # ソース
+        mux.publish(markdown, handle_markdown)                  # サイドチャネル（イベントループ上から）
+        async for event in mux:
+            yield event
+    """
+
+    def __init__(self, heartbeat_interval: float, heartbeat_message: str = "処理中...",
+                 coalescer: TextCoalescer | None = None, cancel_event: threading.Event | None = None,
+                 cancel_grace: float = CANCEL_GRACE_PERIOD):
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_message = heartbeat_message
+        self.coalescer = coalescer
+        self.cancel_event = cancel_event
+        self.cancel_grace = cancel_grace
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pumps: list[asyncio.Task] = []
+        self._active_sources = 0
+        self._last_emit = time.monotonic()
+        self._heartbeat_handle: asyncio.TimerHandle | None = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def attach(self, source: AsyncIterator, handler: Handler | None = None) -> None:
+        """ソースを登録する。全ソースが終わるとイテレーションも終わる"""
+        self._active_sources += 1
+        self._pumps.append(asyncio.ensure_future(self._pump(source, handler or _as_event)))
+
+    def attach_task(self, task: asyncio.Future) -> None:
+        """完了を待つだけのタスク（エクスポート等）をソースとして登録する"""
+
+        async def wait_for_task():
+            await task
+            return
+            yield
+
+        self.attach(wait_for_task())
+
+    def publish(self, item: Any, handler: Handler | None = None) -> None:
+        """サイドチャネルのイベントを積む（イベントループのスレッドから呼ぶ）"""
+        self._queue.put_nowait((handler or _as_event, item))
+
+    async def _pump(self, source: AsyncIterator, handler: Handler) -> None:
+        try:
+            async for item in source:
+                self._queue.put_nowait((handler, item))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._queue.put_nowait(_SourceError(e))
+        finally:
+            self._queue.put_nowait(_SOURCE_DONE)
+
+    def __aiter__(self) -> AsyncIterator[dict]:
+        return self._run()
+
+    async def _run(self) -> AsyncIterator[dict]:
+        loop = asyncio.get_running_loop()
+        self._last_emit = time.monotonic()
+        self._heartbeat_handle = loop.call_later(self.heartbeat_interval, self._on_heartbeat_timer)
+        try:
+            while self._active_sources > 0:
+                for event in self._handle(await self._queue.get()):
+                    yield event
+            # ソース終了までにキューへ積まれたサイドチャネルのイベントも送る
+            while not self._queue.empty():
+                for event in self._handle(self._queue.get_nowait()):
+                    yield event
+            for event in self.flush():
+                yield event
+        finally:
+            await self.aclose()
+
+    def _handle(self, entry: Any) -> list[dict]:
+        if entry is _SOURCE_DONE:
+            self._active_sources -= 1
+            return []
+        if isinstance(entry, _SourceError):
+            raise entry.error
+        if entry is _HEARTBEAT:
+            return self._emit([{"type": "progress", "message": self.heartbeat_message}])
+        if entry is _FLUSH_DUE:
+            self._flush_handle = None
+            if self.coalescer and self.coalescer.timeout() == 0:
+                return self._emit(self.coalescer.flush())
+            self._schedule_flush()
+            return []
+
+        handler, item = entry
+        events = list(handler(item))
+        if self.coalescer is None:
+            return self._emit(events)
+        out = []
+        for event in events:
+            out.extend(self.coalescer.push(event))
+        self._schedule_flush()
+        return self._emit(out)
+
+    def _emit(self, events: list[dict]) -> list[dict]:
+        if events:
+            self._last_emit = time.monotonic()
+        return events
+
+    def flush(self) -> list[dict]:
+        """結合待ちのテキストを吐き出す（エラー送信前などに使う）"""
+        if self.coalescer is None:
+            return []
+        return self._emit(self.coalescer.flush())
+
+    def _schedule_flush(self) -> None:
+        timeout = self.coalescer.timeout() if self.coalescer else None
+        if timeout is None or self._flush_handle is not None:
+            return
+        self._flush_handle = asyncio.get_running_loop().call_later(timeout, self._queue.put_nowait, _FLUSH_DUE)
+
+    def _on_heartbeat_timer(self) -> None:
+        """最後の送信から間隔が空いていればkeep-aliveを積み、次の発火を予約する（タイマーは常に1つ）"""
+        idle = time.monotonic() - self._last_emit
+        if idle >= self.heartbeat_interval:
+            self._queue.put_nowait(_HEARTBEAT)
+            self._last_emit = time.monotonic()
+            idle = 0.0
+        loop = asyncio.get_running_loop()
+        self._heartbeat_handle = loop.call_later(self.heartbeat_interval - idle, self._on_heartbeat_timer)
+
+    async def aclose(self) -> None:
+        """タイマーとポンプタスクを止める
+
+        ソースが終わる前に呼ばれた場合（受信側の切断）は cancel_event をセットしてソースに中断を伝え、
+        自発的に止まるのを cancel_grace 秒だけバックグラウンドで待ってからキャンセルする。
+        切断時のタスクはawaitのたびにキャンセルし直されるため、ここでは待たない。
+        """
+        for handle in (self._heartbeat_handle, self._flush_handle):
+            if handle is not None:
+                handle.cancel()
+        self._heartbeat_handle = None
+        self._flush_handle = None
+        pumps, self._pumps = self._pumps, []
+        running = [pump for pump in pumps if not pump.done()]
+        if running and self.cancel_event is not None:
+            self.cancel_event.set()
+            reaper = asyncio.get_running_loop().create_task(_reap(running, self.cancel_grace))
+            _reapers.add(reaper)
+            reaper.add_done_callback(_reapers.discard)
+            return
+        for pump in pumps:
+            pump.cancel()
+        for pump in pumps:
+            try:
+                await pump
+            except asyncio.CancelledError:
+                pass
+
+
+async def _reap(pumps: list[asyncio.Task], grace: float) -> None:
+    """中断を伝えたソースが止まるのを待ち、止まらなければキャンセルする"""
+    _, pending = await asyncio.wait(pumps, timeout=grace)
+    for pump in pending:
+        print(f"[WARN] Stream source did not stop within {grace}s after cancel, cancelling task")
+        pump.cancel()
@@ -0,0 +1,164 @@
+"""生成途中のoutput_slide入力からスライドを逐次抽出
+
+Strandsの `current_tool_use` イベントには、モデルが生成中のツール入力JSON
+（例: `{"markdown": "---\\nmarp: true\\n---\\n\\n# タイトル\\n\\n---\\n\\n## 2枚目...`）が
+累積文字列で入っている。JSONが閉じるまで json.loads できないため、
+`markdown` の文字列値だけを差分でデコードし、`---` 区切りで完成したスライドを返す。
+毎回先頭から解析し直さず、前回までの位置から続きだけを処理する。
+"""
+
+import re
+
+# tools/output_slide.py の _split_deck と同じ区切り
+_FRONTMATTER_PATTERN = re.compile(r'(---\s*\n).*?\n---\s*\n', re.DOTALL)
+_OPENER_PATTERN = re.compile(r'---\s*\n')
+_SEPARATOR_PATTERN = re.compile(r'\n---\s*\n')
+_KEY_PATTERN = re.compile(r'"markdown"\s*:\s*"')
+_NON_SPACE_PATTERN = re.compile(r'\S')
+_HEX_PATTERN = re.compile(r'[0-9a-fA-F]{4}')
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _hex_code(hex_digits: str) -> int | None:
+    """\\uXXXX の16進4桁を読む（int() は符号・空白・"_" も受け付けるため、桁の形を先に確かめる）"""
+    if not _HEX_PATTERN.fullmatch(hex_digits):
+        return None
+    return int(hex_digits, 16)
+
+
+class PartialSlideExtractor:
+    """累積されるツール入力JSONから完成したスライドを順に取り出す"""
+
+    def __init__(self):
+        self._raw_pos = 0             # 処理済みの生JSONの位置
+        self._value_started = False   # "markdown": " の開始を検出済みか
+        self._value_closed = False    # 文字列値の終端 " に到達したか
+        self._text = ""               # デコード済みのマークダウン
+        self._frontmatter: str | None = None
+        self._content_start = 0       # スライド本文の開始位置（フロントマターの直後）
+        self._slide_start = 0         # 未完成スライドの開始位置
+        self.slides: list[str] = []   # 完成したスライド
+
+    @property
+    def frontmatter(self) -> str:
+        return self._frontmatter or ""
+
+    def feed(self, raw_input: str) -> list[str]:
+        """累積された生JSONを受け取り、新たに完成したスライドのリストを返す"""
+        if self._value_closed or len(raw_input) <= self._raw_pos:
+            return []
+
+        if not self._value_started:
+            match = _KEY_PATTERN.search(raw_input)
+            if not match:
+                return []
+            self._value_started = True
+            self._raw_pos = match.end()
+
+        self._decode(raw_input)
+        return self._collect_slides()
+
+    def _decode(self, raw_input: str) -> None:
+        """JSON文字列値の続きをデコード（途中で切れたエスケープは次回に持ち越す）"""
+        pos = self._raw_pos
+        end = len(raw_input)
+        chunk_start = pos
+        parts = []
+        while pos < end:
+            char = raw_input[pos]
+            if char == '"':
+                self._value_closed = True
+                break
+            if char != '\\':
+                pos += 1
+                continue
+            parts.append(raw_input[chunk_start:pos])
+            decoded, consumed = self._decode_escape(raw_input, pos)
+            if consumed == 0:
+                break
+            parts.append(decoded)
+            pos += consumed
+            chunk_start = pos
+        else:
+            parts.append(raw_input[chunk_start:pos])
+            chunk_start = pos
+
+        if self._value_closed:
+            parts.append(raw_input[chunk_start:pos])
+            pos += 1
+        self._raw_pos = pos
+        self._text += "".join(parts)
+
+    @staticmethod
+    def _decode_escape(raw_input: str, pos: int) -> tuple[str, int]:
+        """pos位置のエスケープをデコードし（文字列, 消費文字数）を返す。不完全なら消費0"""
+        if pos + 1 >= len(raw_input):
+            return "", 0
+        escape = raw_input[pos + 1]
+        if escape != 'u':
+            return _SIMPLE_ESCAPES.get(escape, escape), 2
+        hex_digits = raw_input[pos + 2:pos + 6]
+        if len(hex_digits) < 4:
+            return "", 0
+        code = _hex_code(hex_digits)
+        if code is None:
+            # 不正なエスケープはプレビューを止めず、そのまま文字として出す（本体の検証はツールの実行時に行う）
+            return raw_input[pos:pos + 2], 2
+        if 0xD800 <= code <= 0xDBFF:
+            # サロゲートペアは後半の \uXXXX が届くまで待つ
+            low = raw_input[pos + 6:pos + 12]
+            if len(low) < 6:
+                return "", 0
+            if low.startswith('\\u'):
+                low_code = _hex_code(low[2:])
+                if low_code is not None and 0xDC00 <= low_code <= 0xDFFF:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low_code - 0xDC00)), 12
+        return chr(code), 6
+
+    def _is_settled(self, text: str, match_end: int) -> bool:
+        """区切りのマッチが確定したか（\\s* は貪欲なので、後続が空白だけの間は伸びる可能性がある）"""
+        return self._value_closed or _NON_SPACE_PATTERN.search(text, match_end) is not None
+
+    def _collect_slides(self) -> list[str]:
+        text = self._text
+        if self._frontmatter is None:
+            if len(text) < 3 and not self._value_closed:
+                return []
+            if text.startswith('---'):
+                match = _FRONTMATTER_PATTERN.match(text)
+                if not match:
+                    if not self._value_closed:
+                        return []
+                    self._frontmatter = ""
+                elif not self._is_settled(text, match.end()):
+                    return []
+                elif match.end(1) != _OPENER_PATTERN.match(text).end() and not self._value_closed:
+                    # 開始行の後に空行がある場合、正規表現はより長い開始を優先するため
+                    # 後続に閉じ区切りが現れると結果が変わる。文字列の終端まで待つ
+                    return []
+                else:
+                    self._frontmatter = match.group(0)
+                    self._content_start = match.end()
+            else:
+                self._frontmatter = ""
+            self._slide_start = self._content_start
+
+        new_slides = []
+        while True:
+            match = _SEPARATOR_PATTERN.search(text, self._slide_start)
+            if not match or not self._is_settled(text, match.end()):
+                break
+            slide = text[self._slide_start:match.start()].strip()
+            self._slide_start = match.end()
+            if slide:
+                new_slides.append(slide)
+
+        if self._value_closed:
+            slide = text[self._slide_start:].strip()
+            self._slide_start = len(text)
+            if slide:
+                new_slides.append(slide)
+
+        self.slides.extend(new_slides)
+        return new_slides
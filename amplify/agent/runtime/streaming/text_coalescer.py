@@ -0,0 +1,75 @@
+"""テキストイベントの結合
+
+モデルのテキストdeltaは数文字ずつ届くため、そのままSSEに流すと1応答で数千フレームになり、
+AgentCore経由のイベントごとのオーバーヘッドが大きい。一定の文字数か短い待ち時間に達するまで
+テキストをまとめ、テキスト以外のイベント（tool_use・markdown・error・done等）の直前には
+必ず吐き出して送信順序を保つ。
+"""
+
+import time
+from collections.abc import Callable
+
+from config import env_number
+
+DEFAULT_MAX_CHARS = 256     # この文字数に達したら即送信
+DEFAULT_MAX_DELAY_MS = 40   # 最初のテキストからこの時間が経過したら送信（体感のなめらかさを保つ上限）
+
+
+class TextCoalescer:
+    """テキストイベントを文字数・待ち時間の予算内でまとめる"""
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_CHARS, max_delay: float = DEFAULT_MAX_DELAY_MS / 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._clock = clock
+        self._parts: list[str] = []
+        self._size = 0
+        self._deadline: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_chars > 1 and self.max_delay > 0
+
+    def push(self, event: dict) -> list[dict]:
+        """イベントを受け取り、今送信すべきイベントのリストを返す"""
+        if event.get("type") != "text" or not self.enabled:
+            return [*self.flush(), event]
+
+        text = event.get("data") or ""
+        if not text:
+            return []
+        if self._deadline is None:
+            self._deadline = self._clock() + self.max_delay
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or self._clock() >= self._deadline:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[dict]:
+        """溜まっているテキストを1イベントにまとめて返す"""
+        if not self._parts:
+            return []
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._deadline = None
+        return [{"type": "text", "data": text}]
+
+    def timeout(self) -> float | None:
+        """溜まっているテキストの送信期限までの秒数（溜まっていなければNone）"""
+        if self._deadline is None:
+            return None
+        return max(self._deadline - self._clock(), 0.0)
+
+
+def create_text_coalescer() -> TextCoalescer:
+    """環境変数の設定でTextCoalescerを作成（どちらかを0にすると結合しない）
+
+    STREAM_TEXT_COALESCE_CHARS: まとめる最大文字数（既定256）
+    STREAM_TEXT_COALESCE_MS: 最初のテキストから送信までの最大待ち時間（既定40ms）
+    """
+    max_chars = env_number("STREAM_TEXT_COALESCE_CHARS", DEFAULT_MAX_CHARS, minimum=None)
+    max_delay_ms = env_number("STREAM_TEXT_COALESCE_MS", DEFAULT_MAX_DELAY_MS, minimum=None)
+    return TextCoalescer(max_chars=max_chars, max_delay=max_delay_ms / 1000)
@@ -0,0 +1,162 @@
+"""フェーズ単位の計測（OpenTelemetryのスパンとメトリクス）
+
+コンテナは `opentelemetry-instrument` で起動するため、ADOTが設定したTracerProvider / MeterProviderに出力される。
+opentelemetry が未インストールの環境（ローカルのユニットテスト等）では何もしない。
+
+各フェーズは同名のスパンと、ヒストグラム `marp_agent.phase.duration`（ミリ秒、属性 `phase` で区別）に記録する。
+モデル別のp95などはヒストグラムを `phase` × `model_type` で集計して確認する。
+キャッシュのヒット・ミスなどの件数は `count()` でカウンター `marp_agent.<名前>` に加算する。
+"""
+
+import functools
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from opentelemetry import metrics, trace
+except ImportError:
+    metrics = None
+    trace = None
+
+INSTRUMENTATION_NAME = "marp-agent"
+PHASE_DURATION_METRIC = "marp_agent.phase.duration"
+
+# メトリクスの属性は集計キーになるため低カーディナリティのものだけ載せる（枚数・文字数などはスパンのみ）
+METRIC_ATTRIBUTES = frozenset({"model_type", "theme", "tool", "retry", "verdict", "format", "outcome", "cache"})
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def end(self, end_time=None):
+        pass
+
+
+class _NoopTracer:
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        yield _NoopSpan()
+
+    def start_span(self, name, attributes=None, start_time=None):
+        return _NoopSpan()
+
+
+class _NoopHistogram:
+    def record(self, amount, attributes=None):
+        pass
+
+
+class _NoopCounter:
+    def add(self, amount, attributes=None):
+        pass
+
+
+class _NoopMeter:
+    def create_counter(self, name, unit="", description=""):
+        return _NoopCounter()
+
+
+if trace is not None:
+    _tracer = trace.get_tracer(INSTRUMENTATION_NAME)
+    _meter = metrics.get_meter(INSTRUMENTATION_NAME)
+    _phase_duration = _meter.create_histogram(
+        PHASE_DURATION_METRIC, unit="ms", description="invokeの各フェーズの所要時間"
+    )
+else:
+    _tracer = _NoopTracer()
+    _meter = _NoopMeter()
+    _phase_duration = _NoopHistogram()
+
+# count() で作成したカウンター（メトリクス名ごとに1つ）
+_counters: dict = {}
+
+
+def _clean(attributes: dict) -> dict:
+    """OpenTelemetryが受け付けない None を除く"""
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def _record_duration(name: str, seconds: float, attributes: dict) -> None:
+    metric_attributes = {key: value for key, value in attributes.items() if key in METRIC_ATTRIBUTES}
+    _phase_duration.record(seconds * 1000, {"phase": name, **metric_attributes})
+
+
+class Phase:
+    """計測中のフェーズ。set() で追加した属性はスパンとメトリクスの両方に反映される"""
+
+    def __init__(self, name: str, span, attributes: dict):
+        self.name = name
+        self.span = span
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        for key, value in _clean(attributes).items():
+            self.attributes[key] = value
+            self.span.set_attribute(key, value)
+
+
+_current_phase: ContextVar[Phase | None] = ContextVar("current_phase", default=None)
+
+
+@contextmanager
+def phase(name: str, **attributes) -> Iterator[Phase]:
+    """ブロックの処理時間をスパンとヒストグラムに記録する"""
+    attributes = _clean(attributes)
+    start = time.perf_counter()
+    with _tracer.start_as_current_span(name, attributes=dict(attributes)) as span:
+        current = Phase(name, span, attributes)
+        token = _current_phase.set(current)
+        try:
+            yield current
+        except Exception:
+            current.set(outcome="error")
+            raise
+        finally:
+            _current_phase.reset(token)
+            current.attributes.setdefault("outcome", "ok")
+            _record_duration(name, time.perf_counter() - start, current.attributes)
+
+
+def traced(name: str, **attributes) -> Callable:
+    """関数全体を1つのフェーズとして計測するデコレーター（@tool の下に付ける）"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def annotate(**attributes) -> None:
+    """実行中のフェーズに属性を追加（リトライ回数など、処理の途中で分かる値）"""
+    current = _current_phase.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def record_interval(name: str, start: float, end: float | None = None, **attributes) -> None:
+    """開始と終了が別の場所にある区間（初回トークンまでの時間など）を記録する
+
+    start / end は time.perf_counter() の値。
+    """
+    end = time.perf_counter() if end is None else end
+    attributes = _clean(attributes)
+    # perf_counterの値をスパン用の壁時計（ナノ秒）に換算
+    offset_ns = time.time_ns() - int(time.perf_counter() * 1e9)
+    span = _tracer.start_span(name, attributes=attributes, start_time=int(start * 1e9) + offset_ns)
+    span.end(end_time=int(end * 1e9) + offset_ns)
+    _record_duration(name, end - start, attributes)
+
+
+def count(name: str, amount: int = 1, **attributes) -> None:
+    """カウンター `marp_agent.<name>` に加算する（属性はそのまま集計キーになるため低カーディナリティの値だけ渡す）"""
+    counter = _counters.get(name)
+    if counter is None:
+        counter = _counters.setdefault(name, _meter.create_counter(f"marp_agent.{name}"))
+    counter.add(amount, _clean(attributes))
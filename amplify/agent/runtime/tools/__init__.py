@@ -1,22 +1,34 @@
 """ツール定義のエクスポート"""
 
+from .request_state import RequestState, start_request_state, get_request_state
 from .web_search import web_search, tavily_clients
 from .output_slide import (
     configure_slide_validation,
+    count_slides,
     output_slide,
+    patch_slides,
     get_generated_markdown,
     reset_generated_markdown,
+    set_current_markdown,
+    slide_titles,
 )
 from .generate_tweet import generate_tweet_url, get_generated_tweet_url, reset_generated_tweet_url
 from .http_request import http_request
 
 __all__ = [
+    "RequestState",
+    "start_request_state",
+    "get_request_state",
     "web_search",
     "tavily_clients",
     "output_slide",
+    "patch_slides",
     "configure_slide_validation",
+    "count_slides",
     "get_generated_markdown",
     "reset_generated_markdown",
+    "set_current_markdown",
+    "slide_titles",
     "generate_tweet_url",
     "get_generated_tweet_url",
     "reset_generated_tweet_url",
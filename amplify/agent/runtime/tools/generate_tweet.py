@@ -3,20 +3,17 @@
 import urllib.parse
 from strands import tool
 
-# ツイートURL用のグローバル変数
-# NOTE: ContextVarはStrands Agentsがツールを別スレッドで実行するため値が共有されない
-_generated_tweet_url: str | None = None
+from .request_state import get_request_state
 
 
 def get_generated_tweet_url() -> str | None:
     """生成されたツイートURLを取得"""
-    return _generated_tweet_url
+    return get_request_state().generated_tweet_url
 
 
 def reset_generated_tweet_url() -> None:
     """ツイートURLをリセット"""
-    global _generated_tweet_url
-    _generated_tweet_url = None
+    get_request_state().generated_tweet_url = None
 
 
 @tool
@@ -37,6 +34,5 @@ def generate_tweet_url(tweet_text: str) -> str:
     # 日本語をURLエンコード
     encoded_text = urllib.parse.quote(tweet_text, safe='')
     # Twitter Web Intent（compose/postではtextパラメータが無視される）
-    global _generated_tweet_url
-    _generated_tweet_url = f"https://twitter.com/intent/tweet?text={encoded_text}"
+    get_request_state().generated_tweet_url = f"https://twitter.com/intent/tweet?text={encoded_text}"
     return "ツイートURLを生成しました。"
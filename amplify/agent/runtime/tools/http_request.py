@@ -9,9 +9,12 @@ import os
 import re
 
 import boto3
-import requests as req
 from strands import tool
 
+from telemetry import annotate, traced
+
+from .request_state import get_request_state
+
 # 要約を適用するしきい値（この文字数以下ならそのまま返す）
 SUMMARIZE_THRESHOLD = 5000
 
@@ -70,6 +73,7 @@ def _summarize_with_haiku(content: str) -> str:
 
 
 @tool
+@traced("tool.http_request", tool="http_request")
 def http_request(url: str, method: str = "GET") -> str:
     """ユーザーがメッセージに貼ったURLのWebページを取得します。
 
@@ -95,20 +99,27 @@ def http_request(url: str, method: str = "GET") -> str:
     Returns:
         レスポンスのステータスコードとコンテンツ（大きい場合はHaiku要約）
     """
+    # requests はこのツールでしか使わないため、起動時ではなく初回の呼び出しで読み込む
+    import requests as req
+
     try:
         response = req.request(method, url, timeout=30)
         content = response.text
         original_length = len(content)
+        annotate(status_code=response.status_code, content_chars=original_length)
 
         # HTMLレスポンスはテキスト抽出
         content_type = response.headers.get("Content-Type", "")
         if "text/html" in content_type:
             content = _html_to_text(content)
 
-        # 一定サイズ以上の場合はHaikuで要約
-        if len(content) > SUMMARIZE_THRESHOLD:
+        # 一定サイズ以上の場合はHaikuで要約（クライアント切断後は要約のトークンを使わない）
+        if len(content) > SUMMARIZE_THRESHOLD and get_request_state().cancelled:
+            content = content[:SUMMARIZE_THRESHOLD]
+        elif len(content) > SUMMARIZE_THRESHOLD:
             try:
                 summary = _summarize_with_haiku(content[:HAIKU_INPUT_LIMIT])
+                annotate(summarized=True)
                 content = f"（以下はWebページの要約です - 元の文字数: {original_length}）\n\n{summary}"
             except Exception as e:
                 # 要約失敗時はフォールバックで切り詰め
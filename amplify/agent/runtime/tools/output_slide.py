@@ -6,14 +6,9 @@ import unicodedata
 
 from strands import tool
 
-# スライド出力用のグローバル変数
-# NOTE: ContextVarはStrands Agentsがツールを別スレッドで実行するため値が共有されない
-_generated_markdown: str | None = None
-_overflow_retry_count: int = 0
-_expected_slide_count: int | None = None
-_maximum_slide_count: int | None = None
-_agenda_requested: bool = False
-_active_model_type: str = "sonnet"
+from telemetry import annotate, phase, traced
+
+from .request_state import get_request_state
 
 MAX_OVERFLOW_RETRIES = 2
 MAX_LINES_PER_SLIDE = 9
@@ -39,6 +34,38 @@ def _get_display_width(text: str) -> int:
     return width
 
 
+def _strip_links(text: str) -> str:
+    r"""リンク [text](url) をテキストに置換
+
+    re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text) と同じ結果を返す。
+    正規表現では `[a](` の繰り返しのような行で3乗オーダーのバックトラックが起きるため、
+    「最初の `](` の後に `)` がなければ同じ行の後続の `[` も一致しない」ことを使って線形に走査する。
+    """
+    parts = []
+    pos = 0
+    while True:
+        start = text.find('[', pos)
+        if start == -1:
+            break
+        line_end = text.find('\n', start)
+        if line_end == -1:
+            line_end = len(text)
+        close = text.find('](', start + 2, line_end)
+        paren = text.find(')', close + 3, line_end) if close != -1 else -1
+        if paren == -1:
+            # この行の残りの `[` はどれも一致しないため次の行へ進む
+            parts.append(text[pos:line_end])
+            pos = line_end
+            if pos == len(text):
+                break
+            continue
+        parts.append(text[pos:start])
+        parts.append(text[start + 1:close])
+        pos = paren + 1
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
 def _strip_markdown_formatting(text: str) -> str:
     """マークダウンの装飾記法を除去して表示テキストを取得"""
     # 太字/斜体（** __ * _）
@@ -51,7 +78,7 @@ def _strip_markdown_formatting(text: str) -> str:
     # インラインコード
     text = re.sub(r'`(.+?)`', r'\1', text)
     # リンク [text](url) → text
-    text = re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text)
+    text = _strip_links(text)
     # 箇条書きマーカー
     text = re.sub(r'^[-*+]\s+', '', text)
     # 番号付きリスト
@@ -77,11 +104,40 @@ def _estimate_visual_lines(text: str) -> int:
     return math.ceil(width / MAX_DISPLAY_WIDTH_PER_LINE)
 
 
+def _split_deck(markdown: str) -> tuple[str, list[str]]:
+    """Marpマークダウンをフロントマターとスライド本文のリストに分割"""
+    match = re.match(r'---\s*\n.*?\n---\s*\n', markdown, flags=re.DOTALL)
+    frontmatter = match.group(0) if match else ''
+    content = markdown[match.end():] if match else markdown
+    slides = re.split(r'\n---\s*\n', content)
+    return frontmatter, [s.strip() for s in slides if s.strip()]
+
+
+def _join_deck(frontmatter: str, slides: list[str]) -> str:
+    """フロントマターとスライド本文のリストからMarpマークダウンを組み立てる"""
+    body = "\n\n---\n\n".join(slides)
+    if not frontmatter:
+        return body + "\n"
+    return f"{frontmatter.rstrip()}\n\n{body}\n"
+
+
 def _parse_slides(markdown: str) -> list[str]:
     """Marpマークダウンをスライドごとに分割（フロントマター除外）"""
-    content = re.sub(r'^---\s*\n.*?\n---\s*\n', '', markdown, count=1, flags=re.DOTALL)
-    slides = re.split(r'\n---\s*\n', content)
-    return [s.strip() for s in slides if s.strip()]
+    return _split_deck(markdown)[1]
+
+
+def count_slides(markdown: str) -> int:
+    """スライド枚数（フロントマター除外）"""
+    return len(_parse_slides(markdown))
+
+
+def slide_titles(markdown: str) -> list[str]:
+    """各スライドの最初の見出し（見出しがないスライドは空文字、フロントマター除外）"""
+    titles = []
+    for slide in _parse_slides(markdown):
+        heading = re.search(r'^#{1,6}\s+(.+)$', slide, flags=re.MULTILINE)
+        titles.append(heading.group(1).strip() if heading else '')
+    return titles
 
 
 def _count_content_lines(slide_content: str) -> int:
@@ -132,9 +188,14 @@ def _check_table_width(slide_content: str) -> int:
 def _check_slide_overflow(markdown: str) -> list[dict]:
     """各スライドの行数・テーブル横幅をチェックし、制限超過スライドの情報を返す"""
     slides = _parse_slides(markdown)
+    return _check_slides_overflow(list(enumerate(slides, start=1)))
+
+
+def _check_slides_overflow(numbered_slides: list[tuple[int, str]]) -> list[dict]:
+    """（スライド番号, 本文）のリストを対象に行数・テーブル横幅をチェックする"""
     violations = []
 
-    for i, slide in enumerate(slides, start=1):
+    for i, slide in numbered_slides:
         # 特殊スライド（top, lead, end, tinytext）はスキップ
         if re.search(r'_class:\s*(top|lead|end|tinytext)', slide):
             continue
@@ -164,46 +225,46 @@ def _check_slide_overflow(markdown: str) -> list[dict]:
 
 def configure_slide_validation(user_message: str, model_type: str) -> None:
     """ユーザー指示とモデル種別に応じた出力検証を設定する。"""
-    global _expected_slide_count, _maximum_slide_count
-    global _agenda_requested, _active_model_type
+    state = get_request_state()
     slide_counts = re.findall(r'(\d{1,2})\s*枚', user_message)
     if slide_counts:
-        _expected_slide_count = int(slide_counts[-1])
-        _maximum_slide_count = None
+        state.expected_slide_count = int(slide_counts[-1])
+        state.maximum_slide_count = None
     elif model_type in {'kimi', 'sol'}:
         # 枚数確認で会話を止めず、モデル別プロンプトの上限だけを確実に守らせる。
-        _expected_slide_count = None
-        _maximum_slide_count = 10
+        state.expected_slide_count = None
+        state.maximum_slide_count = 10
     else:
-        _expected_slide_count = None
-        _maximum_slide_count = None
-    _agenda_requested = bool(
+        state.expected_slide_count = None
+        state.maximum_slide_count = None
+    state.agenda_requested = bool(
         re.search(r'(アジェンダ|目次).{0,12}(作|追加|含)', user_message)
     )
-    _active_model_type = model_type
+    state.active_model_type = model_type
 
 
 def _check_slide_structure(markdown: str) -> list[dict]:
     """指定枚数・中タイトル数・モデル固有スタイルを検証する。"""
+    state = get_request_state()
     slides = _parse_slides(markdown)
     violations = []
 
-    if _expected_slide_count is not None and len(slides) != _expected_slide_count:
+    if state.expected_slide_count is not None and len(slides) != state.expected_slide_count:
         violations.append({
             'type': 'slide_count',
-            'expected': _expected_slide_count,
+            'expected': state.expected_slide_count,
             'actual': len(slides),
         })
 
-    if _maximum_slide_count is not None and len(slides) > _maximum_slide_count:
+    if state.maximum_slide_count is not None and len(slides) > state.maximum_slide_count:
         violations.append({
             'type': 'slide_count_max',
-            'maximum': _maximum_slide_count,
+            'maximum': state.maximum_slide_count,
             'actual': len(slides),
         })
 
     lead_count = sum(bool(re.search(r'_class:\s*lead', slide)) for slide in slides)
-    validation_count = _expected_slide_count or _maximum_slide_count
+    validation_count = state.expected_slide_count or state.maximum_slide_count
     if validation_count is not None and validation_count <= 12 and lead_count > 2:
         violations.append({
             'type': 'lead_count',
@@ -211,7 +272,7 @@ def _check_slide_structure(markdown: str) -> list[dict]:
             'maximum': 2,
         })
 
-    if not _agenda_requested:
+    if not state.agenda_requested:
         agenda_slides = [
             index
             for index, slide in enumerate(slides, start=1)
@@ -223,7 +284,7 @@ def _check_slide_structure(markdown: str) -> list[dict]:
                 'slides': agenda_slides,
             })
 
-    if _active_model_type in {'kimi', 'glm'}:
+    if state.active_model_type in {'kimi', 'glm'}:
         previous_pattern = None
         consecutive_pattern_count = 0
         for index, slide in enumerate(slides, start=1):
@@ -263,26 +324,188 @@ def _check_slide_structure(markdown: str) -> list[dict]:
 
 def get_generated_markdown() -> str | None:
     """生成されたマークダウンを取得"""
-    return _generated_markdown
+    return get_request_state().generated_markdown
 
 
 def reset_generated_markdown() -> None:
-    """マークダウンをリセット"""
-    global _generated_markdown, _overflow_retry_count
-    global _expected_slide_count, _maximum_slide_count
-    global _agenda_requested, _active_model_type
-    _generated_markdown = None
-    _overflow_retry_count = 0
-    _expected_slide_count = None
-    _maximum_slide_count = None
-    _agenda_requested = False
-    _active_model_type = "sonnet"
+    """マークダウンと検証設定をリセット"""
+    state = get_request_state()
+    state.generated_markdown = None
+    state.overflow_retry_count = 0
+    state.expected_slide_count = None
+    state.maximum_slide_count = None
+    state.agenda_requested = False
+    state.active_model_type = "sonnet"
+    state.current_markdown = None
+    state.guidance_sent.clear()
+
+
+def set_current_markdown(markdown: str | None) -> None:
+    """patch_slidesの適用元となる現在のスライドを設定"""
+    get_request_state().current_markdown = markdown or None
+
+
+# 違反種別ごとの修正方針（同一ターンでは初回のみ伝える）
+VIOLATION_GUIDANCE = {
+    'line_overflow': "行を削るか2枚に分割し、1行は全角24字以内にする",
+    'table_overflow': "列を減らすかセルを全角10字以内にする",
+    'slide_count': "内容を統合・分割して指定枚数ちょうどにする",
+    'slide_count_max': "内容を統合して上限以内にする",
+    'lead_count': "余分な中タイトルを本文スライドへ統合する",
+    'unrequested_agenda': "アジェンダ・目次スライドを削除する",
+    'bold_overuse': "太字ラベルを外し、太字は最大1か所にする",
+    'pattern_repetition': "表・小見出し・本文型のいずれかへ変更する",
+}
+
+# 違反行の抜粋の最大表示幅（半角換算）
+EXCERPT_WIDTH = 40
+
+
+def _excerpt(line: str) -> str:
+    """違反行を表示幅で切り詰めた抜粋"""
+    width = 0
+    for index, char in enumerate(line):
+        width += _get_display_width(char)
+        if width > EXCERPT_WIDTH:
+            return f"「{line[:index]}…」"
+    return f"「{line}」"
+
+
+def _find_wrapped_lines(slide_content: str) -> list[tuple[str, int]]:
+    """折り返しで複数行になる行と、その実質行数を返す"""
+    wrapped = []
+    for line in slide_content.split('\n'):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('```'):
+            continue
+        visual_lines = _estimate_visual_lines(stripped)
+        if visual_lines > 1:
+            wrapped.append((stripped, visual_lines))
+    return wrapped
+
+
+def _find_widest_table_row(slide_content: str) -> str | None:
+    """上限を超える最も幅の広いテーブル行を返す"""
+    widest, widest_width = None, MAX_TABLE_ROW_WIDTH
+    for line in slide_content.split('\n'):
+        stripped = line.strip()
+        if not (stripped.startswith('|') and stripped.endswith('|')):
+            continue
+        if re.match(r'^\|[\s\-:|]+\|$', stripped):
+            continue
+        width = _get_display_width(stripped)
+        if width > widest_width:
+            widest, widest_width = stripped, width
+    return widest
+
+
+def _format_violation(v: dict, slides: list[str], slide_labels: dict[int, str] | None = None) -> str:
+    """違反1件を「対象 種別 実測/上限 詳細」の1行に変換
+
+    slide_labels があれば、対象のスライドを番号（S4）ではなくそのラベル（違反を起こしたパッチ）で示す。
+    """
+    code = v['type']
+    labels = slide_labels or {}
+
+    def target(number: int) -> str:
+        return labels.get(number, f"S{number}")
+
+    if code == 'line_overflow':
+        wrapped = _find_wrapped_lines(slides[v['slide_number'] - 1])
+        detail = ", ".join(f"{_excerpt(line)}={count}行" for line, count in wrapped[:3])
+        return f"{target(v['slide_number'])} {code} {v['line_count']}/{MAX_LINES_PER_SLIDE}行" + (
+            f" 折返し: {detail}" if detail else ""
+        )
+    if code == 'table_overflow':
+        row = _find_widest_table_row(slides[v['slide_number'] - 1])
+        return f"{target(v['slide_number'])} {code} {v['max_width']}/{MAX_TABLE_ROW_WIDTH}幅" + (
+            f" {_excerpt(row)}" if row else ""
+        )
+    if code == 'slide_count':
+        return f"全体 {code} {v['actual']}/{v['expected']}枚"
+    if code in {'slide_count_max', 'lead_count'}:
+        return f"全体 {code} {v['actual']}/{v['maximum']}枚"
+    if code == 'unrequested_agenda':
+        return f"{','.join(target(n) for n in v['slides'])} {code}"
+    if code == 'bold_overuse':
+        return f"{target(v['slide_number'])} {code} {v['count']}/1か所"
+    if code == 'pattern_repetition':
+        return f"{target(v['slide_number'])} {code} {v['pattern']}型×3連続"
+    return f"{code} {v}"
+
+
+def _format_violations(
+    violations: list[dict],
+    markdown: str,
+    tool_name: str = "output_slide",
+    attempt: int = 1,
+    retry_limit: int = MAX_OVERFLOW_RETRIES,
+    guidance_sent: set[str] | None = None,
+    slide_labels: dict[int, str] | None = None,
+) -> str:
+    """違反リストをモデルへの簡潔な修正指示に変換
+
+    1行1違反で「対象 種別 実測/上限 違反行の抜粋」を示す。修正方針は
+    guidance_sent に含まれない種別だけを付け、同一ターンのリトライでは繰り返さない。
+    """
+    slides = _parse_slides(markdown)
+    lines = [f"あふれ検出または構成違反（{attempt}/{retry_limit}回目）："]
+    lines += [f"- {_format_violation(v, slides, slide_labels)}" for v in violations]
+
+    sent = guidance_sent if guidance_sent is not None else set()
+    new_codes = list(dict.fromkeys(
+        v['type'] for v in violations if v['type'] in VIOLATION_GUIDANCE and v['type'] not in sent
+    ))
+    if new_codes:
+        lines.append("修正方針：")
+        lines += [f"- {code}: {VIOLATION_GUIDANCE[code]}" for code in new_codes]
+        sent.update(new_codes)
+    lines.append(f"該当箇所を直して再度 {tool_name} を呼んでください。")
+    return "\n".join(lines)
+
+
+def _accept_or_reject(
+    markdown: str,
+    violations: list[dict],
+    tool_name: str = "output_slide",
+    slide_labels: dict[int, str] | None = None,
+) -> str | None:
+    """違反があればリトライ上限まで修正指示を返し、なければマークダウンを確定する"""
+    state = get_request_state()
+    retry_limit = 4 if state.active_model_type in {'kimi', 'glm'} else MAX_OVERFLOW_RETRIES
+    with state.lock:
+        # 計測用: このツール呼び出しが何回目のリトライか（0は初回）
+        annotate(retry=state.overflow_retry_count, violations=len(violations))
+        if violations and state.overflow_retry_count < retry_limit:
+            state.overflow_retry_count += 1
+            annotate(verdict="rejected")
+            return _format_violations(
+                violations,
+                markdown,
+                tool_name,
+                attempt=state.overflow_retry_count,
+                retry_limit=retry_limit,
+                guidance_sent=state.guidance_sent,
+                slide_labels=slide_labels,
+            )
+
+        if violations:
+            print(f"[WARN] Slide overflow: max retries exceeded, accepting with violations: {violations}")
+        annotate(verdict="accepted_with_violations" if violations else "accepted")
+
+        state.current_markdown = markdown
+        state.overflow_retry_count = 0
+    state.publish_markdown(markdown)
+    return None
 
 
 @tool
+@traced("tool.output_slide", tool="output_slide")
 def output_slide(markdown: str) -> str:
     """生成したスライドのマークダウンを出力します。スライドを作成・編集したら必ずこのツールを使って出力してください（テキストで直接書き出さない）。
 
+    既存スライドの一部だけを直す場合は、全文を出し直さずに patch_slides を使ってください。
+
     ## Marpフォーマットルール
 
     - フロントマター: `marp: true`, `theme: {テーマ名}`, `size: 16:9`, `paginate: true`
@@ -318,58 +541,133 @@ def output_slide(markdown: str) -> str:
     Returns:
         出力完了メッセージ（行数超過時はエラーメッセージ）
     """
-    global _generated_markdown, _overflow_retry_count
-
-    violations = _check_slide_overflow(markdown) + _check_slide_structure(markdown)
-
-    retry_limit = 4 if _active_model_type in {'kimi', 'glm'} else MAX_OVERFLOW_RETRIES
-    if violations and _overflow_retry_count < retry_limit:
-        _overflow_retry_count += 1
-        details = []
-        for v in violations:
-            if v['type'] == 'line_overflow':
-                details.append(
-                    f"  - スライド{v['slide_number']}: 実質{v['line_count']}行（{v['excess']}行超過）"
-                )
-            elif v['type'] == 'table_overflow':
-                details.append(
-                    f"  - スライド{v['slide_number']}: 表の横幅超過（{v['max_width']}文字、上限{MAX_TABLE_ROW_WIDTH}文字）"
-                )
-            elif v['type'] == 'slide_count':
-                details.append(
-                    f"  - 総枚数: {v['actual']}枚（指定は{v['expected']}枚）。内容を統合・分割して指定枚数ちょうどにする"
-                )
-            elif v['type'] == 'slide_count_max':
-                details.append(
-                    f"  - 総枚数: {v['actual']}枚（上限は{v['maximum']}枚）。内容を統合して上限以内にする"
-                )
-            elif v['type'] == 'lead_count':
-                details.append(
-                    f"  - 中タイトル: {v['actual']}枚（上限{v['maximum']}枚）。余分な中タイトルを本文スライドへ統合する"
-                )
-            elif v['type'] == 'unrequested_agenda':
-                details.append(
-                    f"  - アジェンダ・目次は指定されていません（該当スライド: {v['slides']}）。削除する"
-                )
-            elif v['type'] == 'bold_overuse':
-                details.append(
-                    f"  - スライド{v['slide_number']}: 太字が{v['count']}か所。太字ラベルを外し、太字は最大1か所にする"
-                )
-            elif v['type'] == 'pattern_repetition':
-                details.append(
-                    f"  - スライド{v['slide_number']}: {v['pattern']}型が3枚連続。表・小見出し・本文型のいずれかへ変更する"
-                )
-        violation_details = "\n".join(details)
-        return (
-            f"あふれ検出または構成違反！以下の問題があります：\n"
-            f"{violation_details}\n"
-            f"修正してから再度 output_slide を呼んでください。"
-            f"（行数超過→内容を減らすか分割。表の横幅超過→列数を減らすかセル内容を短くする）"
-        )
+    with phase("slide.validate", tool="output_slide") as validation:
+        violations = _check_slide_overflow(markdown) + _check_slide_structure(markdown)
+        validation.set(slide_count=len(_parse_slides(markdown)), violations=len(violations))
+    rejection = _accept_or_reject(markdown, violations)
+    if rejection:
+        return rejection
+    return "スライドを出力しました。"
 
-    if violations:
-        print(f"[WARN] Slide overflow: max retries exceeded, accepting with violations: {violations}")
 
-    _generated_markdown = markdown
-    _overflow_retry_count = 0
-    return "スライドを出力しました。"
+def _apply_slide_patches(slides: list[str], patches: list[dict]) -> tuple[list[str], dict[int, int], dict[int, int]]:
+    """元のスライド番号基準でパッチを適用する
+
+    Returns:
+        （適用後スライド, 変更したスライドの適用後の番号 → パッチの位置, 変更していないスライドの適用後の番号 → 元の番号）
+    """
+    replacements: dict[int, tuple[str, int]] = {}
+    deletions: set[int] = set()
+    insertions: dict[int, list[tuple[str, int]]] = {}
+
+    for index, patch in enumerate(patches):
+        op = patch.get('op')
+        number = patch.get('slide')
+        content = (patch.get('markdown') or '').strip()
+        # bool は int のサブクラスなので、true / false をスライド番号として受け付けないよう除く
+        if not isinstance(number, int) or isinstance(number, bool):
+            raise ValueError(f"slideには整数のスライド番号を指定してください: {patch}")
+        if op == 'insert':
+            if not 0 <= number <= len(slides):
+                raise ValueError(f"挿入位置 {number} は範囲外です（0〜{len(slides)}）")
+            if not content:
+                raise ValueError(f"挿入するスライドのmarkdownが空です: {patch}")
+            insertions.setdefault(number, []).append((content, index))
+            continue
+        if not 1 <= number <= len(slides):
+            raise ValueError(f"スライド{number}は存在しません（全{len(slides)}枚）")
+        if number in replacements or number in deletions:
+            raise ValueError(f"スライド{number}に複数のreplace/deleteが指定されています")
+        if op == 'replace':
+            if not content:
+                raise ValueError(f"置き換えるスライドのmarkdownが空です: {patch}")
+            replacements[number] = (content, index)
+        elif op == 'delete':
+            deletions.add(number)
+        else:
+            raise ValueError(f"opはreplace・insert・deleteのいずれかです: {patch}")
+
+    merged: list[str] = []
+    touched: dict[int, int] = {}
+    kept: dict[int, int] = {}
+    for number in range(0, len(slides) + 1):
+        if number >= 1 and number not in deletions:
+            if number in replacements:
+                content, index = replacements[number]
+                merged.append(content)
+                touched[len(merged)] = index
+            else:
+                merged.append(slides[number - 1])
+                kept[len(merged)] = number
+        for content, index in insertions.get(number, []):
+            merged.append(content)
+            touched[len(merged)] = index
+    return merged, touched, kept
+
+
+@tool
+@traced("tool.patch_slides", tool="patch_slides")
+def patch_slides(patches: list[dict]) -> str:
+    """現在のスライドの一部だけを差し替え・挿入・削除して出力します。「4枚目を直して」のような部分修正では、全文を出し直すoutput_slideではなくこのツールを使ってください。
+
+    ## パッチの指定方法
+
+    - 各パッチは `{"op": "replace" | "insert" | "delete", "slide": 番号, "markdown": "スライド本文"}`
+    - スライド番号は最後に受け入れたスライド（直前のoutput_slide・patch_slidesの結果）の1始まりの番号（フロントマターは数えない）。
+      patch_slidesの結果に現在の番号と見出しの一覧が返るので、続けて修正するときはその番号で指定する
+    - 1回の呼び出しに含めたパッチは、すべて呼び出し前の番号で指定する（挿入・削除による番号のずれは考えなくてよい）
+    - `replace`: 指定番号のスライドを `markdown` で置き換える
+    - `insert`: 指定番号のスライドの直後に `markdown` を挿入する（0なら先頭）
+    - `delete`: 指定番号のスライドを削除する（`markdown` は不要）
+    - `markdown` にはスライド1枚分の本文だけを書き、区切りの `---` やフロントマターは含めない
+    - 書式ルールはoutput_slideと同じ。変更したスライドの行数・表の横幅を自動検証する
+      （違反は「パッチ2（insert slide=3）」のようにパッチで、変更していないスライドは呼び出し前の番号で示す）
+
+    ## 使い分け
+
+    - 構成の大幅な変更・テーマ変更・新規作成はoutput_slideで全文を出力する
+    - 現在のスライドがない場合やエラーが返った場合もoutput_slideを使う
+
+    Args:
+        patches: スライド単位のパッチのリスト
+
+    Returns:
+        出力完了メッセージと適用後のスライドの番号・見出しの一覧（行数超過時・指定誤り時はエラーメッセージ）
+    """
+    current_markdown = get_request_state().current_markdown
+    if not current_markdown:
+        return "修正対象のスライドがありません。output_slide でスライド全文を出力してください。"
+
+    frontmatter, slides = _split_deck(current_markdown)
+    try:
+        merged_slides, touched, kept = _apply_slide_patches(slides, patches)
+    except (AttributeError, TypeError, ValueError) as e:
+        return f"パッチの指定に誤りがあります: {e}\n指定を直して再度 patch_slides を呼ぶか、output_slide で全文を出力してください。"
+    if not merged_slides:
+        return "すべてのスライドが削除されます。output_slide でスライド全文を出力してください。"
+
+    markdown = _join_deck(frontmatter, merged_slides)
+    # スライド単位の違反は変更したスライドだけ、枚数などの構成はスライド全体で検証する
+    touched_numbers = set(touched)
+    with phase("slide.validate", tool="patch_slides", slide_count=len(merged_slides)) as validation:
+        structure_violations = [
+            v for v in _check_slide_structure(markdown)
+            if ('slide_number' not in v or v['slide_number'] in touched_numbers)
+            and ('slides' not in v or touched_numbers.intersection(v['slides']))
+        ]
+        violations = _check_slides_overflow(
+            [(number, merged_slides[number - 1]) for number in touched]
+        ) + structure_violations
+        validation.set(touched_slides=len(touched), violations=len(violations))
+    # モデルは呼び出し前の番号でパッチを書くため、違反は適用後の番号ではなく、パッチと呼び出し前の番号で示す
+    slide_labels = {number: f"S{original}" for number, original in kept.items()}
+    slide_labels.update({
+        number: f"パッチ{index + 1}（{patches[index]['op']} slide={patches[index]['slide']}）"
+        for number, index in touched.items()
+    })
+    rejection = _accept_or_reject(markdown, violations, "patch_slides", slide_labels)
+    if rejection:
+        return rejection
+    # 会話履歴にはパッチしか残らないため、挿入・削除後の番号が次のターンでも分かるよう一覧を返す
+    outline = "\n".join(f"{number}. {title or '（見出しなし）'}" for number, title in enumerate(slide_titles(markdown), 1))
+    return f"スライドを出力しました（{len(patches)}件のパッチを適用）。現在のスライド（{len(merged_slides)}枚）:\n{outline}"
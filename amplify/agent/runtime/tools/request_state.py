@@ -0,0 +1,80 @@
+"""リクエスト単位のツール状態
+
+スライド・検索結果・ツイートURLなど、ツールが1回の invoke の中で書き込む状態を
+リクエストごとのオブジェクトにまとめ、同一プロセスで複数のリクエストを並行処理できるようにする。
+
+NOTE: Strands Agentsはツールを別スレッド（asyncio.to_thread）で実行するため、
+ツール内でContextVarへ値をsetしても呼び出し元へは伝播しない。
+to_threadはコンテキストをコピーして引き継ぐので、invoke側でContextVarに
+可変の状態オブジェクトを載せ、ツールはその属性を書き換えて共有する。
+"""
+
+import asyncio
+import threading
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+
+@dataclass
+class RequestState:
+    """1リクエスト分のツール状態"""
+
+    # output_slide / patch_slides
+    generated_markdown: str | None = None
+    current_markdown: str | None = None
+    overflow_retry_count: int = 0
+    expected_slide_count: int | None = None
+    maximum_slide_count: int | None = None
+    agenda_requested: bool = False
+    active_model_type: str = "sonnet"
+    # 同一ターン内で修正方針を伝え済みの違反種別（リトライ時の重複説明を省く）
+    guidance_sent: set[str] = field(default_factory=set)
+    # web_search
+    last_search_result: str | None = None
+    # generate_tweet_url
+    generated_tweet_url: str | None = None
+    # 同一リクエスト内でツールが並列実行された場合の複合更新を保護する
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    # 受け入れたスライドをストリームループへ通知するコールバック（ツールスレッドから呼ばれる）
+    markdown_listener: Callable[[str], None] | None = field(default=None, repr=False, compare=False)
+    # クライアント切断時にセットされる（Strandsのストリーム・ツール・エクスポートの中断に使う）
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    @property
+    def cancelled(self) -> bool:
+        """クライアントが切断し、このリクエストの結果を誰も受け取らない状態か"""
+        return self.cancel_event.is_set()
+
+    def subscribe_markdown(self, loop: asyncio.AbstractEventLoop, callback: Callable[[str], None]) -> None:
+        """受け入れたスライドをイベントループ上のcallbackへ通知するよう登録する"""
+        self.markdown_listener = lambda markdown: loop.call_soon_threadsafe(callback, markdown)
+
+    def unsubscribe_markdown(self) -> None:
+        """通知の登録を解除する（リクエスト終了後のループへ通知しない）"""
+        self.markdown_listener = None
+
+    def publish_markdown(self, markdown: str) -> None:
+        """受け入れたスライドを保存し、登録済みのストリームループへ即時通知する"""
+        self.generated_markdown = markdown
+        listener = self.markdown_listener
+        if listener is not None:
+            listener(markdown)
+
+
+# invoke外（ユニットテストやスクリプトからの直接呼び出し）で使うプロセス共通の状態
+_fallback_state = RequestState()
+
+_request_state: ContextVar[RequestState | None] = ContextVar("request_state", default=None)
+
+
+def start_request_state() -> RequestState:
+    """新しいリクエスト状態を作成し、現在のコンテキストに設定する"""
+    state = RequestState()
+    _request_state.set(state)
+    return state
+
+
+def get_request_state() -> RequestState:
+    """現在のコンテキストのリクエスト状態を取得（未設定ならプロセス共通の状態）"""
+    return _request_state.get() or _fallback_state
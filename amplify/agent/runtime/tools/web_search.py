@@ -1,33 +1,53 @@
 """Web検索ツール（Tavily API）"""
 
 import os
+import threading
+from typing import TYPE_CHECKING
+
 from strands import tool
-from tavily import TavilyClient
 
-# Tavilyクライアント初期化（カンマ区切りで複数キー対応、枯渇時は自動フォールバック）
-tavily_clients: list[TavilyClient] = [
-    TavilyClient(api_key=key.strip())
-    for key in os.environ.get("TAVILY_API_KEYS", "").split(",")
-    if key.strip()
-]
+from telemetry import annotate, traced
+
+from .request_state import get_request_state
+
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+
+# Tavilyクライアント（カンマ区切りで複数キー対応、枯渇時は自動フォールバック）
+# tavily と requests の読み込みで起動が遅れないよう、最初の検索で作る
+tavily_clients: list["TavilyClient"] = []
+_clients_initialized = False
+_clients_lock = threading.Lock()
+
 
-# Web検索結果用のグローバル変数
-# NOTE: ContextVarはStrands Agentsがツールを別スレッドで実行するため値が共有されない
-_last_search_result: str | None = None
+def get_tavily_clients() -> list["TavilyClient"]:
+    """Tavilyクライアントを取得（初回のみ TAVILY_API_KEYS から作成。差し替え済みならそのまま使う）"""
+    global _clients_initialized
+    with _clients_lock:
+        if not _clients_initialized:
+            _clients_initialized = True
+            if not tavily_clients:
+                from tavily import TavilyClient
+                tavily_clients.extend(
+                    TavilyClient(api_key=key.strip())
+                    for key in os.environ.get("TAVILY_API_KEYS", "").split(",")
+                    if key.strip()
+                )
+        return tavily_clients
 
 
 def get_last_search_result() -> str | None:
     """最後の検索結果を取得"""
-    return _last_search_result
+    return get_request_state().last_search_result
 
 
 def reset_last_search_result() -> None:
     """検索結果をリセット"""
-    global _last_search_result
-    _last_search_result = None
+    get_request_state().last_search_result = None
 
 
 @tool
+@traced("tool.web_search", tool="web_search")
 def web_search(query: str) -> str:
     """Web検索を実行して最新情報を取得します。最新の統計・事例・製品情報など、スライド作成に必要な情報を調べる際に使用してください。
 
@@ -44,11 +64,17 @@ def web_search(query: str) -> str:
     Returns:
         検索結果のテキスト
     """
-    if not tavily_clients:
+    clients = get_tavily_clients()
+    if not clients:
         return "Web検索機能は現在利用できません（APIキー未設定）"
 
     # 複数APIキーで順番に試行（無料枠の月5000リクエスト制限対策）
-    for client in tavily_clients:
+    state = get_request_state()
+    for key_index, client in enumerate(clients):
+        # クライアント切断後は次のキーで再試行しない
+        if state.cancelled:
+            return "リクエストがキャンセルされました"
+        annotate(key_index=key_index)
         try:
             results = client.search(
                 query=query,
@@ -67,8 +93,7 @@ def web_search(query: str) -> str:
                 url = result.get("url", "")
                 formatted_results.append(f"**{title}**\n{content}\nURL: {url}")
             search_result = "\n\n---\n\n".join(formatted_results) if formatted_results else "検索結果がありませんでした"
-            global _last_search_result
-            _last_search_result = search_result  # フォールバック用に保存
+            state.last_search_result = search_result  # フォールバック用に保存
             return search_result
         except Exception as e:
             # rate limit系のエラーなら次のキーで再試行、それ以外は即座にエラー返却
@@ -0,0 +1,133 @@
+"""起動時のウォームアップ（Marp CLI・Chromium・フォント、PDF抽出のワーカー、モデルクライアント）
+
+スケールアウト直後の最初のリクエストは、次の初回コストをまとめて払うことになる。
+
+- エクスポート: Marp CLI（Node.jsのモジュール読み込み）とChromiumの起動、日本語フォントの読み込み
+- 参考資料PDF: 抽出用プロセスプールの forkserver とワーカーの起動、pdfplumber の読み込み
+- チャット: モデルクライアントの作成、認証情報の解決、BedrockへのTLS接続
+
+RUNTIME_WARMUP を指定すると、起動時にバックグラウンドでこれらを済ませる。終わるまで /ping は HealthyBusy を返す
+（AgentCoreのpingには「準備中」がないため、処理中として扱わせる）。
+"""
+
+import os
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from exports import generate_pdf
+from references import prewarm_pdf_executor
+from session import prime_model_clients
+from telemetry import count, phase
+from workers import is_primary_worker
+
+WARMUP_STEPS = ("render", "pdf", "models")
+THEMES_DIR = Path(__file__).resolve().parent
+WARMUP_DECK = """---
+marp: true
+theme: {theme}
+---
+
+# ウォームアップ
+
+- 日本語フォントの読み込み確認
+"""
+
+
+def warmup_steps() -> list[str]:
+    """有効にするウォームアップの手順（環境変数 RUNTIME_WARMUP）
+
+    未設定・"0"・"false" は無効、"1"・"true"・"all" はすべて、カンマ区切りで手順を選べる（例: "render,models"）。
+    """
+    value = os.getenv("RUNTIME_WARMUP", "").strip().lower()
+    if value in ("", "0", "false", "off"):
+        return []
+    if value in ("1", "true", "on", "all"):
+        return list(WARMUP_STEPS)
+    steps = [step.strip() for step in value.split(",") if step.strip()]
+    unknown = [step for step in steps if step not in WARMUP_STEPS]
+    if unknown:
+        print(f"[WARN] Unknown RUNTIME_WARMUP steps ignored: {unknown}")
+    return [step for step in WARMUP_STEPS if step in steps]
+
+
+def available_themes() -> list[str]:
+    """同梱しているテーマ（ランタイムのディレクトリにある *.css）"""
+    return sorted(path.stem for path in THEMES_DIR.glob("*.css"))
+
+
+def render_themes() -> None:
+    """各テーマで1枚のデッキをPDFにし、Marp CLI・Chromium・フォントを読み込んでおく"""
+    for theme in available_themes() or ["default"]:
+        generate_pdf(WARMUP_DECK.format(theme=theme), theme)
+
+
+class Warmup:
+    """ウォームアップの手順を順に実行する（失敗した手順は飛ばして次へ進む）"""
+
+    def __init__(self, steps: dict[str, Callable[[], object]]):
+        self.steps = steps
+        self._started = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def in_progress(self) -> bool:
+        return self._started.is_set() and not self._done.is_set()
+
+    def run(self) -> dict[str, bool]:
+        """すべての手順を実行し、手順ごとの成否を返す"""
+        self._started.set()
+        results = {}
+        start = time.perf_counter()
+        try:
+            for name, step in self.steps.items():
+                try:
+                    with phase(f"warmup.{name}"):
+                        step()
+                    results[name] = True
+                except Exception as e:
+                    print(f"[WARN] Warmup step failed: {name}: {e}")
+                    results[name] = False
+                count("warmup.steps", outcome="ok" if results[name] else "error")
+        finally:
+            self._done.set()
+        print(f"[INFO] Warmup finished in {time.perf_counter() - start:.1f}s: {results}")
+        return results
+
+    def start(self) -> None:
+        """バックグラウンドで実行する（開始した時点から in_progress になる）"""
+        self._started.set()
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+
+_warmup: Warmup | None = None
+
+
+def start_warmup() -> Warmup | None:
+    """RUNTIME_WARMUP で指定した手順をバックグラウンドで始める（無効なら何もしない）
+
+    テーマの描画はディスク・フォントのキャッシュを温めるだけなので、マルチワーカー構成ではワーカー0だけが行う。
+    PDF抽出のプロセスプールとモデルクライアントはプロセスごとに持つため、各ワーカーが行う。
+    """
+    global _warmup
+    actions = {
+        "render": render_themes,
+        "pdf": prewarm_pdf_executor,
+        "models": prime_model_clients,
+    }
+    steps = {step: actions[step] for step in warmup_steps() if step != "render" or is_primary_worker()}
+    if not steps:
+        return None
+    print(f"[INFO] Warmup started: {list(steps)}")
+    _warmup = Warmup(steps)
+    _warmup.start()
+    return _warmup
+
+
+def warmup_in_progress() -> bool:
+    """起動時のウォームアップの実行中か（/ping で HealthyBusy を返すのに使う）"""
+    return _warmup is not None and _warmup.in_progress
@@ -0,0 +1,24 @@
+"""ランタイムのマルチワーカー構成（ルーターとワーカープロセス）
+
+ルーター本体（workers.router）は Starlette / httpx を使うため、ワーカー数が2以上のときだけ読み込む。
+"""
+
+from .routing import (
+    is_primary_worker,
+    least_loaded_worker,
+    merge_ping,
+    runtime_workers,
+    worker_base_port,
+    worker_for_session,
+    worker_port,
+)
+
+__all__ = [
+    "is_primary_worker",
+    "least_loaded_worker",
+    "merge_ping",
+    "runtime_workers",
+    "worker_base_port",
+    "worker_for_session",
+    "worker_port",
+]
@@ -0,0 +1,226 @@
+"""複数のランタイムプロセスを同じポートの後ろで動かすルーター
+
+AgentCore Runtime から届く 8080 番ポートのリクエストを、ローカルで起動したN個のワーカー（main.py）に中継する。
+
+- /invocations はセッションIDのヘッダーでワーカーを固定する（スティッキールーティング）。
+  会話履歴・参考資料のインデックスはワーカーのメモリにあり、メモリにない場合は共有の
+  スナップショット（SESSION_SNAPSHOT_DIR のSQLite）から読み戻すため、ワーカーが再起動しても会話は続く
+- セッションIDのないリクエストは処理中のリクエストが最も少ないワーカーに振る
+- /ping は全ワーカーの結果をまとめ、どれか1つでも処理中なら HealthyBusy を返す
+- 終了したワーカーは待ち時間を延ばしながら再起動する
+
+ワーカーは同じ環境変数を引き継いで起動するため、opentelemetry-instrument の自動計装もそのまま効く。
+"""
+
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from telemetry import count
+
+from .routing import least_loaded_worker, merge_ping, worker_base_port, worker_for_session
+
+ENTRY_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+SESSION_HEADER = "x-amzn-bedrock-agentcore-runtime-session-id"
+# 中継しないヘッダー（接続ごとのもの。本文はそのまま流すので content-length も付け直させる）
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade",
+    "proxy-authorization", "proxy-authenticate", "host", "content-length",
+})
+CONNECT_WAIT_SECONDS = 60.0  # 起動中・再起動中のワーカーの待ち受け開始を待つ時間
+CONNECT_RETRY_SECONDS = 0.2
+PING_TIMEOUT_SECONDS = 2.0
+SUPERVISE_INTERVAL_SECONDS = 1.0
+RESTART_BACKOFF_MAX_SECONDS = 30.0
+STABLE_SECONDS = 60.0  # これより長く動いたワーカーの再起動は待たない
+STOP_TIMEOUT_SECONDS = 10.0
+
+
+class WorkerPool:
+    """ワーカープロセスの起動・監視・終了とリクエストの振り分け"""
+
+    def __init__(self, workers: int, base_port: int):
+        self.ports = [base_port + index for index in range(workers)]
+        self.in_flight = [0] * workers
+        self._processes: list[subprocess.Popen | None] = [None] * workers
+        self._started_at = [0.0] * workers
+        self._failures = [0] * workers
+        self._restart_at = [0.0] * workers
+
+    def url(self, index: int, path: str) -> str:
+        return f"http://127.0.0.1:{self.ports[index]}{path}"
+
+    def pick(self, session_id: str | None) -> int:
+        if session_id:
+            return worker_for_session(session_id, len(self.ports))
+        return least_loaded_worker(self.in_flight)
+
+    def _spawn(self, index: int) -> None:
+        env = dict(
+            os.environ,
+            RUNTIME_WORKERS="1",
+            RUNTIME_WORKER_INDEX=str(index),
+            RUNTIME_WORKER_PORT=str(self.ports[index]),
+        )
+        self._processes[index] = subprocess.Popen([sys.executable, str(ENTRY_SCRIPT)], env=env, cwd=ENTRY_SCRIPT.parent)
+        self._started_at[index] = time.monotonic()
+        print(f"[INFO] Runtime worker {index} started (pid={self._processes[index].pid}, port={self.ports[index]})")
+
+    def start(self) -> None:
+        for index in range(len(self.ports)):
+            self._spawn(index)
+
+    def check(self) -> None:
+        """終了したワーカーを再起動する（すぐに落ち続けるワーカーは待ち時間を倍々に延ばす）"""
+        now = time.monotonic()
+        for index, process in enumerate(self._processes):
+            if process is None or process.poll() is None:
+                continue
+            if self._restart_at[index] == 0.0:
+                if now - self._started_at[index] >= STABLE_SECONDS:
+                    self._failures[index] = 0
+                delay = min(2.0 ** self._failures[index] - 1, RESTART_BACKOFF_MAX_SECONDS)
+                self._failures[index] += 1
+                self._restart_at[index] = now + delay
+                count("runtime.worker_restarts")
+                print(f"[WARN] Runtime worker {index} exited with code {process.returncode}, "
+                      f"restarting in {delay:.0f}s")
+            if now >= self._restart_at[index]:
+                self._restart_at[index] = 0.0
+                self._spawn(index)
+
+    async def supervise(self) -> None:
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL_SECONDS)
+            self.check()
+
+    def stop(self) -> None:
+        running = [process for process in self._processes if process is not None and process.poll() is None]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+        for process in running:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes = [None] * len(self.ports)
+
+
+def _forward_headers(headers) -> dict[str, str]:
+    return {key: value for key, value in headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+
+
+class _RelayResponse(StreamingResponse):
+    """ワーカーの応答をSSEのチャンク単位のまま中継する（ワーカー側の送信単位を崩さない）
+
+    本文を送り始める前にクライアントが切断すると本文のジェネレーターは動かず、切断時の例外では
+    background も呼ばれない。処理中の数とワーカーへの接続は、送信の成否にかかわらずここで片付ける。
+    """
+
+    def __init__(self, upstream: httpx.Response, on_close: Callable[[], Awaitable[None]]):
+        super().__init__(upstream.aiter_raw(), status_code=upstream.status_code,
+                         headers=_forward_headers(upstream.headers))
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+def create_router_app(pool: WorkerPool) -> Starlette:
+    """ワーカーにリクエストを中継する Starlette アプリ"""
+    client: httpx.AsyncClient | None = None
+
+    async def send(request: httpx.Request) -> httpx.Response:
+        """ワーカーに送る（接続できないのは起動中・再起動中なので、待ち受けを始めるまで待つ）"""
+        deadline = time.monotonic() + CONNECT_WAIT_SECONDS
+        while True:
+            try:
+                return await client.send(request, stream=True)
+            except httpx.ConnectError:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(CONNECT_RETRY_SECONDS)
+
+    async def invocations(request: Request):
+        index = pool.pick(request.headers.get(SESSION_HEADER))
+        upstream_request = client.build_request(
+            request.method,
+            pool.url(index, request.url.path),
+            params=request.query_params,
+            headers=_forward_headers(request.headers),
+            content=await request.body(),
+        )
+        try:
+            upstream = await send(upstream_request)
+        except httpx.HTTPError as e:
+            print(f"[ERROR] Runtime worker {index} unavailable: {e}")
+            return JSONResponse({"error": "Runtime worker unavailable"}, status_code=503)
+
+        pool.in_flight[index] += 1
+
+        async def release():
+            pool.in_flight[index] -= 1
+            await upstream.aclose()
+
+        return _RelayResponse(upstream, release)
+
+    async def ping(request: Request):
+        async def worker_ping(index: int) -> dict | None:
+            try:
+                response = await client.get(pool.url(index, "/ping"), timeout=PING_TIMEOUT_SECONDS)
+                return response.json()
+            except (httpx.HTTPError, ValueError):
+                return None
+
+        statuses = await asyncio.gather(*(worker_ping(index) for index in range(len(pool.ports))))
+        return JSONResponse(merge_ping(list(statuses)))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        nonlocal client
+        pool.start()
+        supervisor = asyncio.create_task(pool.supervise())
+        # SSEは1ターン数分続くため読み込みのタイムアウトは設けない
+        async with httpx.AsyncClient(
+            timeout=httpx.Timeout(None, connect=5.0),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=len(pool.ports) * 4),
+        ) as client:
+            try:
+                yield
+            finally:
+                supervisor.cancel()
+                pool.stop()
+
+    return Starlette(
+        routes=[
+            Route("/invocations", invocations, methods=["POST"]),
+            Route("/ping", ping, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def run_router(workers: int, port: int = 8080) -> None:
+    """N個のワーカーを起動し、port で受けたリクエストを中継する（終了時にワーカーも止める）"""
+    pool = WorkerPool(workers, worker_base_port())
+    # BedrockAgentCoreApp.run と同じく、コンテナ内では全インターフェースで待ち受ける
+    in_container = os.path.exists("/.dockerenv") or os.environ.get("DOCKER_CONTAINER")
+    host = "0.0.0.0" if in_container else "127.0.0.1"
+    print(f"[INFO] Runtime router listening on {host}:{port} with {workers} workers (ports {pool.ports[0]}-{pool.ports[-1]})")
+    uvicorn.run(create_router_app(pool), host=host, port=port, log_level="warning")
@@ -0,0 +1,62 @@
+"""ワーカー数の設定とセッションの振り分け（依存ライブラリなしで使える部分）"""
+
+import os
+import zlib
+
+from config import env_number
+
+DEFAULT_BASE_PORT = 8081  # ワーカーが待ち受ける最初のポート（8080はルーター）
+PING_BUSY = "HealthyBusy"
+PING_HEALTHY = "Healthy"
+
+
+def runtime_workers() -> int:
+    """ランタイムのワーカープロセス数（環境変数 RUNTIME_WORKERS。"auto" はCPU数、未設定は1）"""
+    if os.getenv("RUNTIME_WORKERS", "").strip().lower() == "auto":
+        return os.cpu_count() or 1
+    return env_number("RUNTIME_WORKERS", 1, minimum=1)
+
+
+def worker_base_port() -> int:
+    """ワーカーが待ち受ける最初のポート（環境変数 RUNTIME_WORKER_BASE_PORT）"""
+    return env_number("RUNTIME_WORKER_BASE_PORT", DEFAULT_BASE_PORT, minimum=None)
+
+
+def worker_port() -> int | None:
+    """ワーカーとして起動されたときに待ち受けるポート（ルーターが RUNTIME_WORKER_PORT で渡す）"""
+    value = os.getenv("RUNTIME_WORKER_PORT", "").strip()
+    return int(value) if value else None
+
+
+def is_primary_worker() -> bool:
+    """起動時の確認など、1プロセスで行えば足りる処理を受け持つワーカーか（単一プロセスのときも True）"""
+    return os.getenv("RUNTIME_WORKER_INDEX", "0").strip() == "0"
+
+
+def worker_for_session(session_id: str, workers: int) -> int:
+    """セッションを担当するワーカーの番号
+
+    同じセッションは常に同じワーカーに届ける（会話履歴・参考資料のインデックスがそのワーカーのメモリにあるため）。
+    Pythonの hash() はプロセスごとに値が変わるので、ルーターを再起動しても同じ振り分けになる crc32 を使う。
+    """
+    return zlib.crc32(session_id.encode()) % workers
+
+
+def least_loaded_worker(in_flight: list[int]) -> int:
+    """セッションIDのないリクエストを、処理中のリクエストが最も少ないワーカーに振る"""
+    return min(range(len(in_flight)), key=in_flight.__getitem__)
+
+
+def merge_ping(statuses: list[dict | None]) -> dict:
+    """各ワーカーの /ping の結果を1つにまとめる
+
+    どれか1つでも処理中なら HealthyBusy（AgentCoreはアイドルと判断したコンテナを止めるため）。
+    応答しないワーカー（None）は再起動中として数えない。
+    """
+    answered = [status for status in statuses if status]
+    busy = any(status.get("status") == PING_BUSY for status in answered)
+    merged = {"status": PING_BUSY if busy else PING_HEALTHY}
+    updates = [status["time_of_last_update"] for status in answered if "time_of_last_update" in status]
+    if updates:
+        merged["time_of_last_update"] = max(updates)
+    return merged
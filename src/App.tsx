@@ -91,6 +91,9 @@ function App() {
 function MainApp({ signOut }: { signOut?: () => void }) {
   const [activeTab, setActiveTab] = useState<Tab>('chat');
   const [markdown, setMarkdown] = useState('');
+  // 生成途中のスライド（検証前）。出力やエクスポートには使わずプレビュー表示のみ
+  const [draftMarkdown, setDraftMarkdown] = useState<string | null>(null);
+  const draftStartedRef = useRef(false);
   const [isDownloading, setIsDownloading] = useState(false);
   const [selectedTheme, setSelectedTheme] = useState<ThemeId>('speee');
   const [editPromptTrigger, setEditPromptTrigger] = useState(0);
@@ -112,6 +115,19 @@ function MainApp({ signOut }: { signOut?: () => void }) {
     setActiveTab('preview');
   };
 
+  const handlePreviewDraft = (draft: string | null) => {
+    setDraftMarkdown(draft);
+    if (draft === null) {
+      draftStartedRef.current = false;
+      return;
+    }
+    // 最初のスライドが届いた時点でプレビュータブに切り替え
+    if (!draftStartedRef.current) {
+      draftStartedRef.current = true;
+      setActiveTab('preview');
+    }
+  };
+
   const handleRequestEdit = () => {
     setActiveTab('chat');
     // 修正用メッセージをトリガー
@@ -247,6 +263,7 @@ function MainApp({ signOut }: { signOut?: () => void }) {
         <div className={`h-full ${activeTab === 'chat' ? '' : 'hidden'}`}>
           <Chat
             onMarkdownGenerated={handleMarkdownGenerated}
+            onPreviewDraft={handlePreviewDraft}
             currentMarkdown={markdown}
             inputRef={chatInputRef}
             editPromptTrigger={editPromptTrigger}
@@ -257,7 +274,7 @@ function MainApp({ signOut }: { signOut?: () => void }) {
         </div>
         <div className={`h-full ${activeTab === 'preview' ? '' : 'hidden'}`}>
           <SlidePreview
-            markdown={markdown}
+            markdown={draftMarkdown ?? markdown}
             selectedTheme={selectedTheme}
             onThemeChange={setSelectedTheme}
             onDownloadPdf={(theme) => handleExport('pdf', theme)}
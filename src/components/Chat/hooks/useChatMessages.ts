@@ -9,6 +9,7 @@ import { useStreamingText } from './useStreamingText';
 
 interface UseChatMessagesProps {
   onMarkdownGenerated: (markdown: string) => void;
+  onPreviewDraft?: (markdown: string | null) => void;
   currentMarkdown: string;
   editPromptTrigger?: number;
   sharePromptTrigger?: number;
@@ -30,6 +31,7 @@ function fileToBase64(file: File): Promise<string> {
 
 export function useChatMessages({
   onMarkdownGenerated,
+  onPreviewDraft,
   currentMarkdown,
   editPromptTrigger,
   sharePromptTrigger,
@@ -43,6 +45,8 @@ export function useChatMessages({
   const [modelType, setModelType] = useState<ModelType>('sonnet');
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
   const initializedRef = useRef(false);
+  // 生成途中のスライド（output_slideの入力から逐次届く。検証前のためcurrentMarkdownには反映しない）
+  const partialSlidesRef = useRef<string[]>([]);
 
   const { startTipRotation, stopTipRotation } = useTipRotation();
   const { streamText } = useStreamingText();
@@ -240,7 +244,7 @@ export function useChatMessages({
             )
           );
 
-          if (toolName === 'output_slide') {
+          if (toolName === 'output_slide' || toolName === 'patch_slides') {
             setMessages(prev => {
               const hasExisting = prev.some(
                 msg => msg.isStatus && msg.statusText?.startsWith(MESSAGES.SLIDE_GENERATING_PREFIX)
@@ -293,7 +297,16 @@ export function useChatMessages({
             });
           }
         },
+        onSlidePartial: (index, slide, frontmatter) => {
+          // リトライで新しいoutput_slide呼び出しが始まると1枚目から届き直す
+          const slides = partialSlidesRef.current.slice(0, index - 1);
+          slides[index - 1] = slide;
+          partialSlidesRef.current = slides;
+          onPreviewDraft?.(frontmatter + slides.join('\n\n---\n\n') + '\n');
+        },
         onMarkdown: (markdown) => {
+          partialSlidesRef.current = [];
+          onPreviewDraft?.(null);
           onMarkdownGenerated(markdown);
           stopTipRotation();
           setMessages(prev =>
@@ -306,6 +319,8 @@ export function useChatMessages({
         },
         onError: (error) => {
           // ストリーム中のエラーイベント（バックエンドが{type:"error"}を送信）
+          partialSlidesRef.current = [];
+          onPreviewDraft?.(null);
           console.error('Agent error:', error);
           const errorMessage = error instanceof Error ? error.message : String(error);
           const isModelNotAvailable = errorMessage.includes('model identifier is invalid') || errorMessage.includes('Model not found');
@@ -321,6 +336,9 @@ export function useChatMessages({
           });
         },
         onComplete: () => {
+          // 検証を通過しなかった生成途中のスライドは破棄し、確定済みのプレビューに戻す
+          partialSlidesRef.current = [];
+          onPreviewDraft?.(null);
           setMessages(prev =>
             prev.map(msg => {
               if (msg.isStatus && msg.statusText?.startsWith(MESSAGES.WEB_SEARCH_PREFIX)) {
@@ -384,7 +402,7 @@ export function useChatMessages({
         })
       );
     }
-  }, [input, isLoading, selectedFile, currentMarkdown, sessionId, modelType, theme, onMarkdownGenerated, startTipRotation, stopTipRotation, streamText]);
+  }, [input, isLoading, selectedFile, currentMarkdown, sessionId, modelType, theme, onMarkdownGenerated, onPreviewDraft, startTipRotation, stopTipRotation, streamText]);
 
   return {
     messages,
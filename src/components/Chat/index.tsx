@@ -3,7 +3,7 @@ import { useChatMessages } from './hooks/useChatMessages';
 import { MessageList } from './MessageList';
 import { ChatInput } from './ChatInput';
 
-export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromptTrigger, sharePromptTrigger, sessionId, theme }: ChatProps) {
+export function Chat({ onMarkdownGenerated, onPreviewDraft, currentMarkdown, inputRef, editPromptTrigger, sharePromptTrigger, sessionId, theme }: ChatProps) {
   const {
     messages,
     input,
@@ -17,6 +17,7 @@ export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromp
     handleSubmit,
   } = useChatMessages({
     onMarkdownGenerated,
+    onPreviewDraft,
     currentMarkdown,
     editPromptTrigger,
     sharePromptTrigger,
@@ -45,6 +45,7 @@ export function createMessage(partial: Omit<Message, 'id'>): Message {
 
 export interface ChatProps {
   onMarkdownGenerated: (markdown: string) => void;
+  onPreviewDraft?: (markdown: string | null) => void;  // 生成途中のスライド（nullで破棄）
   currentMarkdown: string;
   inputRef?: React.RefObject<HTMLInputElement | null>;
   editPromptTrigger?: number;  // 値が変わるたびに修正用メッセージを表示
@@ -14,6 +14,7 @@ export interface AgentCoreCallbacks {
   onText: (text: string) => void;
   onStatus: (status: string) => void;
   onMarkdown: (markdown: string) => void;
+  onSlidePartial?: (index: number, slide: string, frontmatter: string) => void;
   onTweetUrl?: (url: string) => void;
   onToolUse: (toolName: string, query?: string) => void;
   onError: (error: Error) => void;
@@ -53,7 +54,7 @@ export async function getAgentCoreConfig() {
  * イベントをコールバックに振り分け
  */
 function handleEvent(
-  event: { type?: string; content?: string; data?: string; error?: string; message?: string; query?: string },
+  event: { type?: string; content?: string; data?: string; error?: string; message?: string; query?: string; index?: number; frontmatter?: string },
   callbacks: AgentCoreCallbacks
 ) {
   const textValue = event.content || event.data;
@@ -68,6 +69,12 @@ function handleEvent(
     case 'markdown':
       if (textValue) callbacks.onMarkdown(textValue);
       break;
+    case 'slide_partial':
+      // 生成途中のスライド（検証前）。defaultに落ちてチャット本文に混ざらないよう明示的に扱う
+      if (textValue && event.index && callbacks.onSlidePartial) {
+        callbacks.onSlidePartial(event.index, textValue, event.frontmatter ?? '');
+      }
+      break;
     case 'tweet_url':
       if (textValue && callbacks.onTweetUrl) callbacks.onTweetUrl(textValue);
       break;
@@ -0,0 +1,160 @@
+"""output_slide 検証ロジックのスループットベンチマーク
+
+コーパス（tests/slide_corpus.py）の各デッキに対して
+_check_slide_overflow / _check_slide_structure / output_slide 全体の処理時間と
+メモリ割り当てを計測し、スライド/秒で報告する。
+
+使い方（リポジトリルートから）:
+    python tests/benchmark_output_slide.py                      # 計測して表示
+    python tests/benchmark_output_slide.py --save bench.json    # 結果を保存
+    python tests/benchmark_output_slide.py --baseline bench.json  # 保存済み結果と比較
+    python tests/benchmark_output_slide.py --write-verdicts     # 検証結果の基準ファイルを更新
+
+パーサーや表示幅計算を置き換えるときは、変更前に --save、変更後に --baseline で比較し、
+tests/test_output_slide_corpus.py で検証結果が変わっていないことを確認する。
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# 外部モジュールのモックとランタイムのパス設定をテストと共有する
+import conftest  # noqa: F401
+from slide_corpus import build_corpus, build_pathological, collect_verdicts
+
+from tools.output_slide import (
+    _check_slide_overflow,
+    _check_slide_structure,
+    _parse_slides,
+    configure_slide_validation,
+    output_slide,
+    reset_generated_markdown,
+)
+
+VERDICTS_PATH = Path(__file__).parent / "fixtures" / "output_slide_verdicts.json"
+
+
+def _run_output_slide(markdown: str) -> None:
+    reset_generated_markdown()
+    configure_slide_validation("10枚で作って", "kimi")
+    output_slide(markdown=markdown)
+
+
+def _run_structure(markdown: str) -> None:
+    configure_slide_validation("10枚で作って", "kimi")
+    _check_slide_structure(markdown)
+
+
+TARGETS = {
+    "overflow": _check_slide_overflow,
+    "structure": _run_structure,
+    "output_slide": _run_output_slide,
+}
+
+
+def verdict_digest(verdicts: dict) -> dict:
+    """検証結果を件数とハッシュに要約（基準ファイル用）"""
+    canonical = json.dumps(verdicts, ensure_ascii=False, sort_keys=True)
+    return {
+        "counts": {key: len(value) for key, value in verdicts.items()},
+        "sha256": hashlib.sha256(canonical.encode("utf-8")).hexdigest(),
+    }
+
+
+def measure(func, markdown: str, repeat: int) -> dict:
+    """処理時間（最良値）とメモリ割り当てを計測"""
+    func(markdown)  # ウォームアップ（正規表現のコンパイルキャッシュ等）
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(markdown)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func(markdown)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocations = sum(stat.count for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return {"seconds": best, "peak_bytes": peak, "allocations": allocations}
+
+
+def run_benchmark(repeat: int, include_pathological: bool) -> dict:
+    decks = build_corpus() + (build_pathological() if include_pathological else [])
+    results = {}
+    for name, markdown in decks:
+        slide_count = max(len(_parse_slides(markdown)), 1)
+        for target, func in TARGETS.items():
+            stats = measure(func, markdown, repeat)
+            stats["slides"] = slide_count
+            stats["slides_per_second"] = slide_count / stats["seconds"] if stats["seconds"] else float("inf")
+            results[f"{target}:{name}"] = stats
+    return results
+
+
+def print_results(results: dict, baseline: dict | None) -> bool:
+    """結果を表示し、ベースラインより明確に遅いケースがあればFalseを返す"""
+    ok = True
+    header = f"{'target:deck':<40} {'slides':>6} {'ms':>9} {'slides/s':>11} {'peak KB':>9} {'allocs':>8}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for key, stats in results.items():
+        line = (
+            f"{key:<40} {stats['slides']:>6} {stats['seconds'] * 1000:>9.2f} "
+            f"{stats['slides_per_second']:>11.0f} {stats['peak_bytes'] / 1024:>9.1f} {stats['allocations']:>8}"
+        )
+        if baseline and key in baseline:
+            ratio = stats["seconds"] / baseline[key]["seconds"]
+            line += f" {ratio:>7.2f}x"
+            # 計測誤差を考慮し、10%を超える劣化のみ失敗扱い
+            if ratio > 1.10:
+                ok = False
+                line += "  <- SLOWER"
+        print(line)
+    return ok
+
+
+def write_verdicts() -> None:
+    decks = build_corpus() + build_pathological()
+    digests = {name: verdict_digest(collect_verdicts(markdown)) for name, markdown in decks}
+    VERDICTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    VERDICTS_PATH.write_text(json.dumps(digests, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote {len(digests)} verdict digests to {VERDICTS_PATH}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="各ケースの計測回数（最良値を採用）")
+    parser.add_argument("--no-pathological", action="store_true", help="バックトラック誘発入力を除外")
+    parser.add_argument("--save", type=Path, help="計測結果をJSONで保存")
+    parser.add_argument("--baseline", type=Path, help="比較対象の計測結果JSON")
+    parser.add_argument("--write-verdicts", action="store_true", help="検証結果の基準ファイルを更新して終了")
+    args = parser.parse_args()
+
+    if args.write_verdicts:
+        write_verdicts()
+        return 0
+
+    results = run_benchmark(args.repeat, include_pathological=not args.no_pathological)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    ok = print_results(results, baseline)
+
+    total_slides = sum(s["slides"] for k, s in results.items() if k.startswith("output_slide:"))
+    total_seconds = sum(s["seconds"] for k, s in results.items() if k.startswith("output_slide:"))
+    print(f"\noutput_slide total: {total_slides} slides in {total_seconds * 1000:.1f} ms "
+          f"({total_slides / total_seconds:.0f} slides/s)")
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2) + "\n")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,45 @@
 """テスト用の共通設定 - 外部モジュールのモック"""
+import os
 import sys
 from pathlib import Path
 from unittest.mock import MagicMock
 
-# strands, tavily, bedrock_agentcore, boto3 をモック（ローカルにはインストールされていない）
+# strands, tavily, bedrock_agentcore, boto3, pdfplumber をモック（ローカルにはインストールされていない）
 mock_strands = MagicMock()
 mock_strands.tool = lambda func: setattr(func, 'tool_func', func) or func
 sys.modules["strands"] = mock_strands
 sys.modules["strands.models"] = MagicMock()
+# 台本モデル（loadtest/fake_model.py）が継承できるよう、Model だけは実クラスにする
+sys.modules["strands.models"].Model = type("Model", (), {})
+sys.modules["strands.models.openai_responses"] = MagicMock()
+sys.modules["strands.agent"] = MagicMock()
+sys.modules["strands.agent.conversation_manager"] = MagicMock()
+
+
+class _SlidingWindowConversationManager:
+    """会話履歴の圧縮（session/conversation.py）が継承できるよう、最小限の実クラスにする"""
+
+    def __init__(self, window_size=40, should_truncate_results=True, **kwargs):
+        self.window_size = window_size
+        self.removed_message_count = 0
+
+
+sys.modules["strands.agent.conversation_manager"].SlidingWindowConversationManager = _SlidingWindowConversationManager
 
 mock_tavily = MagicMock()
 sys.modules["tavily"] = mock_tavily
 
 sys.modules["strands_tools"] = MagicMock()
-sys.modules["bedrock_agentcore"] = MagicMock()
 sys.modules["boto3"] = MagicMock()
+sys.modules["pdfplumber"] = MagicMock()
+
+# @app.entrypoint はデコレート対象の関数をそのまま返す（agent.invoke を直接テストするため）
+mock_agentcore = MagicMock()
+mock_agentcore.BedrockAgentCoreApp.return_value.entrypoint = lambda func: func
+sys.modules["bedrock_agentcore"] = mock_agentcore
 
 # ランタイムディレクトリをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+# 会話履歴のスナップショットはテストごとに保存先を指定する（既定の /tmp には書かない）
+os.environ.setdefault("SESSION_SNAPSHOT_BACKEND", "none")
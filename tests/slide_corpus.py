@@ -0,0 +1,165 @@
+"""output_slide 検証ロジックのベンチマーク・回帰テスト用スライドコーパス
+
+乱数シードを固定して実運用に近い形のデッキ（日本語の本文・横に広いテーブル・
+コードブロック・5〜300枚）と、正規表現のバックトラックを誘発しやすい入力を生成する。
+同じコードからは常に同じマークダウンが生成される。
+"""
+
+import random
+
+FRONTMATTER = "---\nmarp: true\ntheme: border\nsize: 16:9\npaginate: true\n---\n\n"
+
+_PHRASES = [
+    "生成AIの業務活用", "クラウドネイティブな開発体制", "データ基盤の整備", "セキュリティ対策の強化",
+    "顧客体験の向上", "開発生産性の改善", "運用コストの削減", "アジャイル開発の定着",
+    "AgentCore Runtimeの導入", "Bedrockのモデル選定", "社内ナレッジの検索性", "レビュー工数の削減",
+    "KPIの継続的なモニタリング", "PoCから本番移行まで", "ガバナンスと監査対応", "人材育成とリスキリング",
+]
+_CONNECTORS = ["により", "を通じて", "に向けて", "と並行して", "を前提に", "の観点から"]
+_ENDINGS = ["を実現", "が課題", "を推進", "に着手", "が重要", "を検証"]
+_ASCII_WORDS = ["Lambda", "S3", "API", "SLA", "CI/CD", "RAG", "LLM", "MCP", "Kubernetes", "OpenTelemetry"]
+_CODE_LINES = [
+    "from strands import Agent",
+    "agent = Agent(model=model, tools=[web_search])",
+    "result = agent(\"スライドを作って\")",
+    "for event in agent.stream_async(prompt):",
+    "    print(event)",
+    "aws bedrock-agentcore invoke-agent-runtime --payload file://req.json",
+]
+
+
+def _sentence(rng: random.Random, min_phrases: int = 1, max_phrases: int = 3) -> str:
+    """日本語の短文を生成（ASCIIの技術用語を時々混ぜる）"""
+    phrases = [rng.choice(_PHRASES) for _ in range(rng.randint(min_phrases, max_phrases))]
+    text = rng.choice(_CONNECTORS).join(phrases) + rng.choice(_ENDINGS)
+    if rng.random() < 0.3:
+        text = f"{rng.choice(_ASCII_WORDS)}で{text}"
+    return text
+
+
+def _bullet(rng: random.Random) -> str:
+    """装飾付きの箇条書き1行を生成"""
+    text = _sentence(rng)
+    roll = rng.random()
+    if roll < 0.15:
+        text = f"**{text}**"
+    elif roll < 0.25:
+        text = f"[{text}](https://example.com/{rng.randint(1, 999)})"
+    elif roll < 0.35:
+        text = f"`{rng.choice(_ASCII_WORDS)}` {text}"
+    return f"- {text}"
+
+
+def _bullet_slide(rng: random.Random, index: int) -> str:
+    lines = [f"## {_sentence(rng, 1, 1)}（{index}）", ""]
+    lines += [_bullet(rng) for _ in range(rng.randint(3, 9))]
+    return "\n".join(lines)
+
+
+def _prose_slide(rng: random.Random, index: int) -> str:
+    lines = [f"## {_sentence(rng, 1, 1)}", "", f"### {_sentence(rng, 1, 1)}", ""]
+    lines += [_sentence(rng, 2, 4) + "。" for _ in range(rng.randint(1, 3))]
+    lines.append("")
+    lines += [_bullet(rng) for _ in range(rng.randint(1, 4))]
+    return "\n".join(lines)
+
+
+def _table_slide(rng: random.Random, index: int) -> str:
+    columns = rng.randint(2, 5)
+    header = "| " + " | ".join(f"観点{c + 1}" for c in range(columns)) + " |"
+    separator = "|" + "|".join(rng.choice([":---", ":---:", "---:", "---"]) for _ in range(columns)) + "|"
+    rows = [
+        "| " + " | ".join(rng.choice(_PHRASES)[: rng.randint(3, 14)] for _ in range(columns)) + " |"
+        for _ in range(rng.randint(2, 7))
+    ]
+    return "\n".join([f"## 比較表{index}", "", _sentence(rng, 1, 1), "", header, separator, *rows])
+
+
+def _code_slide(rng: random.Random, index: int) -> str:
+    code = [rng.choice(_CODE_LINES) for _ in range(rng.randint(2, 8))]
+    return "\n".join([f"## 実装例{index}", "", "```python", *code, "```", "", _bullet(rng)])
+
+
+def _special_slide(rng: random.Random, index: int) -> str:
+    kind = rng.choice(["lead", "tinytext"])
+    if kind == "lead":
+        return f"<!-- _class: lead -->\n\n# {_sentence(rng, 1, 1)}"
+    refs = [f"- https://example.com/articles/{rng.randint(1, 9999)}" for _ in range(rng.randint(3, 15))]
+    return "\n".join(["<!-- _class: tinytext -->", "", "## 参考文献", "", *refs])
+
+
+_STYLES = {
+    "cjk_prose": [_bullet_slide, _prose_slide],
+    "wide_tables": [_table_slide, _bullet_slide],
+    "code_blocks": [_code_slide, _prose_slide],
+    "mixed": [_bullet_slide, _prose_slide, _table_slide, _code_slide, _special_slide],
+}
+
+
+def build_deck(style: str, slide_count: int, seed: int) -> str:
+    """指定スタイル・枚数のデッキを生成（タイトルと裏表紙を含む）"""
+    rng = random.Random(seed)
+    builders = _STYLES[style]
+    slides = [f"<!-- _class: top --><!-- _paginate: skip -->\n\n# {_sentence(rng, 1, 1)}\n\n2026年版"]
+    for index in range(2, slide_count):
+        slides.append(rng.choice(builders)(rng, index))
+    slides.append("<!-- _class: end --><!-- _paginate: skip -->\n\n# Thank you!")
+    return FRONTMATTER + "\n\n---\n\n".join(slides[:slide_count]) + "\n"
+
+
+def build_corpus() -> list[tuple[str, str]]:
+    """（名前, マークダウン）のリストで実運用相当のデッキ群を返す"""
+    corpus = []
+    for style in _STYLES:
+        for slide_count in (5, 10, 30, 100, 300):
+            name = f"{style}-{slide_count}"
+            corpus.append((name, build_deck(style, slide_count, seed=hash_seed(name))))
+    return corpus
+
+
+def hash_seed(name: str) -> int:
+    """名前から実行ごとに変わらないシード値を作る（hash()はプロセスごとに変わるため使わない）"""
+    return sum((i + 1) * ord(c) for i, c in enumerate(name))
+
+
+def build_pathological() -> list[tuple[str, str]]:
+    """正規表現のバックトラックを誘発しやすい入力"""
+    n = 4000
+    return [
+        ("unclosed-links", FRONTMATTER + "## リンク\n\n- " + "[a](" * n),
+        ("unclosed-brackets", FRONTMATTER + "## 括弧\n\n- " + "[あ" * n),
+        ("lone-emphasis", FRONTMATTER + "## 強調\n\n- " + "*あ_い`う~~" * n),
+        ("nested-bold", FRONTMATTER + "## 太字\n\n- " + "**" * n + "本文"),
+        ("wide-separator", FRONTMATTER + "## 表\n\n|" + "-:" * n + "|\n| a |"),
+        ("long-heading-space", FRONTMATTER + "##" + " " * n + "見出し"),
+        ("many-separators", FRONTMATTER + "---\n" * n),
+        ("unclosed-frontmatter", "---\nmarp: true\n" + "本文\n" * n),
+        ("single-huge-line", FRONTMATTER + "## 長文\n\n" + "あ" * (n * 10)),
+        ("comment-runs", FRONTMATTER + "<!--" + "-->" * n),
+    ]
+
+
+# 構成チェックはモデル種別・ユーザー指示で結果が変わるため、代表的な設定ごとに記録する
+VALIDATION_SETTINGS = [
+    ("sonnet", "資料を作って"),
+    ("kimi", "10枚で作って"),
+    ("sol", "アジェンダを含めて作って"),
+]
+
+
+def collect_verdicts(markdown: str) -> dict:
+    """デッキに対する検証結果（あふれ・構成違反）をJSON化できる形で返す"""
+    from tools.output_slide import (
+        _check_slide_overflow,
+        _check_slide_structure,
+        configure_slide_validation,
+        reset_generated_markdown,
+    )
+
+    verdicts = {"overflow": _check_slide_overflow(markdown)}
+    for model_type, user_message in VALIDATION_SETTINGS:
+        reset_generated_markdown()
+        configure_slide_validation(user_message, model_type)
+        verdicts[f"structure:{model_type}"] = _check_slide_structure(markdown)
+    reset_generated_markdown()
+    return verdicts
@@ -0,0 +1,165 @@
+"""invoke のストリーミング処理のテスト（モデル・ツールはローカルで再現）"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import agent
+from tools.output_slide import output_slide
+
+SLIDE_MARKDOWN = "---\nmarp: true\n---\n\n## テスト\n\n- 項目"
+
+
+class FakeAgent:
+    """Strands Agentのstream_asyncを模したスクリプト実行エージェント"""
+
+    def __init__(self, script):
+        self.messages = []
+        self._script = script
+
+    async def stream_async(self, prompt, cancel_signal=None):
+        async for event in self._script():
+            yield event
+
+
+def run_invoke(fake_agent, payload=None):
+    """invokeを実行し、（経過秒, イベント）のリストを返す"""
+
+    async def collect():
+        events = []
+        start = time.perf_counter()
+        async for event in agent.invoke(payload or {"prompt": "スライドを作って"}):
+            events.append((time.perf_counter() - start, event))
+        return events
+
+    with patch("agent.get_or_create_agent", return_value=fake_agent):
+        return asyncio.run(collect())
+
+
+def test_markdown_is_sent_as_soon_as_output_slide_accepts():
+    """output_slideの受け入れ直後に、次のモデルイベントを待たずmarkdownを送る"""
+
+    async def script():
+        yield {"data": "作成します"}
+        yield {"current_tool_use": {"name": "output_slide", "input": ""}}
+        await asyncio.to_thread(output_slide, markdown=SLIDE_MARKDOWN)
+        await asyncio.sleep(0.3)
+        yield {"data": "完成しました"}
+
+    events = run_invoke(FakeAgent(script))
+
+    types = [event["type"] for _, event in events]
+    assert types == ["text", "tool_use", "markdown", "done"]
+    markdown_elapsed = next(t for t, event in events if event["type"] == "markdown")
+    assert markdown_elapsed < 0.25
+    assert events[2][1]["data"] == SLIDE_MARKDOWN
+
+
+def test_markdown_accepted_at_end_of_stream_is_sent_once():
+    """ストリーム終了直前に受け入れたスライドも1回だけ送る"""
+
+    async def script():
+        yield {"current_tool_use": {"name": "output_slide", "input": ""}}
+        await asyncio.to_thread(output_slide, markdown=SLIDE_MARKDOWN)
+        return
+        yield
+
+    events = run_invoke(FakeAgent(script))
+
+    assert [event["type"] for _, event in events].count("markdown") == 1
+    assert events[-1][1] == {"type": "done"}
+
+
+def test_text_is_streamed_when_no_slide_is_generated():
+    """スライドを出力しない応答はテキストを送る（連続したdeltaは1イベントにまとめる）"""
+
+    async def script():
+        yield {"data": "こんにちは"}
+        yield {"data": "！"}
+
+    events = run_invoke(FakeAgent(script))
+
+    assert [event for _, event in events] == [
+        {"type": "text", "data": "こんにちは！"},
+        {"type": "done"},
+    ]
+
+
+def test_buffered_text_is_sent_when_latency_budget_expires():
+    """次のdeltaが届かなくても、待ち時間の予算を過ぎたら溜まったテキストを送る"""
+
+    async def script():
+        yield {"data": "考え"}
+        yield {"data": "中"}
+        await asyncio.sleep(0.3)
+        yield {"data": "です"}
+
+    events = run_invoke(FakeAgent(script))
+
+    texts = [(elapsed, event["data"]) for elapsed, event in events if event["type"] == "text"]
+    assert [text for _, text in texts] == ["考え中", "です"]
+    assert texts[0][0] < 0.2
+
+
+def test_buffered_text_is_flushed_before_tool_use():
+    """ツール呼び出しの前に溜まったテキストを送り、送信順序を保つ"""
+
+    async def script():
+        yield {"data": "調べ"}
+        yield {"data": "ます"}
+        yield {"current_tool_use": {"name": "web_search", "input": {"query": "AgentCore"}}}
+
+    events = [event for _, event in run_invoke(FakeAgent(script))]
+
+    assert events[:2] == [
+        {"type": "text", "data": "調べます"},
+        {"type": "tool_use", "data": "web_search", "query": "AgentCore"},
+    ]
+
+
+def test_slides_are_streamed_while_output_slide_input_is_generated():
+    """output_slideの入力生成中に、完成したスライドから順にslide_partialを送る"""
+    raw = '{"markdown": "---\\nmarp: true\\n---\\n\\n# 表紙\\n\\n---\\n\\n## 本文\\n\\n- 項目"}'
+
+    async def script():
+        for end in range(8, len(raw) + 8, 8):
+            yield {"current_tool_use": {"toolUseId": "t1", "name": "output_slide", "input": raw[:end]}}
+
+    events = [event for _, event in run_invoke(FakeAgent(script))]
+
+    partials = [event for event in events if event["type"] == "slide_partial"]
+    assert partials == [
+        {"type": "slide_partial", "index": 1, "data": "# 表紙", "frontmatter": "---\nmarp: true\n---\n\n"},
+        {"type": "slide_partial", "index": 2, "data": "## 本文\n\n- 項目", "frontmatter": "---\nmarp: true\n---\n\n"},
+    ]
+
+
+def test_slide_partials_restart_for_each_output_slide_call():
+    """リトライで別のツール呼び出しになった場合は1枚目から送り直す"""
+
+    async def script():
+        yield {"current_tool_use": {"toolUseId": "t1", "name": "output_slide", "input": '{"markdown": "# 初版"}'}}
+        yield {"current_tool_use": {"toolUseId": "t2", "name": "output_slide", "input": '{"markdown": "# 修正版"}'}}
+
+    events = [event for _, event in run_invoke(FakeAgent(script))]
+
+    partials = [(event["index"], event["data"]) for event in events if event["type"] == "slide_partial"]
+    assert partials == [(1, "# 初版"), (1, "# 修正版")]
+
+
+def test_session_snapshot_is_serialized_off_the_event_loop():
+    """会話履歴のJSON化（スナップショットの保存）はイベントループのスレッドで行わない"""
+    saved_on = []
+
+    async def script():
+        yield {"data": "こんにちは"}
+
+    def record_thread(session_id, saved_agent):
+        saved_on.append(threading.current_thread())
+
+    with patch("agent.save_session_snapshot", side_effect=record_thread):
+        run_invoke(FakeAgent(script))
+
+    assert len(saved_on) == 1
+    assert saved_on[0] is not threading.main_thread()
@@ -0,0 +1,141 @@
+"""会話履歴の圧縮（推定トークン数の上限・置き換え済みスライドの参照化）のテスト"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from session.conversation import SUMMARY_MARK, TokenBudgetConversationManager, compact_history, estimate_tokens
+
+
+def _deck(*titles: str, body: str = "本文") -> str:
+    slides = [f"# {titles[0]}"] + [f"## {title}\n\n- {body * 20}" for title in titles[1:]]
+    return "---\nmarp: true\ntheme: border\n---\n\n" + "\n\n---\n\n".join(slides) + "\n"
+
+
+def _user(text: str) -> dict:
+    return {"role": "user", "content": [{"text": text}]}
+
+
+def _tool_round(tool_use_id: str, name: str, tool_input: dict, result: str) -> list[dict]:
+    return [
+        {"role": "assistant", "content": [{"toolUse": {"toolUseId": tool_use_id, "name": name, "input": tool_input}}]},
+        {"role": "user", "content": [{"toolResult": {"toolUseId": tool_use_id, "status": "success",
+                                                     "content": [{"text": result}]}}]},
+    ]
+
+
+SEARCH_RESULT = "\n\n---\n\n".join(
+    f"**記事{n}**\n{'生成AIの導入事例の詳細な説明。' * 30}\nURL: https://example.com/{n}" for n in range(3)
+)
+
+
+def _history() -> list[dict]:
+    """検索して作成 → 全文で作り直し → パッチで修正 の3ターン"""
+    return [
+        _user("生成AIの事例をスライドにして"),
+        *_tool_round("s1", "web_search", {"query": "生成AI 事例"}, SEARCH_RESULT),
+        *_tool_round("o1", "output_slide", {"markdown": _deck("生成AI事例", "背景", "事例A")}, "スライドを出力しました。"),
+        {"role": "assistant", "content": [{"text": "作成しました"}]},
+        _user("事例Bを追加して"),
+        *_tool_round("o2", "output_slide", {"markdown": _deck("生成AI事例", "背景", "事例A", "事例B")},
+                     "スライドを出力しました。"),
+        {"role": "assistant", "content": [{"text": "追加しました"}]},
+        _user("3枚目を短くして"),
+        *_tool_round("p1", "patch_slides", {"patches": [{"op": "replace", "slide": 3, "markdown": "## 事例A\n\n- 短く"}]},
+                     "スライドを出力しました（1件のパッチを適用）。"),
+        {"role": "assistant", "content": [{"text": "修正しました"}]},
+    ]
+
+
+def _just_over_budget(messages: list[dict]) -> int:
+    """履歴がわずかに上限を超える予算（上限内の履歴は圧縮しないため）"""
+    return estimate_tokens(messages) - 1
+
+
+def _tool_input(messages: list[dict], tool_use_id: str) -> dict:
+    for message in messages:
+        for block in message["content"]:
+            if block.get("toolUse", {}).get("toolUseId") == tool_use_id:
+                return block["toolUse"]["input"]
+    raise KeyError(tool_use_id)
+
+
+def _tool_result_text(messages: list[dict], tool_use_id: str) -> str:
+    for message in messages:
+        for block in message["content"]:
+            if block.get("toolResult", {}).get("toolUseId") == tool_use_id:
+                return block["toolResult"]["content"][0]["text"]
+    raise KeyError(tool_use_id)
+
+
+def test_superseded_deck_becomes_outline_and_latest_deck_is_kept():
+    messages = _history()
+    latest_deck = _tool_input(messages, "o2")["markdown"]
+
+    compact_history(messages, budget=_just_over_budget(messages))
+
+    assert _tool_input(messages, "o1")["markdown"].endswith("3枚: 「生成AI事例」「背景」「事例A」")
+    assert _tool_input(messages, "o2")["markdown"] == latest_deck
+    # 最新の全文より後のパッチは、最新のスライドの一部なのでそのまま残す
+    assert _tool_input(messages, "p1")["patches"][0]["markdown"] == "## 事例A\n\n- 短く"
+
+
+def test_old_search_results_keep_titles_and_urls():
+    messages = _history()
+
+    compact_history(messages, budget=_just_over_budget(messages))
+
+    summary = _tool_result_text(messages, "s1")
+    assert summary.startswith(SUMMARY_MARK)
+    assert "**記事0**" in summary and "URL: https://example.com/2" in summary
+    assert len(summary) < len(SEARCH_RESULT) / 4
+
+
+def test_latest_turn_results_are_not_summarized():
+    """直前のターンのツール結果は、次のターンで使われるためそのまま残す"""
+    messages = [_user("調べて"), *_tool_round("s1", "web_search", {"query": "q"}, SEARCH_RESULT)]
+
+    compact_history(messages, budget=_just_over_budget(messages))
+
+    assert _tool_result_text(messages, "s1") == SEARCH_RESULT
+
+
+def test_history_within_budget_is_left_unchanged():
+    """上限内なら書き換えない（キャッシュした履歴のプレフィックスを毎ターン変えないため）"""
+    messages = _history()
+
+    assert compact_history(messages, budget=100000) == 0
+    assert messages == _history()
+
+
+def test_compaction_is_idempotent():
+    messages = _history()
+    budget = _just_over_budget(messages)
+    compact_history(messages, budget=budget)
+    compacted = estimate_tokens(messages)
+
+    compact_history(messages, budget=budget)
+
+    assert estimate_tokens(messages) == compacted
+
+
+def test_over_budget_drops_old_turns_but_keeps_latest_deck_turn():
+    messages = _history()
+
+    removed = compact_history(messages, budget=1)
+
+    # 先頭のターンだけ削除され、最新の全文を含むターンと直前のターンは残る
+    assert removed == 6
+    assert messages[0] == _user("事例Bを追加して")
+    assert _tool_input(messages, "o2")["markdown"].startswith("---\nmarp: true")
+
+
+def test_manager_reports_compaction_and_removed_messages():
+    recorded = []
+    manager = TokenBudgetConversationManager(token_budget=1)
+    agent = SimpleNamespace(messages=_history())
+
+    with patch("session.conversation.count", lambda name, amount=1, **attrs: recorded.append(name)):
+        manager.apply_management(agent)
+
+    assert manager.removed_message_count == 6
+    assert recorded == ["conversation.compacted_tokens", "conversation.removed_messages"]
@@ -0,0 +1,98 @@
+"""負荷試験用の台本モデルのテスト"""
+
+import asyncio
+import json
+
+from loadtest.fake_model import FakeModelConfig, FakeStreamingModel, build_deck
+from tools.output_slide import _check_slide_overflow, _check_slide_structure, count_slides
+
+
+def _model(**overrides) -> FakeStreamingModel:
+    return FakeStreamingModel(FakeModelConfig(ttft=0, token_interval=0, seed=1, **overrides))
+
+
+def _tool_turn(tool_use_id: str, name: str, tool_input: dict, result: str) -> list[dict]:
+    return [
+        {"role": "assistant", "content": [{"toolUse": {"toolUseId": tool_use_id, "name": name, "input": tool_input}}]},
+        {"role": "user", "content": [{"toolResult": {"toolUseId": tool_use_id, "content": [{"text": result}]}}]},
+    ]
+
+
+def _collect(model: FakeStreamingModel, messages: list[dict]) -> list[dict]:
+    async def run():
+        return [event async for event in model.stream(messages)]
+
+    return asyncio.run(run())
+
+
+USER = {"role": "user", "content": [{"text": "スライドを作って"}]}
+
+
+def test_build_deck_passes_validation_unless_overflow():
+    deck = build_deck(10)
+    assert _check_slide_overflow(deck) == []
+    assert _check_slide_structure(deck) == []
+    assert count_slides(deck) == 10
+    violations = _check_slide_overflow(build_deck(10, overflow=True))
+    assert [(v["slide_number"], v["type"]) for v in violations] == [(2, "line_overflow")]
+
+
+def test_next_step_follows_search_retry_and_finish_script():
+    model = _model(overflow_retries=1)
+    messages = [USER]
+
+    _, tool, tool_input = model.next_step(messages)
+    assert tool == "web_search"
+
+    messages += _tool_turn("t1", "web_search", tool_input, "検索結果")
+    _, tool, tool_input = model.next_step(messages)
+    assert tool == "output_slide"
+    assert _check_slide_overflow(tool_input["markdown"])
+
+    messages += _tool_turn("t2", "output_slide", tool_input, "[REJECTED] はみ出し")
+    _, tool, tool_input = model.next_step(messages)
+    assert tool == "output_slide"
+    assert _check_slide_overflow(tool_input["markdown"]) == []
+
+    messages += _tool_turn("t3", "output_slide", tool_input, "スライドを出力しました。")
+    text, tool, _ = model.next_step(messages)
+    assert tool is None
+    assert text
+
+
+def test_next_step_only_looks_at_current_turn():
+    model = _model(web_search=False, overflow_retries=0)
+    previous = [USER] + _tool_turn("t1", "output_slide", {"markdown": "x"}, "スライドを出力しました。")
+
+    _, tool, _ = model.next_step(previous + [{"role": "user", "content": [{"text": "もっと簡潔に"}]}])
+
+    assert tool == "output_slide"
+
+
+def test_stream_emits_converse_events_with_chunked_tool_input():
+    model = _model(web_search=False, overflow_retries=0, tool_chunk_chars=32)
+
+    events = _collect(model, [USER])
+
+    assert events[0] == {"messageStart": {"role": "assistant"}}
+    starts = [e["contentBlockStart"]["start"] for e in events if "contentBlockStart" in e]
+    assert starts[0] == {}
+    assert starts[1]["toolUse"]["name"] == "output_slide"
+    raw_input = "".join(
+        e["contentBlockDelta"]["delta"]["toolUse"]["input"]
+        for e in events
+        if "toolUse" in e.get("contentBlockDelta", {}).get("delta", {})
+    )
+    assert json.loads(raw_input)["markdown"] == build_deck(10)
+    assert {"messageStop": {"stopReason": "tool_use"}} in events
+    assert events[-1]["metadata"]["usage"]["outputTokens"] > 0
+
+
+def test_stream_ends_turn_after_accepted_slide():
+    model = _model()
+    messages = [USER] + _tool_turn("t1", "output_slide", {"markdown": "x"}, "スライドを出力しました。")
+
+    events = _collect(model, messages)
+
+    assert {"messageStop": {"stopReason": "end_turn"}} in events
+    assert not any("toolUse" in e.get("contentBlockStart", {}).get("start", {}) for e in events)
@@ -5,6 +5,7 @@ import pytest
 import config
 from config import (
     ENABLED_MODEL_TYPES,
+    env_number,
     get_model_config,
     get_system_prompt,
     normalize_model_type,
@@ -47,8 +48,7 @@ def test_get_model_config_uses_kimi_without_prompt_cache(monkeypatch):
     assert model_config == {
         "provider": "bedrock",
         "model_id": "moonshotai.kimi-k2.5",
-        "cache_prompt": None,
-        "cache_tools": None,
+        "prompt_cache": False,
     }
 
 
@@ -75,8 +75,7 @@ def test_get_model_config_uses_sonnet5_with_prompt_cache(monkeypatch):
     assert model_config == {
         "provider": "bedrock",
         "model_id": "sonnet5-profile-arn",
-        "cache_prompt": "default",
-        "cache_tools": "default",
+        "prompt_cache": True,
     }
 
 
@@ -89,8 +88,7 @@ def test_get_model_config_uses_glm_without_prompt_cache(monkeypatch):
     assert model_config == {
         "provider": "bedrock",
         "model_id": "zai.glm-5",
-        "cache_prompt": None,
-        "cache_tools": None,
+        "prompt_cache": False,
     }
 
 
@@ -200,3 +198,20 @@ def test_sol_system_prompt_runs_research_and_slide_creation_without_questions():
     assert "同じ応答内でoutput_slideまで実行" in prompt
     assert "作成しますか" in prompt
     assert "OSS系モデル向け" not in prompt
+
+
+@pytest.mark.parametrize(
+    ("value", "kwargs", "expected"),
+    [
+        ("", {}, 10),
+        ("25", {}, 25),
+        ("-3", {}, 0),
+        ("-3", {"minimum": None}, -3),
+        ("0", {"minimum": 1}, 1),
+        ("1.5", {"cast": float}, 1.5),
+        ("many", {}, 10),
+    ],
+)
+def test_env_number_reads_clamps_and_falls_back(monkeypatch, value, kwargs, expected):
+    monkeypatch.setenv("TEST_ENV_NUMBER", value)
+    assert env_number("TEST_ENV_NUMBER", 10, **kwargs) == expected
@@ -4,6 +4,8 @@ import sys
 from types import ModuleType
 from unittest.mock import MagicMock
 
+import pytest
+
 conversation_manager_module = ModuleType("strands.agent.conversation_manager")
 conversation_manager_module.SlidingWindowConversationManager = MagicMock()
 sys.modules["strands.agent"] = ModuleType("strands.agent")
@@ -14,6 +16,18 @@ openai_responses_module.OpenAIResponsesModel = MagicMock()
 sys.modules["strands.models.openai_responses"] = openai_responses_module
 
 import session.manager as manager
+import session.model_pool as model_pool
+
+BOTO_CONFIG = object()
+HTTP_CLIENT = object()
+
+
+@pytest.fixture(autouse=True)
+def shared_clients(monkeypatch):
+    """共有モデルをテストごとに空にし、botocore / httpx の設定は番兵に差し替える"""
+    monkeypatch.setattr(model_pool, "_models", {})
+    monkeypatch.setattr(manager, "bedrock_client_config", lambda: BOTO_CONFIG)
+    monkeypatch.setattr(manager, "mantle_http_client", lambda: HTTP_CLIENT)
 
 
 def test_create_model_uses_bedrock_provider_for_sonnet(monkeypatch):
@@ -25,21 +39,143 @@ def test_create_model_uses_bedrock_provider_for_sonnet(monkeypatch):
 
     bedrock_model.assert_called_once_with(
         model_id="sonnet-profile-arn",
-        cache_prompt="default",
         cache_tools="default",
+        boto_client_config=BOTO_CONFIG,
     )
 
 
+def test_create_model_shares_client_per_model_id(monkeypatch):
+    """同じモデルIDのセッションは1つのモデルクライアントを共有し、モデルが違えば別に作る"""
+    monkeypatch.setenv("BEDROCK_SONNET_MODEL_ID", "sonnet-profile-arn")
+    monkeypatch.setenv("BEDROCK_KIMI_MODEL_ID", "kimi-model")
+    bedrock_model = MagicMock(side_effect=lambda **kwargs: MagicMock(kwargs=kwargs))
+    monkeypatch.setattr(manager, "BedrockModel", bedrock_model)
+
+    first = manager._create_model("sonnet")
+    second = manager._create_model("sonnet")
+    kimi = manager._create_model("kimi")
+
+    assert first is second
+    assert kimi is not first
+    assert kimi.kwargs == {"model_id": "kimi-model", "boto_client_config": BOTO_CONFIG}
+    assert bedrock_model.call_count == 2
+
+
 def test_create_model_uses_mantle_responses_provider_for_sol(monkeypatch):
     monkeypatch.setenv("BEDROCK_SOL_MODEL_ID", "openai.gpt-5.6-sol")
     monkeypatch.setenv("BEDROCK_MANTLE_REGION", "us-east-1")
     responses_model = MagicMock()
-    monkeypatch.setattr(manager, "OpenAIResponsesModel", responses_model)
+    monkeypatch.setattr(openai_responses_module, "OpenAIResponsesModel", responses_model)
 
     manager._create_model("sol")
 
     responses_model.assert_called_once_with(
         model_id="openai.gpt-5.6-sol",
         bedrock_mantle_config={"region": "us-east-1"},
+        client_args={"http_client": HTTP_CLIENT},
         params={"max_output_tokens": 32768},
     )
+
+
+def test_create_model_uses_fake_provider_for_load_test(monkeypatch):
+    monkeypatch.setenv("AGENT_MODEL_PROVIDER", "fake")
+    monkeypatch.setenv("FAKE_MODEL_TTFT_MS", "50")
+    bedrock_model = MagicMock()
+    monkeypatch.setattr(manager, "BedrockModel", bedrock_model)
+
+    model = manager._create_model("opus")
+
+    bedrock_model.assert_not_called()
+    assert model.config["model_id"] == "fake-opus"
+    assert model.settings.ttft == 0.05
+
+
+def test_fake_model_ignores_invalid_env_values(monkeypatch):
+    """読めない・範囲外の FAKE_MODEL_* は既定値・下限にして負荷試験を止めない"""
+    from loadtest.fake_model import config_from_env
+
+    monkeypatch.setenv("FAKE_MODEL_TTFT_MS", "abc")
+    monkeypatch.setenv("FAKE_MODEL_TOKEN_MS", "2.5")
+    monkeypatch.setenv("FAKE_MODEL_TEXT_CHUNK_CHARS", "0")
+    monkeypatch.setenv("FAKE_MODEL_SLIDES", "1.5")
+
+    config = config_from_env("sonnet")
+
+    assert config.ttft == 0.8
+    assert config.token_interval == 0.0025
+    assert config.text_chunk_chars == 1
+    assert config.slide_count == 10
+
+
+class FakeAgent:
+    """strands.Agent の代わり（履歴・state・モデル・システムプロンプトだけを持つ）"""
+
+    def __init__(self, model, system_prompt, tools, conversation_manager):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.messages = []
+        values = {}
+        self.state = MagicMock(get=values.get, set=values.__setitem__)
+
+
+@pytest.fixture
+def session_agents(monkeypatch):
+    from session.store import SessionStore
+
+    monkeypatch.setenv("BEDROCK_SONNET_MODEL_ID", "sonnet-profile-arn")
+    monkeypatch.setenv("BEDROCK_KIMI_MODEL_ID", "kimi-model")
+    store = SessionStore(max_entries=10, memory_bytes=10 * 1024 * 1024, idle_ttl=60)
+    monkeypatch.setattr(manager, "get_session_store", lambda: store)
+    monkeypatch.setattr(manager, "Agent", FakeAgent)
+    monkeypatch.setattr(manager, "_create_model", lambda model_type: f"model:{model_type}")
+    return store
+
+
+def test_switching_model_keeps_history_and_strips_reasoning(session_agents):
+    """モデルを切り替えても同じAgentを使い、推論ブロックだけを除いて履歴を引き継ぐ"""
+    agent = manager.get_or_create_agent("session-1", "sonnet")
+    # キャッシュするモデルはシステムプロンプトの末尾にキャッシュポイントを置く
+    assert agent.system_prompt == [
+        {"text": manager.get_system_prompt(None, "sonnet")}, {"cachePoint": {"type": "default"}},
+    ]
+    agent.messages = [
+        {"role": "user", "content": [{"text": "AWSの紹介スライドを作って"}]},
+        {"role": "assistant", "content": [
+            {"reasoningContent": {"reasoningText": {"text": "考え中", "signature": "sig"}}},
+            {"text": "作成しました"},
+        ]},
+        {"role": "user", "content": [{"text": "もう少し簡潔に"}]},
+        {"role": "assistant", "content": [{"reasoningContent": {"reasoningText": {"text": "...", "signature": "s"}}}]},
+    ]
+
+    switched = manager.get_or_create_agent("session-1", "kimi")
+
+    assert switched is agent
+    assert switched.model == "model:kimi"
+    assert switched.state.get("model_type") == "kimi"
+    assert switched.system_prompt == manager.get_system_prompt(None, "kimi")
+    assert [message["content"] for message in switched.messages[1:]] == [
+        [{"text": "作成しました"}],
+        [{"text": "もう少し簡潔に"}],
+        [{"text": "（省略）"}],
+    ]
+
+
+def test_same_model_reuses_agent_without_touching_history(session_agents):
+    agent = manager.get_or_create_agent("session-1", "sonnet")
+    reasoning = {"role": "assistant", "content": [{"reasoningContent": {"reasoningText": {"text": "x"}}}]}
+    agent.messages = [reasoning]
+
+    assert manager.get_or_create_agent("session-1", "sonnet") is agent
+    assert agent.messages == [reasoning]
+    assert manager.get_or_create_agent("session-2", "sonnet") is not agent
+
+
+def test_system_prompt_without_theme_defers_to_turn_context():
+    from config import format_turn_context
+
+    prompt = manager.get_system_prompt(None, "sonnet")
+
+    assert "theme: " not in prompt
+    assert "[テーマ: ...]" in prompt
+    assert format_turn_context("gaia", "もう少し簡潔に") == "[テーマ: gaia]\nもう少し簡潔に"
@@ -0,0 +1,235 @@
+"""モデルのフォールバック・ヘッジ（session/model_router.py）のテスト"""
+
+import asyncio
+import threading
+
+import pytest
+
+import session.model_router as model_router
+from session.model_router import ModelRouter, RoutedTurn, get_model_router, is_throttling_error
+
+
+class ModelThrottledException(Exception):
+    pass
+
+
+class FakeAgent:
+    """スクリプトどおりにイベントを返す Agent（stream_async だけを持つ）"""
+
+    def __init__(self, model_type, script):
+        self.model_type = model_type
+        self.messages = [{"role": "user", "content": [{"text": "前のターン"}]}]
+        self.script = script
+        self.cancel_signal = None
+
+    async def stream_async(self, prompt, cancel_signal=None):
+        self.cancel_signal = cancel_signal
+        self.messages.append({"role": "user", "content": [{"text": prompt}]})
+        async for event in self.script(cancel_signal):
+            yield event
+
+
+@pytest.fixture
+def forks(monkeypatch):
+    """代わりのモデルのAgentを台本で差し替え、セッションの差し替えを記録する"""
+    scripts = {}
+    replaced = []
+
+    def fork_agent(agent, model_type, history_end):
+        forked = FakeAgent(model_type, scripts[model_type])
+        forked.messages = list(agent.messages[:history_end])
+        return forked
+
+    monkeypatch.setattr(model_router, "fork_agent", fork_agent)
+    monkeypatch.setattr(model_router, "replace_session_agent", lambda session_id, agent: replaced.append(agent))
+    return scripts, replaced
+
+
+def run_turn(turn, prompt="スライドを作って"):
+    async def collect():
+        return [event async for event in turn.stream(prompt)]
+
+    return asyncio.run(collect())
+
+
+def test_router_is_disabled_without_fallbacks_and_ignores_invalid_pairs(monkeypatch):
+    monkeypatch.setattr(model_router, "_router", None)
+    monkeypatch.setattr(model_router, "_router_created", False)
+    monkeypatch.delenv("MODEL_FALLBACKS", raising=False)
+    assert get_model_router() is None
+
+    monkeypatch.setattr(model_router, "_router_created", False)
+    monkeypatch.setenv("MODEL_FALLBACKS", "sonnet:kimi, kimi:glm, opus:sonnet, sol:sol")
+    monkeypatch.setenv("MODEL_HEDGE_AFTER_MS", "2500")
+    router = get_model_router()
+    assert router.fallbacks == {"sonnet": "kimi"}
+    assert router.hedge_delay("sonnet") == 2.5
+    assert router.hedge_delay("kimi") is None
+
+
+def test_throttled_model_is_rerouted_until_cooldown_ends():
+    now = [0.0]
+    router = ModelRouter({"sonnet": "kimi"}, cooldown=60, clock=lambda: now[0])
+
+    router.record_error("sonnet", throttled=True)
+    assert router.choose("sonnet") == "kimi"
+    # 代わりのモデルも不調なら元のモデルのまま
+    router.record_throttle("kimi")
+    assert router.choose("sonnet") == "sonnet"
+
+    now[0] = 61.0
+    assert router.choose("sonnet") == "sonnet"
+
+
+def test_high_error_rate_marks_model_unhealthy():
+    router = ModelRouter({"sonnet": "kimi"})
+    for _ in range(3):
+        router.record_first_token("sonnet", 1.0)
+    for _ in range(3):
+        router.record_error("sonnet")
+
+    assert not router.is_healthy("sonnet")
+    assert router.choose("sonnet") == "kimi"
+
+
+def test_auto_hedge_delay_follows_recent_p95():
+    router = ModelRouter({"sonnet": "kimi"}, hedge_after="auto")
+    assert router.hedge_delay("sonnet") == model_router.DEFAULT_AUTO_HEDGE_SECONDS
+
+    for ttft in [1.5, 2.0, 2.5, 3.0, 4.0, 9.0]:
+        router.record_first_token("sonnet", ttft)
+    assert router.hedge_delay("sonnet") == 9.0
+
+    fast = ModelRouter({"sonnet": "kimi"}, hedge_after="auto")
+    for _ in range(5):
+        fast.record_first_token("sonnet", 0.1)
+    assert fast.hedge_delay("sonnet") == model_router.MIN_HEDGE_SECONDS
+
+
+def test_throttling_errors_are_detected():
+    assert is_throttling_error(ModelThrottledException("rate limited"))
+    assert is_throttling_error(RuntimeError("An error occurred (ThrottlingException) when calling ConverseStream"))
+    assert not is_throttling_error(RuntimeError("ValidationException"))
+
+
+def test_error_before_output_fails_over_to_fallback(forks):
+    """初回出力の前の失敗は、ターン開始時点の履歴で代わりのモデルがやり直す"""
+    scripts, replaced = forks
+
+    async def throttled(cancel_signal):
+        yield {"init_event_loop": True}
+        raise ModelThrottledException("Too many requests")
+
+    async def answer(cancel_signal):
+        yield {"init_event_loop": True}
+        yield {"data": "作成します"}
+
+    scripts["kimi"] = answer
+    router = ModelRouter({"sonnet": "kimi"})
+    primary = FakeAgent("sonnet", throttled)
+    switched = []
+    turn = RoutedTurn(router, "session-1", primary, "sonnet", on_switch=switched.append)
+
+    events = run_turn(turn)
+
+    # 保留していたイベントは採用した試行の分だけ送る
+    assert events == [{"init_event_loop": True}, {"data": "作成します"}]
+    assert turn.model_type == "kimi" and turn.agent is replaced[0]
+    assert switched == ["kimi"]
+    # 代わりのモデルは失敗したターンのユーザーメッセージを含まない履歴から始める
+    assert [message["content"][0]["text"] for message in turn.agent.messages] == ["前のターン", "スライドを作って"]
+    assert router.choose("sonnet") == "kimi"
+
+
+def test_hedge_starts_fallback_and_first_output_wins(forks):
+    scripts, replaced = forks
+
+    async def slow(cancel_signal):
+        yield {"init_event_loop": True}
+        while not cancel_signal.is_set():
+            await asyncio.sleep(0.01)
+
+    async def fast(cancel_signal):
+        yield {"data": "ヘッジ側の応答"}
+        yield {"data": "続き"}
+
+    scripts["kimi"] = fast
+    router = ModelRouter({"sonnet": "kimi"}, hedge_after=0.05)
+    primary = FakeAgent("sonnet", slow)
+    turn = RoutedTurn(router, "session-1", primary, "sonnet")
+
+    events = run_turn(turn)
+
+    assert events == [{"data": "ヘッジ側の応答"}, {"data": "続き"}]
+    assert turn.model_type == "kimi"
+    # 採用しなかったほうには中断を伝え、中断までの時間はTTFTとして記録しない
+    assert primary.cancel_signal.is_set()
+    assert len(replaced) == 1
+    assert list(router._get("sonnet").samples) == []
+    assert len(router._get("kimi").samples) == 1
+
+
+def test_primary_output_before_hedge_keeps_primary(forks):
+    scripts, replaced = forks
+
+    async def answer(cancel_signal):
+        yield {"data": "すぐ応答"}
+        await asyncio.sleep(0.1)
+        yield {"data": "続き"}
+
+    router = ModelRouter({"sonnet": "kimi"}, hedge_after=0.05)
+    primary = FakeAgent("sonnet", answer)
+    turn = RoutedTurn(router, "session-1", primary, "sonnet")
+
+    events = run_turn(turn)
+
+    assert events == [{"data": "すぐ応答"}, {"data": "続き"}]
+    assert turn.agent is primary and replaced == []
+
+
+def test_error_after_output_is_raised(forks):
+    """出力を送った後の失敗はやり直さない（同じ内容を二重に送らないため）"""
+
+    async def fails_midway(cancel_signal):
+        yield {"data": "途中まで"}
+        raise RuntimeError("stream broken")
+
+    router = ModelRouter({"sonnet": "kimi"})
+    turn = RoutedTurn(router, None, FakeAgent("sonnet", fails_midway), "sonnet")
+    received = []
+
+    async def collect():
+        async for event in turn.stream("作って"):
+            received.append(event)
+
+    with pytest.raises(RuntimeError, match="stream broken"):
+        asyncio.run(collect())
+    assert received == [{"data": "途中まで"}]
+
+
+def test_request_cancel_reaches_every_attempt(forks):
+    scripts, _ = forks
+    cancel_event = threading.Event()
+    seen = []
+
+    async def waits(cancel_signal):
+        seen.append(cancel_signal)
+        while not cancel_signal.is_set():
+            await asyncio.sleep(0.01)
+        return
+        yield
+
+    scripts["kimi"] = waits
+    router = ModelRouter({"sonnet": "kimi"}, hedge_after=0.01)
+    turn = RoutedTurn(router, None, FakeAgent("sonnet", waits), "sonnet", cancel_event)
+
+    async def cancel_soon():
+        await asyncio.sleep(0.1)
+        cancel_event.set()
+
+    async def main():
+        asyncio.get_running_loop().create_task(cancel_soon())
+        return [event async for event in turn.stream("作って")]
+
+    assert asyncio.run(main()) == []
+    assert len(seen) == 2 and all(signal.is_set() for signal in seen)
@@ -4,8 +4,10 @@ import pytest
 from tools.output_slide import (
     configure_slide_validation,
     output_slide,
+    patch_slides,
     get_generated_markdown,
     reset_generated_markdown,
+    set_current_markdown,
     _parse_slides,
     _count_content_lines,
     _check_slide_overflow,
@@ -408,7 +410,7 @@ class TestOutputSlideStructureValidation:
 
         result = output_slide(markdown=md)
 
-        assert "11枚（指定は10枚）" in result
+        assert "全体 slide_count 11/10枚" in result
         assert get_generated_markdown() is None
 
     @pytest.mark.parametrize("model_type", ["kimi", "sol"])
@@ -420,7 +422,7 @@ class TestOutputSlideStructureValidation:
 
         result = output_slide(markdown=md)
 
-        assert "11枚（上限は10枚）" in result
+        assert "全体 slide_count_max 11/10枚" in result
         assert get_generated_markdown() is None
 
     @pytest.mark.parametrize("model_type", ["kimi", "sol"])
@@ -457,7 +459,7 @@ class TestOutputSlideStructureValidation:
 
         result = output_slide(markdown=md)
 
-        assert "アジェンダ・目次は指定されていません" in result
+        assert "S1 unrequested_agenda" in result
 
     def test_allows_explicitly_requested_agenda(self):
         reset_generated_markdown()
@@ -478,7 +480,7 @@ class TestOutputSlideStructureValidation:
         configure_slide_validation("資料を作って", "sonnet")
         sonnet_result = output_slide(markdown=md)
 
-        assert "太字が2か所" in kimi_result
+        assert "S1 bold_overuse 2/1か所" in kimi_result
         assert sonnet_result == "スライドを出力しました。"
 
     def test_rejects_three_consecutive_kimi_bullet_slides(self):
@@ -489,7 +491,7 @@ class TestOutputSlideStructureValidation:
 
         result = output_slide(markdown=md)
 
-        assert "bullets型が3枚連続" in result
+        assert "S3 pattern_repetition bullets型×3連続" in result
 
     def test_sonnet_keeps_existing_two_retry_limit(self):
         reset_generated_markdown()
@@ -501,3 +503,162 @@ class TestOutputSlideStructureValidation:
         result = output_slide(markdown=md)
 
         assert result == "スライドを出力しました。"
+
+
+class TestPatchSlides:
+    """patch_slides のテスト"""
+
+    BASE = "---\nmarp: true\ntheme: border\n---\n\n# タイトル\n\n---\n\n## 2枚目\n\n- 項目\n\n---\n\n## 3枚目\n\n- 項目"
+
+    def test_requires_current_markdown(self):
+        """現在のスライドがなければoutput_slideを促す"""
+        reset_generated_markdown()
+        result = patch_slides(patches=[{"op": "delete", "slide": 1}])
+        assert "output_slide" in result
+        assert get_generated_markdown() is None
+
+    def test_replace_insert_delete(self):
+        """元のスライド番号基準で置換・挿入・削除を適用する"""
+        reset_generated_markdown()
+        set_current_markdown(self.BASE)
+
+        result = patch_slides(patches=[
+            {"op": "replace", "slide": 2, "markdown": "## 新2枚目\n\n- 新項目"},
+            {"op": "insert", "slide": 3, "markdown": "## 追加\n\n- 追加項目"},
+            {"op": "delete", "slide": 1},
+        ])
+
+        assert result.startswith("スライドを出力しました")
+        markdown = get_generated_markdown()
+        assert markdown.startswith("---\nmarp: true\ntheme: border\n---\n")
+        assert _parse_slides(markdown) == [
+            "## 新2枚目\n\n- 新項目",
+            "## 3枚目\n\n- 項目",
+            "## 追加\n\n- 追加項目",
+        ]
+
+    def test_consecutive_patches_apply_to_latest_deck(self):
+        """受け入れたパッチの結果が次のパッチの適用元になる"""
+        reset_generated_markdown()
+        set_current_markdown(self.BASE)
+
+        first = patch_slides(patches=[{"op": "delete", "slide": 3}])
+        second = patch_slides(patches=[{"op": "replace", "slide": 2, "markdown": "## 最新"}])
+
+        assert _parse_slides(get_generated_markdown()) == ["# タイトル", "## 最新"]
+        # 結果には次のパッチで指定する番号（適用後のスライドの番号と見出し）を返す
+        assert first.endswith("現在のスライド（2枚）:\n1. タイトル\n2. 2枚目")
+        assert second.endswith("現在のスライド（2枚）:\n1. タイトル\n2. 最新")
+
+    def test_out_of_range_slide_rejected(self):
+        """存在しないスライド番号はエラーを返す"""
+        reset_generated_markdown()
+        set_current_markdown(self.BASE)
+
+        result = patch_slides(patches=[{"op": "replace", "slide": 9, "markdown": "## x"}])
+
+        assert "パッチの指定に誤りがあります" in result
+        assert get_generated_markdown() is None
+
+    def test_only_touched_slides_are_validated(self):
+        """あふれ検証は変更したスライドだけが対象"""
+        overflow = "\n".join(["## 見出し"] + [f"- 項目{i}" for i in range(1, 11)])
+        reset_generated_markdown()
+        set_current_markdown(f"---\nmarp: true\n---\n\n{overflow}\n\n---\n\n## 2枚目")
+
+        ok_result = patch_slides(patches=[{"op": "replace", "slide": 2, "markdown": "## 直した"}])
+        assert ok_result.startswith("スライドを出力しました")
+
+        ng_result = patch_slides(patches=[{"op": "replace", "slide": 2, "markdown": overflow}])
+        assert "パッチ1（replace slide=2） line_overflow" in ng_result
+        assert "S1 " not in ng_result
+        assert "patch_slides" in ng_result
+
+    def test_violations_name_the_patch_not_the_shifted_number(self):
+        """挿入・削除で番号がずれても、違反は呼び出し前の番号で書いたパッチで示す"""
+        overflow = "\n".join(["## 見出し"] + [f"- 項目{i}" for i in range(1, 11)])
+        reset_generated_markdown()
+        set_current_markdown(self.BASE)
+
+        result = patch_slides(patches=[
+            {"op": "delete", "slide": 1},
+            {"op": "insert", "slide": 3, "markdown": overflow},
+        ])
+
+        # 適用後は2枚目になるが、モデルが直すのはパッチ2（slide=3 の後への挿入）
+        assert "- パッチ2（insert slide=3） line_overflow" in result
+        assert "S2 " not in result
+        assert get_generated_markdown() is None
+
+    @pytest.mark.parametrize("number", [True, False, "2", 2.0])
+    def test_non_integer_slide_number_rejected(self, number):
+        """true / false や文字列はスライド番号として受け付けない（bool は int のサブクラス）"""
+        reset_generated_markdown()
+        set_current_markdown(self.BASE)
+
+        result = patch_slides(patches=[{"op": "delete", "slide": number}])
+
+        assert "slideには整数のスライド番号を指定してください" in result
+        assert get_generated_markdown() is None
+
+    def test_output_slide_updates_patch_base(self):
+        """output_slideで受け入れたスライドがパッチの適用元になる"""
+        reset_generated_markdown()
+        output_slide(markdown=self.BASE)
+
+        patch_slides(patches=[{"op": "delete", "slide": 2}])
+
+        assert _parse_slides(get_generated_markdown()) == ["# タイトル", "## 3枚目\n\n- 項目"]
+
+
+class TestCompactViolationFeedback:
+    """修正指示メッセージの形式テスト"""
+
+    LONG_LINE = "- **2022年設立**、企業グループのDX推進専門会社（母体は2016年発足の事業組織）"
+
+    def _overflow_markdown(self):
+        lines = ["## 見出し", self.LONG_LINE] + [f"- 項目{i}" for i in range(1, 9)]
+        return "---\nmarp: true\n---\n\n" + "\n".join(lines)
+
+    def test_reports_measured_and_allowed_values_with_offending_line(self):
+        """スライド番号・種別・実測/上限・折り返し行の抜粋を示す"""
+        reset_generated_markdown()
+
+        result = output_slide(markdown=self._overflow_markdown())
+
+        assert "（1/2回目）" in result
+        assert "S1 line_overflow 11/9行" in result
+        assert "「- **2022年設立**、企業グループのDX推進専…」=2行" in result
+
+    def test_table_overflow_shows_widest_row(self):
+        """表の横幅超過は最も幅の広い行を示す"""
+        reset_generated_markdown()
+        row = "| " + " | ".join(["長いセル内容です"] * 5) + " |"
+        md = f"---\nmarp: true\n---\n\n## 表\n\n{row}\n|---|---|---|---|---|\n| a | b | c | d | e |"
+
+        result = output_slide(markdown=md)
+
+        assert "S1 table_overflow 96/64幅 「| 長いセル内容です" in result
+
+    def test_guidance_is_not_repeated_within_turn(self):
+        """同一ターンのリトライでは修正方針を繰り返さない"""
+        reset_generated_markdown()
+        md = self._overflow_markdown()
+
+        first = output_slide(markdown=md)
+        second = output_slide(markdown=md)
+
+        assert "line_overflow: 行を削るか" in first
+        assert "修正方針" not in second
+        assert "（2/2回目）" in second
+        assert len(second) < len(first)
+
+    def test_guidance_is_sent_again_after_reset(self):
+        """新しいターン（リセット後）は修正方針を再度伝える"""
+        reset_generated_markdown()
+        output_slide(markdown=self._overflow_markdown())
+        reset_generated_markdown()
+
+        result = output_slide(markdown=self._overflow_markdown())
+
+        assert "修正方針" in result
@@ -0,0 +1,56 @@
+"""output_slide 検証ロジックの回帰テスト（スライドコーパス）
+
+tests/fixtures/output_slide_verdicts.json はコーパスの検証結果の基準値。
+パーサーや表示幅計算を変更しても検証結果が1件も変わらないことを保証する。
+意図して判定を変えた場合のみ `python tests/benchmark_output_slide.py --write-verdicts` で更新する。
+"""
+
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from slide_corpus import build_corpus, build_pathological, collect_verdicts
+from benchmark_output_slide import verdict_digest
+from tools.output_slide import _strip_links, output_slide, reset_generated_markdown
+
+VERDICTS = json.loads(
+    (Path(__file__).parent / "fixtures" / "output_slide_verdicts.json").read_text(encoding="utf-8")
+)
+
+# CI環境の揺らぎを考慮した上限。線形時間なら数十ms、バックトラックが起きると数秒〜数分かかる
+PATHOLOGICAL_TIME_LIMIT_SECONDS = 2.0
+
+
+@pytest.mark.parametrize("name,markdown", build_corpus() + build_pathological())
+def test_verdicts_match_baseline(name, markdown):
+    """コーパスの検証結果が基準値と一致する"""
+    assert verdict_digest(collect_verdicts(markdown)) == VERDICTS[name]
+
+
+def test_baseline_covers_whole_corpus():
+    """基準ファイルとコーパスのデッキ名が一致する"""
+    names = {name for name, _ in build_corpus() + build_pathological()}
+    assert names == set(VERDICTS)
+
+
+@pytest.mark.parametrize("name,markdown", build_pathological())
+def test_pathological_inputs_finish_quickly(name, markdown):
+    """バックトラック誘発入力でもoutput_slideが短時間で終わる"""
+    reset_generated_markdown()
+    start = time.perf_counter()
+    output_slide(markdown=markdown)
+    elapsed = time.perf_counter() - start
+    reset_generated_markdown()
+    assert elapsed < PATHOLOGICAL_TIME_LIMIT_SECONDS
+
+
+def test_strip_links_matches_original_regex():
+    """_strip_links が置き換え前の正規表現と同じ結果を返す"""
+    rng = random.Random(20260301)
+    for _ in range(20000):
+        text = "".join(rng.choice("[]()a\n") for _ in range(rng.randint(0, 24)))
+        assert _strip_links(text) == re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text), text
@@ -0,0 +1,69 @@
+"""生成途中のoutput_slide入力からのスライド逐次抽出のテスト"""
+
+import json
+
+from streaming import PartialSlideExtractor
+from tools.output_slide import _split_deck
+
+DECK = (
+    "---\nmarp: true\ntheme: border\n---\n\n"
+    "# タイトル\n\n2026年版\n\n---\n\n"
+    "## 「引用」と \\ バックスラッシュ\n\n- タブ\tあり\n- 絵文字 🎉\n\n---\n\n"
+    "<!-- _class: end -->\n\n# Thank you!\n"
+)
+
+
+def feed_in_chunks(raw: str, size: int) -> tuple[PartialSlideExtractor, list[list[str]]]:
+    """生JSONをsize文字ずつ累積して渡し、各回の抽出結果を返す"""
+    extractor = PartialSlideExtractor()
+    results = [extractor.feed(raw[:end]) for end in range(size, len(raw) + size, size)]
+    return extractor, results
+
+
+class TestPartialSlideExtractor:
+    """PartialSlideExtractor のテスト"""
+
+    def test_matches_split_deck_for_any_chunk_size(self):
+        """どの分割で届いても、最終的な抽出結果が_split_deckと一致する"""
+        raw = json.dumps({"markdown": DECK})
+        expected_frontmatter, expected_slides = _split_deck(DECK)
+        for size in (1, 2, 3, 5, 7, 16, len(raw)):
+            extractor, _ = feed_in_chunks(raw, size)
+            assert extractor.slides == expected_slides, size
+            assert extractor.frontmatter == expected_frontmatter
+
+    def test_unicode_escapes_split_across_chunks(self):
+        """ensure_asciiの\\uXXXX（サロゲートペア含む）が途中で切れても正しくデコードする"""
+        raw = json.dumps({"markdown": DECK}, ensure_ascii=True)
+        for size in (1, 3, 11):
+            extractor, _ = feed_in_chunks(raw, size)
+            assert extractor.slides == _split_deck(DECK)[1]
+
+    def test_malformed_unicode_escapes_do_not_raise(self):
+        """不正な\\uエスケープ（16進でない・後半が壊れたサロゲート）はそのまま文字として出し、抽出を続ける"""
+        raw = '{"markdown": "---\\nmarp: true\\n---\\n\\n# A \\uZZ12\\n\\n---\\n\\n# B \\ud83d\\u-123\\n\\n---\\n\\n# C\\n"}'
+        for size in (1, 4, len(raw)):
+            extractor, _ = feed_in_chunks(raw, size)
+            assert extractor.slides == ["# A \\uZZ12", "# B \ud83d\\u-123", "# C"], size
+
+    def test_slide_is_emitted_once_separator_arrives(self):
+        """区切りが届いた時点で直前のスライドを返し、最後のスライドは文字列の終端で返す"""
+        extractor = PartialSlideExtractor()
+        assert extractor.feed('{"markdown": "---\\nmarp: true\\n---\\n\\n# 表紙') == []
+        assert extractor.feed('{"markdown": "---\\nmarp: true\\n---\\n\\n# 表紙\\n\\n---\\n\\n## 2枚目') == ["# 表紙"]
+        assert extractor.feed('{"markdown": "---\\nmarp: true\\n---\\n\\n# 表紙\\n\\n---\\n\\n## 2枚目"}') == ["## 2枚目"]
+        assert extractor.slides == ["# 表紙", "## 2枚目"]
+        assert extractor.frontmatter == "---\nmarp: true\n---\n\n"
+
+    def test_deck_without_frontmatter(self):
+        """フロントマターなしのデッキも分割できる"""
+        deck = "# 表紙\n\n---\n\n## 本文"
+        extractor, _ = feed_in_chunks(json.dumps({"markdown": deck}), 4)
+        assert extractor.slides == ["# 表紙", "## 本文"]
+        assert extractor.frontmatter == ""
+
+    def test_waits_for_markdown_key(self):
+        """markdownキーが届くまでは何も返さない"""
+        extractor = PartialSlideExtractor()
+        assert extractor.feed('{"mark') == []
+        assert extractor.feed('{"markdown": "# 表紙"}') == ["# 表紙"]
@@ -0,0 +1,89 @@
+"""プロンプトキャッシュのレイアウト確認と使用トークン数の記録のテスト"""
+
+from unittest.mock import patch
+
+import pytest
+
+from session.prompt_cache import (
+    estimate_prefix_tokens,
+    measure_cache_prefixes,
+    record_cache_usage,
+    report_cache_prefixes,
+)
+from streaming import ChatEventTranslator
+
+TOOL_SPECS = [{"name": "output_slide", "description": "スライドを出力する", "inputSchema": {"json": {}}}]
+
+
+@pytest.fixture
+def counters():
+    recorded = []
+    with patch("session.prompt_cache.count", lambda name, amount=1, **attrs: recorded.append((name, amount, attrs))):
+        yield recorded
+
+
+def _counter(tools: int, system: int):
+    """toolConfig / system があればその分を足すCountTokensの代わり（メッセージだけなら10トークン）"""
+    def count_tokens(converse_input: dict) -> int:
+        return 10 + (tools if "toolConfig" in converse_input else 0) + (system if "system" in converse_input else 0)
+    return count_tokens
+
+
+def test_measures_each_prefix_up_to_its_cache_point():
+    prefixes = measure_cache_prefixes(_counter(tools=1100, system=60), TOOL_SPECS, "システムプロンプト")
+
+    assert [(prefix.name, prefix.tokens, prefix.cacheable) for prefix in prefixes] == [
+        ("tools", 1100, True), ("tools+system", 1160, True),
+    ]
+
+
+def test_undersized_tool_prefix_is_reported(counters):
+    """2026-02-21のようにツール定義が最低ラインを割ったら、起動時に警告してカウンターに記録する"""
+    prefixes = measure_cache_prefixes(_counter(tools=302, system=50), TOOL_SPECS, "システムプロンプト")
+
+    report_cache_prefixes("sonnet", prefixes)
+
+    assert counters == [("prompt_cache.undersized_prefixes", 1, {"model_type": "sonnet"})] * 2
+
+
+def test_falls_back_to_estimate_when_count_tokens_fails():
+    def failing(converse_input):
+        raise RuntimeError("AccessDeniedException")
+
+    prefixes = measure_cache_prefixes(failing, TOOL_SPECS, "あ" * 100)
+
+    assert all(prefix.estimated for prefix in prefixes)
+    assert prefixes[1].tokens - prefixes[0].tokens == 100
+    assert estimate_prefix_tokens("abcdefgh日本語") == 5
+
+
+@pytest.mark.parametrize("usage, outcome", [
+    ({"inputTokens": 50, "cacheReadInputTokens": 1200}, "hit"),
+    ({"inputTokens": 50, "cacheWriteInputTokens": 1200}, "write"),
+    ({"inputTokens": 1250}, "miss"),
+])
+def test_records_cache_tokens_and_outcome_per_request(counters, usage, outcome):
+    record_cache_usage("sonnet", usage, use_cache=True)
+
+    names = {name: amount for name, amount, _ in counters}
+    assert names["prompt_cache.read_tokens"] == usage.get("cacheReadInputTokens", 0)
+    assert names["prompt_cache.write_tokens"] == usage.get("cacheWriteInputTokens", 0)
+    assert counters[-1] == ("prompt_cache.requests", 1, {"model_type": "sonnet", "outcome": outcome})
+
+
+def test_models_without_cache_record_only_input_tokens(counters):
+    record_cache_usage("kimi", {"inputTokens": 800}, use_cache=False)
+
+    assert counters == [("model.input_tokens", 800, {"model_type": "kimi"})]
+
+
+def test_translator_sums_usage_across_model_calls():
+    """ツールを挟んでモデルを複数回呼んだ場合も、1リクエスト分の合計にする"""
+    translator = ChatEventTranslator()
+    for read in (1200, 1300):
+        events = translator.on_stream_event({"event": {"metadata": {"usage": {
+            "inputTokens": 40, "outputTokens": 10, "cacheReadInputTokens": read,
+        }}}})
+        assert events == []
+
+    assert translator.usage == {"inputTokens": 80, "outputTokens": 20, "cacheReadInputTokens": 2500}
@@ -0,0 +1,125 @@
+"""複数の参考資料（PDF・テキスト）の読み込みのテスト"""
+
+import asyncio
+import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import agent
+from references import ExtractionCache, ReferenceFileError, check_reference_files, reference_files_from_payload
+
+
+class FakePdf:
+    """pdfplumber.open の代わり（本文は "|" 区切りでページに分ける。"broken" で始まる内容は解析エラー）"""
+
+    def __init__(self, file):
+        content = file.read().decode()
+        if content.startswith("broken"):
+            raise ValueError("PDFを解析できません")
+        texts = content.split("|")
+        self.pages = [MagicMock(extract_text=MagicMock(return_value=text)) for text in texts]
+
+    def close(self):
+        pass
+
+
+def _file(file_name: str, content: bytes, content_type: str = "") -> dict:
+    return {
+        "file_name": file_name,
+        "content_type": content_type,
+        "base64_data": base64.b64encode(content).decode(),
+        "size": len(content),
+    }
+
+
+def _invoke(payload: dict):
+    prompts = []
+
+    class RecordingAgent:
+        messages = []
+
+        async def stream_async(self, prompt, cancel_signal=None):
+            prompts.append(prompt)
+            yield {"data": "了解"}
+
+    async def main():
+        return [event async for event in agent.invoke(payload)]
+
+    cache = ExtractionCache(memory_bytes=1024 * 1024, disk_dir=None, disk_bytes=0)
+    with ThreadPoolExecutor(max_workers=2) as executor, \
+            patch("pdfplumber.open", FakePdf), \
+            patch("references.pdf_worker._documents", OrderedDict()), \
+            patch("references.pdf_text.get_pdf_executor", return_value=executor), \
+            patch("agent.get_extraction_cache", return_value=cache), \
+            patch("agent.get_or_create_agent", return_value=RecordingAgent()):
+        events = asyncio.run(main())
+    return events, prompts
+
+
+def test_legacy_reference_file_comes_first():
+    payload = {"reference_file": {"file_name": "a.pdf"}, "reference_files": [{"file_name": "b.md"}]}
+
+    assert [file["file_name"] for file in reference_files_from_payload(payload)] == ["a.pdf", "b.md"]
+
+
+@pytest.mark.parametrize("files, message", [
+    ([{"file_name": f"{n}.pdf", "size": 1} for n in range(6)], "参考資料は5件までです"),
+    ([{"file_name": "image.png", "size": 1}], "「image.png」は対応していない形式です（PDF・テキスト・Markdownのみ）"),
+    ([{"file_name": "a.pdf", "size": 11 * 1024 * 1024}, {"file_name": "b.md", "size": 1}],
+     "「a.pdf」のファイルサイズが10MBを超えています"),
+    ([{"file_name": f"{n}.pdf", "size": 8 * 1024 * 1024} for n in range(3)], "参考資料の合計サイズが20MBを超えています"),
+])
+def test_rejects_invalid_file_sets(files, message):
+    with pytest.raises(ReferenceFileError, match=message):
+        check_reference_files(files)
+
+
+def test_invoke_combines_pdf_and_markdown_in_payload_order():
+    """PDFとMarkdownを並行して読み込み、ファイルごとの進捗を送ってペイロードの順に結合する"""
+    events, prompts = _invoke({
+        "prompt": "スライドにして",
+        "reference_files": [
+            _file("spec.pdf", "仕様の概要|仕様の詳細".encode(), "application/pdf"),
+            _file("memo.md", "# メモ\n\n補足事項".encode()),
+        ],
+    })
+
+    statuses = [event["data"] for event in events if event["type"] == "status"]
+    assert "参考資料を読み込んでいます...（spec.pdf 2/2ページ）" in statuses
+    assert "参考資料を読み込んでいます...（memo.md 1/1ページ）" in statuses
+    prompt = prompts[0]
+    assert prompt.startswith("[テーマ: border]\n以下は参考資料「spec.pdf」・「memo.md」の内容です：")
+    assert prompt.index("仕様の概要\n\n仕様の詳細") < prompt.index("# メモ\n\n補足事項")
+    assert prompt.endswith("上記の参考資料を踏まえて、スライドにして")
+
+
+def test_invoke_reports_failed_file_and_continues_with_others():
+    events, prompts = _invoke({
+        "prompt": "スライドにして",
+        "reference_files": [
+            _file("broken.pdf", b"broken"),
+            _file("notes.txt", "メモ本文".encode("cp932")),
+        ],
+    })
+
+    texts = [event["data"] for event in events if event["type"] == "text"]
+    assert "「broken.pdf」の読み取りに失敗しました: PDFを解析できません\n\n" in texts
+    assert "「broken.pdf」" not in prompts[0]
+    assert "メモ本文" in prompts[0]
+
+
+def test_invoke_rejects_request_when_total_size_is_exceeded():
+    """申告サイズが小さくても、デコード後の合計サイズで弾く"""
+    files = [_file("a.md", b"x" * 6), _file("b.md", b"y" * 6)]
+    for file in files:
+        file["size"] = 1
+
+    with patch("references.loader.MAX_TOTAL_SIZE", 10):
+        events, prompts = _invoke({"prompt": "スライドにして", "reference_files": files})
+
+    assert events[-1]["type"] == "error"
+    assert events[-1]["error"].startswith("参考資料の合計サイズが")
+    assert prompts == []
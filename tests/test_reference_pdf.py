@@ -0,0 +1,317 @@
+"""参考資料PDFのテキスト抽出のテスト（pdfplumberは差し替え、プロセスプールの代わりにスレッドプールを使う）"""
+
+import asyncio
+import base64
+import runpy
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import agent
+from references import ExtractionCache, extract_pdf_text, pdf_worker
+
+
+class FakePdf:
+    """pdfplumber.open の戻り値の代わり（各ページの本文はバイト列に書いた区切り文字列から作る）"""
+
+    opened: int = 0
+    extracted_pages: list[int] = []
+
+    def __init__(self, file):
+        texts = file.read().decode().split("|")
+        FakePdf.opened += 1
+        self.pages = [
+            MagicMock(extract_text=MagicMock(side_effect=lambda n=n: FakePdf.extracted_pages.append(n) or texts[n - 1]))
+            for n in range(1, len(texts) + 1)
+        ]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_pdfplumber(monkeypatch):
+    FakePdf.opened = 0
+    FakePdf.extracted_pages = []
+    monkeypatch.setattr(pdf_worker, "_documents", OrderedDict())
+    with patch("pdfplumber.open", FakePdf):
+        yield FakePdf
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """投入したタスクの関数と、PDFのバイト列を渡したかを記録する"""
+
+    def __init__(self, max_workers=2):
+        super().__init__(max_workers=max_workers)
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn.__name__, any(isinstance(arg, bytes) for arg in args)))
+        return super().submit(fn, *args)
+
+
+def _pdf(*pages: str) -> bytes:
+    return "|".join(pages).encode()
+
+
+def _extract(data: bytes, max_chars: int, **kwargs):
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return await extract_pdf_text(data, max_chars, executor=executor, **kwargs)
+
+    return asyncio.run(main())
+
+
+def test_extracts_pages_in_order_and_reports_progress(fake_pdfplumber):
+    pages = [f"ページ{n}" for n in range(1, 11)]
+    progress = []
+
+    result = _extract(_pdf(*pages), 10_000, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert result.text == "\n\n".join(pages)
+    assert (result.page_count, result.pages_read, result.truncated) == (10, 10, False)
+    assert progress == [(4, 10), (8, 10), (10, 10)]
+
+
+def test_skips_empty_pages(fake_pdfplumber):
+    result = _extract(_pdf("a", "", "b"), 100)
+
+    assert result.text == "a\n\nb"
+
+
+def test_stops_once_character_budget_is_reached(fake_pdfplumber):
+    pages = ["x" * 100] * 40
+
+    result = _extract(_pdf(*pages), 250)
+
+    assert len(result.text) == 250
+    assert result.truncated is True
+    assert result.pages_read == 4
+    # 先読み分（ワーカー数の2倍）を超えては抽出しない
+    assert len(fake_pdfplumber.extracted_pages) <= 4 * 4
+
+
+def test_cancel_stops_submitting_pages(fake_pdfplumber):
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    result = _extract(_pdf(*["p"] * 40), 10_000, cancel_event=cancel_event)
+
+    assert result.pages_read == 4
+
+
+def test_pdf_bytes_are_sent_once_and_tasks_carry_page_ranges(fake_pdfplumber):
+    """バイト列はページ数を数えるタスクでだけ送り、ワーカーは開いた文書をページ範囲のタスクで使い回す"""
+    pages = [f"ページ{n}" for n in range(1, 13)]
+
+    async def main():
+        with RecordingExecutor() as executor:
+            return await extract_pdf_text(_pdf(*pages), 10_000, executor=executor), executor.calls
+
+    result, calls = asyncio.run(main())
+
+    assert result.text == "\n\n".join(pages)
+    assert calls == [("count_pages", True)] + [("extract_pages", False)] * 3
+    assert fake_pdfplumber.opened == 1
+
+
+def test_worker_without_document_gets_bytes_resent(fake_pdfplumber):
+    """文書を持っていないワーカー（別プロセス）に当たったタスクだけ、バイト列つきで投入し直す"""
+    pages = [f"ページ{n}" for n in range(1, 6)]
+
+    class ForgetfulExecutor(RecordingExecutor):
+        def submit(self, fn, *args):
+            if fn is pdf_worker.extract_pages and len(self.calls) == 1:
+                pdf_worker._documents.clear()
+            return super().submit(fn, *args)
+
+    async def main():
+        with ForgetfulExecutor() as executor:
+            return await extract_pdf_text(_pdf(*pages), 10_000, executor=executor), executor.calls
+
+    result, calls = asyncio.run(main())
+
+    assert result.text == "\n\n".join(pages)
+    assert ("extract_pages", True) in calls
+    assert pdf_worker.extract_pages("unknown", [1]) is None
+
+
+def test_invoke_streams_progress_and_prepends_reference(fake_pdfplumber):
+    """抽出中はページ単位の進捗をstatusで送り、抽出テキストをユーザーメッセージの前に付ける"""
+    captured = {}
+
+    class RecordingAgent:
+        messages = []
+
+        async def stream_async(self, prompt, cancel_signal=None):
+            captured["prompt"] = prompt
+            yield {"data": "了解"}
+
+    payload = {
+        "prompt": "スライドにして",
+        "reference_file": {
+            "file_name": "proposal.pdf",
+            "base64_data": base64.b64encode(_pdf("概要", "詳細")).decode(),
+            "size": 10,
+        },
+    }
+
+    async def main():
+        return [event async for event in agent.invoke(payload)]
+
+    cache = ExtractionCache(memory_bytes=1024 * 1024, disk_dir=None, disk_bytes=0)
+    with ThreadPoolExecutor(max_workers=2) as executor, \
+            patch("references.pdf_text.get_pdf_executor", return_value=executor), \
+            patch("agent.get_extraction_cache", return_value=cache), \
+            patch("agent.get_or_create_agent", return_value=RecordingAgent()):
+        events = asyncio.run(main())
+
+    statuses = [event["data"] for event in events if event["type"] == "status"]
+    assert statuses == ["参考資料を読み込んでいます...", "参考資料を読み込んでいます...（2/2ページ）"]
+    assert "概要\n\n詳細" in captured["prompt"]
+    assert captured["prompt"].endswith("上記の参考資料を踏まえて、スライドにして")
+
+
+def test_invoke_rejects_oversized_decoded_file(fake_pdfplumber):
+    payload = {
+        "prompt": "スライドにして",
+        # 申告サイズは小さくても、デコード後のサイズで弾く
+        "reference_file": {
+            "file_name": "big.pdf",
+            "base64_data": base64.b64encode(b"x" * (10 * 1024 * 1024 + 1)).decode(),
+            "size": 1,
+        },
+    }
+
+    async def main():
+        return [event async for event in agent.invoke(payload)]
+
+    events = asyncio.run(main())
+
+    assert events[-1] == {"type": "error", "error": "ファイルサイズが10MBを超えています"}
+
+
+def _extract_cached(data: bytes, max_chars: int, cache: ExtractionCache):
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return await extract_pdf_text(data, max_chars, executor=executor, cache=cache)
+
+    return asyncio.run(main())
+
+
+def test_cache_skips_parsing_for_same_content(fake_pdfplumber):
+    """同じ内容のPDFは解析せず、メモリのキャッシュから返す"""
+    cache = ExtractionCache(memory_bytes=1024 * 1024, disk_dir=None, disk_bytes=0)
+    data = _pdf("一", "", "三")
+
+    first = _extract_cached(data, 1000, cache)
+    extracted = len(fake_pdfplumber.extracted_pages)
+    second = _extract_cached(data, 1000, cache)
+
+    assert len(fake_pdfplumber.extracted_pages) == extracted
+    assert (first.cached, second.cached) == (False, True)
+    assert second.text == first.text == "一\n\n三"
+    assert second.page_offsets == [0, 1, 3]
+    assert (cache.hits, cache.misses, cache.hit_rate) == ({"memory": 1, "disk": 0}, 1, 0.5)
+
+
+def test_truncated_entry_serves_smaller_budget_only(fake_pdfplumber):
+    """途中で打ち切った結果は、読んだ範囲で足りる要求にだけ使う"""
+    cache = ExtractionCache(memory_bytes=1024 * 1024, disk_dir=None, disk_bytes=0)
+    data = _pdf(*["x" * 100] * 40)
+
+    _extract_cached(data, 250, cache)
+    smaller = _extract_cached(data, 200, cache)
+    larger = _extract_cached(data, 2000, cache)
+
+    assert smaller.cached is True
+    assert smaller.truncated is True
+    assert len(smaller.text) == 200
+    assert larger.cached is False
+    assert len(larger.text) == 2000
+
+
+def test_disk_tier_survives_memory_eviction(fake_pdfplumber, tmp_path):
+    """メモリから追い出されても（再起動後も）ディスクのキャッシュから返す"""
+    data = _pdf("ディスク")
+    _extract_cached(data, 1000, ExtractionCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=1024 * 1024))
+    extracted = len(fake_pdfplumber.extracted_pages)
+
+    fresh = ExtractionCache(memory_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_bytes=1024 * 1024)
+    result = _extract_cached(data, 1000, fresh)
+
+    assert result.cached is True
+    assert result.text == "ディスク"
+    assert len(fake_pdfplumber.extracted_pages) == extracted
+    assert fresh.hits == {"memory": 0, "disk": 1}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    """ディスクの合計サイズが上限を超えたら、最後に使ったのが古いものから削除する"""
+    from references.cache import CachedExtraction
+
+    cache = ExtractionCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=250)
+
+    async def main():
+        for key in ("a", "b", "c"):
+            await cache.put(key, CachedExtraction(text="x" * 50, page_offsets=[0], page_count=1))
+
+    asyncio.run(main())
+
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == ["b", "c"]
+
+
+def test_memory_tier_is_lru_within_budget():
+    """メモリの合計サイズが上限を超えたら、最後に使ったのが古いものから追い出す"""
+    from references.cache import CachedExtraction
+
+    entry = CachedExtraction(text="x" * 100, page_offsets=[0], page_count=1)
+    cache = ExtractionCache(memory_bytes=3 * sys.getsizeof(entry.text), disk_dir=None, disk_bytes=0)
+
+    async def main():
+        for key in ("a", "b", "c"):
+            await cache.put(key, entry)
+        await cache.get("a", 100)
+        await cache.put("d", entry)
+        return [await cache.get(key, 100) is not None for key in ("a", "b", "c", "d")]
+
+    assert asyncio.run(main()) == [True, False, True, True]
+
+
+def test_entry_script_imports_nothing_when_workers_reload_it():
+    """ワーカーは __main__ を __mp_main__ として読み込み直すが、main.py はそのとき agent を import しない"""
+    runtime_dir = Path(agent.__file__).resolve().parent
+
+    namespace = runpy.run_path(str(runtime_dir / "main.py"), run_name="__mp_main__")
+
+    assert "agent" not in namespace
+
+
+def test_pool_workers_load_only_the_worker_module(tmp_path):
+    """main.py と同じ形の __main__ なら、ワーカーは抽出用のモジュールだけを持ち、親が読み込んだものは持たない"""
+    runtime_dir = Path(agent.__file__).resolve().parent
+    (tmp_path / "heavy_marker.py").write_text("")
+    script = tmp_path / "main.py"
+    script.write_text(
+        "import sys\n"
+        f"sys.path[:0] = [{str(tmp_path)!r}, {str(runtime_dir)!r}]\n"
+        "if __name__ == '__main__':\n"
+        "    import heavy_marker\n"
+        "    from references.pdf_text import get_pdf_executor\n"
+        "    modules = get_pdf_executor().submit(eval, \"sorted(set(__import__('sys').modules) & "
+        "{'heavy_marker', 'references.pdf_worker'})\").result(timeout=60)\n"
+        "    print(modules)\n"
+    )
+
+    # コンテナと同じく、ランタイムのディレクトリで起動する（forkserver はそこからモジュールを読み込む）
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120,
+                               cwd=runtime_dir)
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "['references.pdf_worker']"
@@ -0,0 +1,163 @@
+"""参考資料の関連箇所の選択（BM25）のテスト"""
+
+import asyncio
+import base64
+from unittest.mock import patch
+
+import pytest
+
+import agent
+from references import retrieval
+from references.loader import ReferenceDocument
+from references.retrieval import BM25Index, build_reference_index, chunk_document, tokenize
+
+
+def _document(*pages: str) -> tuple[str, list[int]]:
+    """ページ本文を抽出結果と同じ形（区切りは空行、ページごとの開始位置）にする"""
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 2
+    return "\n\n".join(pages), offsets
+
+
+def _reference_document(file_name: str, *pages: str) -> ReferenceDocument:
+    text, offsets = _document(*pages)
+    return ReferenceDocument(file_name=file_name, text=text, page_offsets=offsets, page_count=len(pages))
+
+
+def test_tokenize_uses_bigrams_for_japanese_and_words_for_ascii():
+    assert tokenize("売上 AWS") == ["売上", "aws"]
+    assert tokenize("生成AI") == ["生成", "ai"]
+    assert tokenize("新規事業") == ["新規", "規事", "事業"]
+
+
+def test_chunks_do_not_cross_pages_and_keep_page_numbers():
+    text, offsets = _document("表紙\n\n概要", "詳細1\n\n詳細2", "まとめ")
+
+    chunks = chunk_document(text, offsets, chunk_chars=100)
+
+    assert [(chunk.page, chunk.text) for chunk in chunks] == [
+        (1, "表紙\n\n概要"), (2, "詳細1\n\n詳細2"), (3, "まとめ"),
+    ]
+
+
+def test_long_paragraph_is_split_by_chunk_size():
+    text, offsets = _document("あ" * 250)
+
+    chunks = chunk_document(text, offsets, chunk_chars=100)
+
+    assert [len(chunk.text) for chunk in chunks] == [100, 100, 50]
+    assert [chunk.start for chunk in chunks] == [0, 100, 200]
+
+
+def test_small_document_is_included_whole():
+    reference = build_reference_index([_reference_document("a.pdf", "表紙", "本文")])
+
+    selection = reference.select("無関係な依頼", budget=1000)
+
+    assert selection.complete
+    assert reference.format(selection) == "---参考資料「a.pdf」ここから---\n表紙\n\n本文\n---参考資料「a.pdf」ここまで---"
+
+
+def test_selects_relevant_chunks_within_budget_in_document_order():
+    pages = ["会社概要と沿革"] + [f"無関係な段落{n}" * 20 for n in range(8)] + ["セキュリティ対策の詳細"]
+    text, offsets = _document(*pages)
+    index = BM25Index.build(chunk_document(text, offsets, chunk_chars=100))
+
+    selection = index.select("セキュリティ対策をまとめて", budget=30)
+
+    assert [chunk.page for chunk in selection.chunks] == [1, 10]
+    assert selection.selected_tokens <= 30 < selection.document_tokens
+    reference = build_reference_index([_reference_document("a.pdf", *pages)])
+    assert reference.format(reference.select("セキュリティ対策をまとめて", budget=30)) == (
+        "---参考資料「a.pdf」ここから---\n"
+        "[p.1]\n会社概要と沿革\n\n（中略）\n\n[p.10]\nセキュリティ対策の詳細\n"
+        "---参考資料「a.pdf」ここまで---"
+    )
+
+
+def test_multiple_files_share_budget_and_keep_payload_order():
+    """複数ファイルは1つのインデックスで共通の予算を分け合い、ファイルの順に並べる"""
+    reference = build_reference_index([
+        _reference_document("a.pdf", "A社の概要", "無関係" * 40),
+        _reference_document("notes.md", "メモの見出し\n\n" + "予算の内訳" * 5),
+    ])
+
+    selection = reference.select("予算の内訳を整理して", budget=40)
+    text = reference.format(selection)
+
+    assert [(chunk.source, chunk.page) for chunk in selection.chunks] == [(0, 1), (1, 1)]
+    assert text.index("「a.pdf」") < text.index("「notes.md」")
+    assert "[p.1]\nA社の概要" in text
+    assert "無関係" not in text
+
+
+def test_follow_up_pulls_only_new_relevant_chunks():
+    reference = build_reference_index([
+        _reference_document("guide.pdf", "表紙", "価格プランの説明" * 10, "導入事例の紹介" * 10, "サポート体制" * 10),
+    ])
+
+    first = reference.select("価格プランを説明して", budget=60)
+    follow_up = reference.select("導入事例も入れて", budget=60, follow_up=True)
+    again = reference.select("導入事例も入れて", budget=60, follow_up=True)
+
+    assert [chunk.page for chunk in first.chunks] == [1, 2]
+    assert [chunk.page for chunk in follow_up.chunks] == [3]
+    assert again.chunks == []
+
+
+@pytest.fixture
+def session_indexes():
+    with patch.object(retrieval, "_session_indexes", retrieval.OrderedDict()) as indexes:
+        yield indexes
+
+
+def test_session_indexes_are_bounded(session_indexes):
+    reference = build_reference_index([_reference_document("a.pdf", "本文")])
+
+    with patch.object(retrieval, "SESSION_INDEX_LIMIT", 2):
+        for session_id in ("s1", "s2", "s3"):
+            retrieval.remember_session_reference(session_id, reference)
+
+    assert list(session_indexes) == ["s2", "s3"]
+    assert retrieval.get_session_reference("s1") is None
+
+
+class _Context:
+    session_id = "session-1"
+
+
+def test_invoke_adds_follow_up_excerpt_from_session_index(monkeypatch, session_indexes):
+    """セッションに保持した参考資料から、後続ターンの依頼に関連する箇所を追加する"""
+    monkeypatch.setenv("REFERENCE_SESSION_INDEX", "1")
+    monkeypatch.setenv("REFERENCE_TOKEN_BUDGET", "60")
+    prompts = []
+
+    class RecordingAgent:
+        messages = []
+
+        async def stream_async(self, prompt, cancel_signal=None):
+            prompts.append(prompt)
+            yield {"data": "了解"}
+
+    async def fake_load(*args, **kwargs):
+        return [_reference_document("guide.pdf", "表紙", "価格プランの説明" * 10, "導入事例の紹介" * 10)]
+
+    first = {
+        "prompt": "価格プランをスライドにして",
+        "reference_file": {"file_name": "guide.pdf", "base64_data": base64.b64encode(b"pdf").decode(), "size": 3},
+    }
+
+    async def main():
+        for payload in (first, {"prompt": "導入事例も追加して"}):
+            async for _ in agent.invoke(payload, _Context()):
+                pass
+
+    with patch("agent.load_reference_files", fake_load), \
+            patch("agent.get_or_create_agent", return_value=RecordingAgent()):
+        asyncio.run(main())
+
+    assert "[p.2]" in prompts[0] and "導入事例" not in prompts[0]
+    assert "[p.3]\n導入事例の紹介" in prompts[1]
+    assert prompts[1].endswith("---参考資料「guide.pdf」ここまで---\n\n導入事例も追加して")
@@ -0,0 +1,63 @@
+"""リクエスト単位のツール状態のユニットテスト"""
+
+import asyncio
+
+from tools.request_state import get_request_state, start_request_state
+from tools.output_slide import configure_slide_validation, output_slide
+from tools.generate_tweet import generate_tweet_url
+
+
+def test_tool_thread_writes_are_visible_to_request():
+    """ツールスレッドでの書き込みが呼び出し元のリクエスト状態に反映される"""
+
+    async def run():
+        state = start_request_state()
+        await asyncio.to_thread(output_slide, markdown="# スライド")
+        return state
+
+    state = asyncio.run(run())
+
+    assert state.generated_markdown == "# スライド"
+
+
+def test_concurrent_requests_do_not_share_state():
+    """並行リクエスト同士でスライド・検証設定・ツイートURLが混ざらない"""
+
+    async def request(name: str, slide_count: int, delay: float):
+        state = start_request_state()
+        configure_slide_validation(f"{slide_count}枚で作って", "sonnet")
+        await asyncio.sleep(delay)
+        slides = "\n---\n".join(f"## {name}{i}" for i in range(slide_count))
+        await asyncio.to_thread(output_slide, markdown=f"---\nmarp: true\n---\n{slides}")
+        await asyncio.to_thread(generate_tweet_url, tweet_text=name)
+        return state
+
+    async def run():
+        return await asyncio.gather(
+            request("first", 3, 0.02),
+            request("second", 5, 0.0),
+        )
+
+    first, second = asyncio.run(run())
+
+    assert first.expected_slide_count == 3
+    assert second.expected_slide_count == 5
+    assert "## first0" in first.generated_markdown
+    assert "## second0" in second.generated_markdown
+    assert first.generated_tweet_url.endswith("text=first")
+    assert second.generated_tweet_url.endswith("text=second")
+
+
+def test_request_state_does_not_leak_outside_request():
+    """リクエスト内の状態はinvoke外のフォールバック状態に影響しない"""
+    fallback = get_request_state()
+    fallback.generated_markdown = None
+
+    async def run():
+        start_request_state()
+        output_slide(markdown="# 内側")
+
+    asyncio.run(run())
+
+    assert get_request_state() is fallback
+    assert fallback.generated_markdown is None
@@ -0,0 +1,51 @@
+"""マルチワーカー構成（ワーカー数の設定・セッションの振り分け・pingの集約）のテスト"""
+
+import pytest
+
+from workers import least_loaded_worker, merge_ping, runtime_workers, worker_for_session
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("", 1), ("3", 3), ("0", 1), ("abc", 1)],
+)
+def test_runtime_workers_from_env(monkeypatch, value, expected):
+    monkeypatch.setenv("RUNTIME_WORKERS", value)
+
+    assert runtime_workers() == expected
+
+
+def test_runtime_workers_auto_uses_cpu_count(monkeypatch):
+    monkeypatch.setenv("RUNTIME_WORKERS", "auto")
+    monkeypatch.setattr("os.cpu_count", lambda: 6)
+
+    assert runtime_workers() == 6
+
+
+def test_same_session_always_goes_to_same_worker():
+    sessions = [f"session-{n:04d}" for n in range(200)]
+    first = [worker_for_session(session_id, 4) for session_id in sessions]
+
+    assert first == [worker_for_session(session_id, 4) for session_id in sessions]
+    # プロセスをまたいでも変わらない値（hash() のソルトに左右されない）
+    assert worker_for_session("session-0000", 4) == 3
+    assert set(first) == {0, 1, 2, 3}
+
+
+def test_requests_without_session_go_to_least_loaded_worker():
+    assert least_loaded_worker([2, 0, 1]) == 1
+    assert least_loaded_worker([0, 0]) == 0
+
+
+def test_ping_is_busy_if_any_worker_is_busy():
+    statuses = [
+        {"status": "Healthy", "time_of_last_update": 100},
+        {"status": "HealthyBusy", "time_of_last_update": 120},
+        None,  # 再起動中のワーカー
+    ]
+
+    assert merge_ping(statuses) == {"status": "HealthyBusy", "time_of_last_update": 120}
+    assert merge_ping([{"status": "Healthy", "time_of_last_update": 5}, None]) == {
+        "status": "Healthy", "time_of_last_update": 5,
+    }
+    assert merge_ping([None, None]) == {"status": "Healthy"}
@@ -0,0 +1,132 @@
+"""会話履歴のスナップショット（非同期の保存と読み戻し）のテスト"""
+
+import threading
+import time
+
+import pytest
+
+import session.manager as manager
+from session.snapshots import (
+    FileSnapshotBackend,
+    SessionSnapshot,
+    SnapshotStore,
+    SqliteSnapshotBackend,
+    compress_snapshot,
+    dump_snapshot,
+    load_snapshot,
+)
+from session.store import SessionStore
+
+MESSAGES = [
+    {"role": "user", "content": [{"text": "[テーマ: border]\nAWSの紹介スライドを作って"}]},
+    {"role": "assistant", "content": [
+        {"toolUse": {"toolUseId": "o1", "name": "output_slide", "input": {"markdown": "# AWS"}}},
+    ]},
+    {"role": "user", "content": [{"toolResult": {"toolUseId": "o1", "status": "success",
+                                                 "content": [{"text": "スライドを出力しました。"}]}}]},
+    {"role": "assistant", "content": [{"image": {"format": "png", "source": {"bytes": b"\x89PNG"}}}]},
+]
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteSnapshotBackend(tmp_path / "sessions.sqlite3")
+    return FileSnapshotBackend(tmp_path / "sessions")
+
+
+def test_snapshot_round_trip_keeps_bytes_and_is_compact():
+    snapshot = SessionSnapshot(model_type="sonnet", messages=MESSAGES)
+
+    data = compress_snapshot(dump_snapshot(snapshot))
+    restored = load_snapshot(data)
+
+    assert restored.messages == MESSAGES
+    assert restored.model_type == "sonnet"
+    assert load_snapshot(b"broken") is None
+
+
+def test_save_async_writes_in_background_and_loads_back(backend):
+    store = SnapshotStore(backend)
+    store.save_async("session-1", SessionSnapshot(model_type="sonnet", messages=MESSAGES))
+    store.flush(timeout=5)
+
+    assert store.load("session-1").messages == MESSAGES
+    # 別のプロセスの起動後と同じく、新しいストアからも読める
+    assert SnapshotStore(backend).load("session-1").messages == MESSAGES
+    assert SnapshotStore(backend).load("session-2") is None
+
+
+def test_latest_snapshot_wins_while_writer_is_busy(tmp_path):
+    """書き込み中に届いたスナップショットは、古いものを飛ばして最新のものだけ書く"""
+    written = []
+    release = threading.Event()
+
+    class SlowBackend(FileSnapshotBackend):
+        def save(self, session_id, data, saved_at):
+            release.wait(5)
+            written.append(load_snapshot(data).messages[-1]["content"][0]["text"])
+            super().save(session_id, data, saved_at)
+
+    store = SnapshotStore(SlowBackend(tmp_path))
+    for turn in range(4):
+        store.save_async("s", SessionSnapshot(model_type="sonnet", messages=[
+            {"role": "user", "content": [{"text": f"turn{turn}"}]},
+        ]))
+        time.sleep(0.02)
+    # 書き込み待ちのものは、書き込み前でも最新が読める
+    assert store.load("s").messages[0]["content"][0]["text"] == "turn3"
+    release.set()
+    store.flush(timeout=5)
+
+    assert written[0] == "turn0" and written[-1] == "turn3"
+    assert len(written) <= 2
+
+
+def test_expired_snapshots_are_not_loaded_and_purged(backend):
+    store = SnapshotStore(backend, ttl=60)
+    old = SessionSnapshot(model_type="sonnet", messages=MESSAGES, saved_at=time.time() - 120)
+    backend.save("old", compress_snapshot(dump_snapshot(old)), time.time() - 120)
+
+    assert store.load("old") is None
+    assert backend.purge(time.time() - 60) == 1
+    assert backend.load("old") is None
+
+
+class FakeAgent:
+    def __init__(self, model, system_prompt, tools, conversation_manager):
+        self.model = model
+        self.messages = []
+        values = {}
+        self.state = type("State", (), {"get": staticmethod(values.get), "set": staticmethod(values.__setitem__)})()
+
+
+def test_evicted_session_is_rehydrated_from_snapshot(monkeypatch, tmp_path):
+    """メモリから追い出されたセッションは、次のターンでスナップショットから履歴を読み戻す"""
+    monkeypatch.setenv("BEDROCK_SONNET_MODEL_ID", "sonnet-profile-arn")
+    monkeypatch.setenv("BEDROCK_KIMI_MODEL_ID", "kimi-model")
+    snapshots = SnapshotStore(SqliteSnapshotBackend(tmp_path / "sessions.sqlite3"))
+    store = SessionStore(max_entries=10, memory_bytes=10 * 1024 * 1024, idle_ttl=60)
+    monkeypatch.setattr(manager, "get_snapshot_store", lambda: snapshots)
+    monkeypatch.setattr(manager, "get_session_store", lambda: store)
+    monkeypatch.setattr(manager, "Agent", FakeAgent)
+    monkeypatch.setattr(manager, "_create_model", lambda model_type: f"model:{model_type}")
+
+    agent = manager.get_or_create_agent("session-1", "sonnet")
+    agent.messages = [
+        {"role": "user", "content": [{"text": "作って"}]},
+        {"role": "assistant", "content": [{"reasoningContent": {"reasoningText": {"text": "考え中"}}},
+                                          {"text": "作成しました"}]},
+    ]
+    manager.save_session_snapshot("session-1", agent)
+    snapshots.flush(timeout=5)
+    store.pop("session-1")
+
+    restored = manager.get_or_create_agent("session-1", "kimi")
+
+    assert restored is not agent
+    assert restored.model == "model:kimi"
+    # 別のモデルで保存した履歴は推論ブロックを除いて引き継ぐ
+    assert restored.messages[1]["content"] == [{"text": "作成しました"}]
+    assert manager.get_or_create_agent("session-1", "kimi") is restored
+    assert manager.get_or_create_agent("session-2", "kimi").messages == []
@@ -0,0 +1,114 @@
+"""セッションストア（件数・メモリ・アイドル時間の上限つきLRU）のテスト"""
+
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from session.store import AGENT_OVERHEAD_BYTES, SessionStore, estimate_agent_bytes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def evictions():
+    recorded = []
+    with patch("session.store.count", lambda name, amount=1, **attrs: recorded.append((name, amount, attrs))):
+        yield recorded
+
+
+def _agent(size: int = 1):
+    return SimpleNamespace(size=size)
+
+
+def _store(clock=None, **limits) -> SessionStore:
+    options = {"max_entries": 10, "memory_bytes": 1000, "idle_ttl": 60}
+    options.update(limits)
+    return SessionStore(clock=clock or FakeClock(), size_of=lambda agent: agent.size, **options)
+
+
+def test_evicts_least_recently_used_over_max_entries(evictions):
+    store = _store(max_entries=2)
+    store.put("a", _agent())
+    store.put("b", _agent())
+    store.get("a")
+    store.put("c", _agent())
+
+    assert ("a" in store, "b" in store, "c" in store) == (True, False, True)
+    assert evictions == [("session.evictions", 1, {"reason": "lru"})]
+
+
+def test_expires_idle_sessions_on_get(evictions):
+    clock = FakeClock()
+    store = _store(clock=clock)
+    store.put("a", _agent())
+
+    clock.now = 59
+    assert store.get("a") is not None
+    clock.now = 120
+    assert store.get("a") is None
+    assert evictions == [("session.evictions", 1, {"reason": "ttl"})]
+
+
+def test_memory_budget_evicts_oldest_but_keeps_new_session(evictions):
+    store = _store(memory_bytes=100)
+    store.put("a", _agent(40))
+    store.put("b", _agent(40))
+    store.put("c", _agent(150))
+
+    assert len(store) == 1 and "c" in store
+    assert evictions == [("session.evictions", 2, {"reason": "memory"})]
+
+
+def test_clean_remeasures_history_and_evicts_expired(evictions):
+    clock = FakeClock()
+    store = _store(clock=clock, memory_bytes=100)
+    growing = _agent(10)
+    store.put("old", _agent(10))
+    store.put("idle", _agent(10))
+    clock.now = 50
+    store.get("old")
+    store.put("growing", growing)
+
+    # 会話が進んで履歴が大きくなった分は、クリーナーの再計測で反映される
+    growing.size = 95
+    clock.now = 70
+
+    assert store.clean() == 2
+    assert list(store._entries) == ["growing"]
+    assert store.memory_used == 95
+    assert sorted(evictions, key=lambda e: e[2]["reason"]) == [
+        ("session.evictions", 1, {"reason": "memory"}),
+        ("session.evictions", 1, {"reason": "ttl"}),
+    ]
+
+
+def test_background_cleaner_runs_off_request_path(evictions):
+    store = SessionStore(max_entries=10, memory_bytes=1000, idle_ttl=0.01, size_of=lambda agent: 1)
+    store.put("a", _agent())
+    store.start_cleaner(0.01)
+    try:
+        deadline = time.monotonic() + 2
+        while "a" in store and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        store.stop_cleaner()
+
+    assert "a" not in store
+
+
+def test_estimate_agent_bytes_grows_with_history():
+    empty = estimate_agent_bytes(SimpleNamespace(messages=[]))
+    with_history = estimate_agent_bytes(SimpleNamespace(messages=[
+        {"role": "user", "content": [{"text": "あ" * 100}]},
+    ]))
+
+    assert empty == AGENT_OVERHEAD_BYTES + 2
+    assert with_history > empty + 300
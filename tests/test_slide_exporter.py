@@ -0,0 +1,67 @@
+"""Marp CLI実行（プロセスグループの中断・タイムアウト）のテスト"""
+
+import subprocess
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from exports import ExportCancelledError
+from exports.slide_exporter import _run_process
+
+
+def _is_gone(pid: int) -> bool:
+    """プロセスが終了済みか（回収されていないゾンビも終了扱い）"""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except FileNotFoundError:
+        return True
+    return "\nState:\tZ" in status
+
+
+def _spawn_tree_command(pid_file: Path) -> list[str]:
+    # Chromiumの代わりに、孫プロセスを残して待ち続けるシェル
+    return ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+
+
+def test_run_process_returns_output():
+    result = _run_process(["sh", "-c", "echo out; echo err >&2; exit 3"], None)
+
+    assert result.returncode == 3
+    assert result.stdout == "out\n"
+    assert result.stderr == "err\n"
+
+
+def test_cancel_kills_whole_process_group(tmp_path):
+    """中断されたらMarp CLIだけでなく子プロセス（Chromium）もまとめて終了させる"""
+    pid_file = tmp_path / "child.pid"
+    cancel_event = threading.Event()
+    threading.Timer(0.3, cancel_event.set).start()
+
+    started = time.monotonic()
+    with pytest.raises(ExportCancelledError):
+        _run_process(_spawn_tree_command(pid_file), cancel_event)
+
+    assert time.monotonic() - started < 1.0
+    child_pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 1.0
+    while not _is_gone(child_pid) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _is_gone(child_pid)
+
+
+def test_timeout_kills_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+
+    with patch("exports.slide_exporter.MARP_TIMEOUT", 0.3):
+        with pytest.raises(subprocess.TimeoutExpired):
+            _run_process(_spawn_tree_command(pid_file), threading.Event())
+
+    child_pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 1.0
+    while not _is_gone(child_pid) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _is_gone(child_pid)
+
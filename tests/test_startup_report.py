@@ -0,0 +1,32 @@
+"""起動時間の計測（-X importtime の集計）のテスト"""
+
+from loadtest.startup import parse_importtime, summarize_imports
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   encodings.aliases
+import time:       200 |        300 | site
+import time:       500 |        500 |       openai.types
+import time:      1000 |       1500 |     openai
+import time:       300 |       1800 |   session
+import time:      2000 |       2000 |     tavily
+import time:       400 |       2400 |   tools
+import time:       100 |       4300 | agent
+"""
+
+
+def test_parse_importtime_reads_depth_and_times():
+    records = parse_importtime("[INFO] other log\n" + IMPORTTIME)
+
+    assert [record.name for record in records][:3] == ["encodings.aliases", "site", "openai.types"]
+    assert records[2].depth == 3
+    assert records[-1].depth == 0 and records[-1].cumulative_us == 4300
+
+
+def test_summarize_imports_ranks_direct_imports_and_packages():
+    summary = summarize_imports(parse_importtime(IMPORTTIME), top=2)
+
+    assert summary["total_ms"] == 4.3
+    # site の下の encodings.aliases は agent の直接の import に含めない
+    assert summary["direct"] == [{"name": "tools", "ms": 2.4}, {"name": "session", "ms": 1.8}]
+    assert summary["packages"] == [{"name": "tavily", "ms": 2.0}, {"name": "openai", "ms": 1.5}]
@@ -0,0 +1,285 @@
+"""SSEストリーム多重化のテスト"""
+
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import agent
+from session import stream_agent, supports_cancel_signal
+from streaming import StreamMultiplexer, TextCoalescer
+
+
+async def collect(mux):
+    return [event async for event in mux]
+
+
+def test_source_and_side_channel_events_keep_arrival_order():
+    """ソースとサイドチャネルのイベントを到着順に1本にまとめる"""
+
+    async def main():
+        mux = StreamMultiplexer(10.0)
+
+        async def source():
+            yield {"type": "text", "data": "a"}
+            await asyncio.sleep(0.01)
+            mux.publish("通知", lambda item: [{"type": "side", "data": item}])
+            await asyncio.sleep(0.01)
+            yield {"type": "text", "data": "b"}
+
+        mux.attach(source())
+        return await collect(mux)
+
+    assert asyncio.run(main()) == [
+        {"type": "text", "data": "a"},
+        {"type": "side", "data": "通知"},
+        {"type": "text", "data": "b"},
+    ]
+
+
+def test_heartbeat_only_while_idle():
+    """無通信が続いたときだけkeep-aliveを送る"""
+
+    async def main():
+        async def source():
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                yield {"type": "text", "data": "."}
+            await asyncio.sleep(0.25)
+
+        mux = StreamMultiplexer(0.1, "変換中...")
+        mux.attach(source())
+        return await collect(mux)
+
+    events = asyncio.run(main())
+    assert events[:10] == [{"type": "text", "data": "."}] * 10
+    assert events[10:] and all(event == {"type": "progress", "message": "変換中..."} for event in events[10:])
+    assert len(events[10:]) <= 3
+
+
+def test_no_task_is_created_per_event():
+    """イベント数に関係なく、タスクはソースのポンプ1つだけ"""
+
+    async def main():
+        task_counts = []
+
+        async def source():
+            for i in range(200):
+                task_counts.append(len(asyncio.all_tasks()))
+                yield {"type": "text", "data": str(i)}
+
+        mux = StreamMultiplexer(10.0)
+        mux.attach(source())
+        events = await collect(mux)
+        return events, task_counts
+
+    events, task_counts = asyncio.run(main())
+    assert len(events) == 200
+    assert max(task_counts) == 2  # main + ポンプ
+
+
+def test_text_is_coalesced_and_flushed_by_timer():
+    """結合待ちのテキストは次のイベントを待たずに期限で送る"""
+
+    async def main():
+        async def source():
+            yield {"type": "text", "data": "途中"}
+            await asyncio.sleep(0.3)
+
+        mux = StreamMultiplexer(10.0, coalescer=TextCoalescer(max_chars=100, max_delay=0.02))
+        mux.attach(source())
+        start = time.perf_counter()
+        async for event in mux:
+            return event, time.perf_counter() - start
+
+    event, elapsed = asyncio.run(main())
+    assert event == {"type": "text", "data": "途中"}
+    assert elapsed < 0.2
+
+
+def test_source_error_is_raised_to_consumer():
+    """ソースの例外は受信側で再送出される"""
+
+    async def main():
+        async def source():
+            yield {"type": "text", "data": "a"}
+            raise RuntimeError("model error")
+
+        mux = StreamMultiplexer(10.0)
+        mux.attach(source())
+        received = []
+        with pytest.raises(RuntimeError, match="model error"):
+            async for event in mux:
+                received.append(event)
+        return received
+
+    assert asyncio.run(main()) == [{"type": "text", "data": "a"}]
+
+
+def test_export_sends_keepalive_while_rendering():
+    """エクスポートもチャットと同じkeep-aliveで変換完了を待つ"""
+
+    def slow_pdf(markdown, theme, cancel_event=None):
+        time.sleep(0.25)
+        return b"%PDF"
+
+    async def main():
+        payload = {"action": "export_pdf", "markdown": "# a", "theme": "border"}
+        return [event async for event in agent.invoke(payload)]
+
+    with patch("agent.generate_pdf", slow_pdf), patch("agent.STREAM_KEEPALIVE_INTERVAL", 0.1):
+        events = asyncio.run(main())
+
+    assert {"type": "progress", "message": "PDF変換中..."} in events
+    assert events[-1] == {"type": "pdf", "data": "JVBERg=="}
+
+
+def test_aclose_before_sources_finish_signals_cancel():
+    """受信側が途中で離れたら cancel_event をセットし、ソースが自発的に止まるのを待つ"""
+    cancel_event = threading.Event()
+    stopped = []
+
+    async def main():
+        mux = StreamMultiplexer(10.0, cancel_event=cancel_event, cancel_grace=1.0)
+
+        async def source():
+            yield {"type": "text", "data": "a"}
+            while not cancel_event.is_set():
+                await asyncio.sleep(0.01)
+            stopped.append("graceful")
+
+        mux.attach(source())
+        async for event in mux:
+            break
+        await mux.aclose()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    assert cancel_event.is_set()
+    assert stopped == ["graceful"]
+
+
+def test_source_ignoring_cancel_is_cancelled_after_grace():
+    """中断に応じないソースは猶予時間の後にタスクごとキャンセルする"""
+    cancel_event = threading.Event()
+    cancelled = []
+
+    async def main():
+        mux = StreamMultiplexer(10.0, cancel_event=cancel_event, cancel_grace=0.05)
+
+        async def source():
+            yield {"type": "text", "data": "a"}
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        mux.attach(source())
+        async for event in mux:
+            break
+        await mux.aclose()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+
+    assert cancelled == [True]
+
+
+def test_completed_stream_does_not_signal_cancel():
+    """最後まで受信した場合は cancel_event をセットしない"""
+    cancel_event = threading.Event()
+
+    async def main():
+        mux = StreamMultiplexer(10.0, cancel_event=cancel_event)
+
+        async def source():
+            yield {"type": "text", "data": "a"}
+
+        mux.attach(source())
+        events = await collect(mux)
+        await mux.aclose()
+        return events
+
+    assert asyncio.run(main()) == [{"type": "text", "data": "a"}]
+    assert not cancel_event.is_set()
+
+
+def test_chat_disconnect_cancels_agent_stream():
+    """チャット中にクライアントが切断すると、Strandsに渡した cancel_signal がセットされる"""
+    received = {}
+
+    class SlowAgent:
+        messages = []
+
+        async def stream_async(self, prompt, cancel_signal=None):
+            received["signal"] = cancel_signal
+            yield {"data": "こんにちは"}
+            while not cancel_signal.is_set():
+                await asyncio.sleep(0.01)
+            received["stopped"] = True
+
+    async def main():
+        events = agent.invoke({"prompt": "テスト"})
+        await anext(events)
+        await events.aclose()
+        await asyncio.sleep(0.1)
+
+    with patch("agent.get_or_create_agent", return_value=SlowAgent()), \
+            patch("agent.STREAM_KEEPALIVE_INTERVAL", 0.01):
+        asyncio.run(main())
+
+    assert received["signal"].is_set()
+    assert received["stopped"] is True
+
+
+def test_agent_without_cancel_signal_is_closed_on_cancel():
+    """cancel_signal のない stream_async（古いStrands）は、中断されたら次のイベントで抜けてストリームを閉じる"""
+    received = {}
+
+    class LegacyAgent:
+        async def stream_async(self, prompt, **kwargs):
+            received["kwargs"] = kwargs
+            try:
+                for n in range(100):
+                    yield {"data": str(n)}
+                    await asyncio.sleep(0)
+            finally:
+                received["closed"] = True
+
+    cancel_event = threading.Event()
+
+    async def main():
+        events = []
+        async for event in stream_agent(LegacyAgent(), "テスト", cancel_event):
+            events.append(event)
+            if len(events) == 2:
+                cancel_event.set()
+        return events
+
+    assert supports_cancel_signal(LegacyAgent) is False
+    assert asyncio.run(main()) == [{"data": "0"}, {"data": "1"}]
+    assert received == {"kwargs": {}, "closed": True}
+
+
+def test_pinned_strands_agent_accepts_cancel_signal():
+    """requirements.txt のStrandsの Agent.stream_async が cancel_signal を引数として持つ（テストはstrandsをモックするため別プロセスで確かめる）"""
+    code = (
+        "import importlib.util, inspect, sys\n"
+        "if importlib.util.find_spec('strands') is None:\n"
+        "    print('missing'); sys.exit()\n"
+        "from strands import Agent\n"
+        "parameter = inspect.signature(Agent.stream_async).parameters.get('cancel_signal')\n"
+        "print(parameter is not None and parameter.kind is not inspect.Parameter.VAR_KEYWORD)\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120)
+
+    assert completed.returncode == 0, completed.stderr
+    if completed.stdout.strip() == "missing":
+        pytest.skip("strands-agents がインストールされていない")
+    assert completed.stdout.strip() == "True"
@@ -0,0 +1,171 @@
+"""フェーズ計測（telemetry）のテスト"""
+
+import asyncio
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+
+import agent
+import telemetry
+from test_agent_stream import FakeAgent, run_invoke
+from tools.output_slide import configure_slide_validation, output_slide, reset_generated_markdown
+
+SLIDE_MARKDOWN = "---\nmarp: true\n---\n\n# 表紙\n\n---\n\n## 本文\n\n- 項目"
+
+
+class RecordingSpan:
+    def __init__(self, name, attributes, start_time=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_time = start_time
+        self.end_time = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class RecordingTracer:
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = RecordingSpan(name, attributes)
+        self.spans.append(span)
+        yield span
+
+    def start_span(self, name, attributes=None, start_time=None):
+        span = RecordingSpan(name, attributes, start_time)
+        self.spans.append(span)
+        return span
+
+
+class RecordingHistogram:
+    def __init__(self):
+        self.records = []
+
+    def record(self, amount, attributes=None):
+        self.records.append((amount, attributes))
+
+    def phases(self):
+        return [attributes["phase"] for _, attributes in self.records]
+
+    def attributes_of(self, phase):
+        return [attributes for _, attributes in self.records if attributes["phase"] == phase]
+
+
+@pytest.fixture
+def recorded():
+    tracer = RecordingTracer()
+    histogram = RecordingHistogram()
+    with patch.object(telemetry, "_tracer", tracer), patch.object(telemetry, "_phase_duration", histogram):
+        yield tracer, histogram
+
+
+def test_phase_records_span_and_low_cardinality_metric(recorded):
+    """スパンには全属性、メトリクスには集計用の属性だけを載せる"""
+    tracer, histogram = recorded
+    with telemetry.phase("agent.get_or_create", model_type="kimi", theme="border") as current:
+        current.set(history_messages=12)
+
+    assert tracer.spans[0].attributes == {"model_type": "kimi", "theme": "border", "history_messages": 12}
+    amount, attributes = histogram.records[0]
+    assert amount >= 0
+    assert attributes == {"phase": "agent.get_or_create", "model_type": "kimi", "theme": "border", "outcome": "ok"}
+
+
+def test_phase_marks_errors(recorded):
+    """例外が出たフェーズは outcome=error で記録し、例外はそのまま送出する"""
+    _, histogram = recorded
+    with pytest.raises(ValueError):
+        with telemetry.phase("reference.pdf_extract"):
+            raise ValueError("broken pdf")
+    assert histogram.records[0][1]["outcome"] == "error"
+
+
+def test_record_interval_uses_given_times(recorded):
+    """開始・終了を指定した区間は、その長さで記録する"""
+    tracer, histogram = recorded
+    telemetry.record_interval("chat.first_token", 10.0, 10.25, model_type="sonnet")
+    assert histogram.records[0][0] == pytest.approx(250)
+    span = tracer.spans[0]
+    assert span.end_time - span.start_time == pytest.approx(250_000_000, abs=1000)
+
+
+class RecordingMeter:
+    def __init__(self):
+        self.counts = []
+
+    def create_counter(self, name, unit="", description=""):
+        meter = self
+
+        class Counter:
+            def add(self, amount, attributes=None):
+                meter.counts.append((name, amount, attributes))
+
+        return Counter()
+
+
+def test_count_adds_to_named_counter():
+    """count() はメトリクス名ごとのカウンターに加算し、None の属性は除く"""
+    meter = RecordingMeter()
+    with patch.object(telemetry, "_meter", meter), patch.object(telemetry, "_counters", {}):
+        telemetry.count("cache.lookups", cache="reference", result="miss")
+        telemetry.count("cache.lookups", cache="reference", result="hit_memory", tier=None)
+
+    assert meter.counts == [
+        ("marp_agent.cache.lookups", 1, {"cache": "reference", "result": "miss"}),
+        ("marp_agent.cache.lookups", 1, {"cache": "reference", "result": "hit_memory"}),
+    ]
+
+def test_output_slide_records_retry_and_validation(recorded):
+    """output_slideの呼び出しごとにリトライ回数・判定・検証時間を記録する"""
+    _, histogram = recorded
+    reset_generated_markdown()
+    configure_slide_validation("1枚で作って", "sonnet")
+    output_slide(markdown=SLIDE_MARKDOWN)  # 枚数違反でリジェクト
+    output_slide(markdown=SLIDE_MARKDOWN)
+    reset_generated_markdown()
+
+    tool_records = histogram.attributes_of("tool.output_slide")
+    assert [(r["retry"], r["verdict"]) for r in tool_records] == [(0, "rejected"), (1, "rejected")]
+    assert len(histogram.attributes_of("slide.validate")) == 2
+
+
+def test_export_records_queue_wait_and_render(recorded):
+    """エクスポートはキュー待ちと変換本体を分けて記録する"""
+    tracer, histogram = recorded
+
+    async def main():
+        payload = {"action": "export_pdf", "markdown": SLIDE_MARKDOWN, "theme": "border"}
+        return [event async for event in agent.invoke(payload)]
+
+    with patch("agent.generate_pdf", return_value=b"%PDF"):
+        asyncio.run(main())
+
+    assert histogram.phases() == ["export.queue_wait", "export.render"]
+    render = next(span for span in tracer.spans if span.name == "export.render")
+    assert render.attributes["slide_count"] == 2
+    assert histogram.attributes_of("export.render")[0]["format"] == "pdf"
+
+
+def test_chat_records_first_token_and_markdown(recorded):
+    """チャットは初回出力・markdown送信・ストリーム全体の時間をモデル別に記録する"""
+    _, histogram = recorded
+
+    async def script():
+        yield {"init_event_loop": True}
+        yield {"data": "作成します"}
+        yield {"current_tool_use": {"name": "output_slide", "input": ""}}
+        await asyncio.to_thread(output_slide, markdown=SLIDE_MARKDOWN)
+
+    run_invoke(FakeAgent(script), {"prompt": "スライドを作って", "model_type": "kimi", "theme": "gradient"})
+
+    for name in ("agent.get_or_create", "chat.first_token", "chat.markdown", "chat.stream"):
+        attributes = histogram.attributes_of(name)[0]
+        assert attributes["model_type"] == "kimi"
+        assert attributes["theme"] == "gradient"
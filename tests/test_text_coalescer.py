@@ -0,0 +1,61 @@
+"""テキストイベント結合のテスト"""
+
+from streaming import TextCoalescer, create_text_coalescer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def text(data):
+    return {"type": "text", "data": data}
+
+
+class TestTextCoalescer:
+    """TextCoalescer のテスト"""
+
+    def test_buffers_until_size_threshold(self):
+        """文字数の上限に達するまでまとめ、達したら1イベントで返す"""
+        coalescer = TextCoalescer(max_chars=6, max_delay=1.0, clock=FakeClock())
+        assert coalescer.push(text("abc")) == []
+        assert coalescer.push(text("de")) == []
+        assert coalescer.push(text("f")) == [text("abcdef")]
+        assert coalescer.flush() == []
+
+    def test_flushes_when_delay_budget_is_exceeded(self):
+        """最初のテキストから待ち時間の予算を過ぎたら送る"""
+        clock = FakeClock()
+        coalescer = TextCoalescer(max_chars=100, max_delay=0.04, clock=clock)
+        coalescer.push(text("a"))
+        clock.now = 0.01
+        assert coalescer.timeout() == 0.03
+        clock.now = 0.05
+        assert coalescer.timeout() == 0.0
+        assert coalescer.push(text("b")) == [text("ab")]
+        assert coalescer.timeout() is None
+
+    def test_non_text_event_flushes_buffer_first(self):
+        """テキスト以外のイベントの直前に溜まったテキストを吐き出す"""
+        coalescer = TextCoalescer(max_chars=100, max_delay=1.0, clock=FakeClock())
+        coalescer.push(text("作成します"))
+        assert coalescer.push({"type": "tool_use", "data": "output_slide"}) == [
+            text("作成します"),
+            {"type": "tool_use", "data": "output_slide"},
+        ]
+
+    def test_disabled_passes_text_through(self):
+        """予算0では結合せずそのまま返す"""
+        coalescer = TextCoalescer(max_chars=100, max_delay=0, clock=FakeClock())
+        assert coalescer.push(text("a")) == [text("a")]
+
+    def test_config_from_env(self, monkeypatch):
+        """環境変数で上限を変更でき、不正な値は既定値にフォールバックする"""
+        monkeypatch.setenv("STREAM_TEXT_COALESCE_CHARS", "32")
+        monkeypatch.setenv("STREAM_TEXT_COALESCE_MS", "abc")
+        coalescer = create_text_coalescer()
+        assert coalescer.max_chars == 32
+        assert coalescer.max_delay == 0.04
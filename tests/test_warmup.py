@@ -0,0 +1,72 @@
+"""起動時のウォームアップのテスト"""
+
+import threading
+
+import pytest
+
+import warmup
+from warmup import Warmup, warmup_steps
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("", []),
+        ("false", []),
+        ("1", ["render", "pdf", "models"]),
+        ("models, render", ["render", "models"]),
+        ("models,unknown", ["models"]),
+    ],
+)
+def test_warmup_steps_from_env(monkeypatch, value, expected):
+    monkeypatch.setenv("RUNTIME_WARMUP", value)
+
+    assert warmup_steps() == expected
+
+
+def test_failed_step_does_not_stop_later_steps():
+    calls = []
+
+    def broken():
+        calls.append("render")
+        raise RuntimeError("marp not found")
+
+    results = Warmup({"render": broken, "models": lambda: calls.append("models")}).run()
+
+    assert calls == ["render", "models"]
+    assert results == {"render": False, "models": True}
+
+
+def test_in_progress_until_all_steps_finish():
+    release = threading.Event()
+    running = Warmup({"pdf": lambda: release.wait(5)})
+
+    assert not running.in_progress
+    running.start()
+    assert running.in_progress
+    release.set()
+    assert running.wait(timeout=5)
+    assert not running.in_progress
+
+
+def test_render_themes_renders_one_deck_per_theme(monkeypatch):
+    rendered = []
+    monkeypatch.setattr(warmup, "available_themes", lambda: ["border", "gradient"])
+    monkeypatch.setattr(warmup, "generate_pdf", lambda markdown, theme: rendered.append((theme, markdown)))
+
+    warmup.render_themes()
+
+    assert [theme for theme, _ in rendered] == ["border", "gradient"]
+    assert "theme: gradient" in rendered[1][1]
+
+
+def test_only_primary_worker_renders_themes(monkeypatch):
+    started = []
+    monkeypatch.setenv("RUNTIME_WARMUP", "all")
+    monkeypatch.setenv("RUNTIME_WORKER_INDEX", "1")
+    monkeypatch.setattr(Warmup, "start", lambda self: started.append(list(self.steps)))
+    monkeypatch.setattr(warmup, "_warmup", None)
+
+    warmup.start_warmup()
+
+    assert started == [["pdf", "models"]]
@@ -1,6 +1,9 @@
 """web_search ツールのユニットテスト（外部API不要）"""
+import contextvars
 from unittest.mock import patch, MagicMock
 
+from tools import start_request_state
+
 from tools.web_search import (
     web_search,
     get_last_search_result,
@@ -77,3 +80,19 @@ def test_web_search_rate_limit_fallback():
 
     assert "OK" in result
     assert "Fallback" in result
+
+
+def test_web_search_skips_retry_after_cancel():
+    """クライアント切断後は次のキーで再試行しない"""
+    mock_client = MagicMock()
+
+    def run():
+        # キャンセル済みのリクエスト状態が後続のテストに残らないよう、コピーしたコンテキストで実行する
+        start_request_state().cancel_event.set()
+        with patch("tools.web_search.tavily_clients", [mock_client]):
+            return web_search(query="test")
+
+    result = contextvars.copy_context().run(run)
+
+    assert "キャンセル" in result
+    mock_client.search.assert_not_called()